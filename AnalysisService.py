@@ -0,0 +1,350 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Analyses many atomic chess positions at once. Positions are read from a stream, shared out to a
+#              pool of worker processes each searching with its own ChessEngine to a fixed depth, and their
+#              best moves and scores are given back in the order the searches finish. Every result is kept in
+#              an SQLite file by position hash and depth, so a position asked about again, at that depth or a
+#              shallower one, is answered from the file without searching. The same position coming up
+#              several times while it is being searched is searched once. Run as a script to analyse FEN
+#              positions, one per line, from a file or standard input, writing one JSON result per line:
+#
+#              python AnalysisService.py [positions.txt] [--depth 4] [--workers 4] [--cache analysis.sqlite]
+#                                        [--tt-size 16] [--tablebases DIRECTORY]
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from ChessEngine import ChessEngine, SearchResult
+from ChessVar import ChessVar
+from Tablebase import Tablebases
+
+# One row per position and depth searched to. The hash is ChessVar.position_hash as a signed integer, the
+# searched depth is the last depth the search completed, less than the depth asked for when it found a
+# won or lost game, and the principal variation is a string of space separated moves
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS analyses (
+    hash INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    fen TEXT NOT NULL,
+    move TEXT,
+    score INTEGER NOT NULL,
+    searched_depth INTEGER NOT NULL,
+    nodes INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    pv TEXT NOT NULL,
+    PRIMARY KEY (hash, depth)
+)
+'''
+# Searches queued per worker, so that a long stream of positions is read as the workers get through it
+QUEUE_PER_WORKER = 2
+# Attempts at a search before it is given up on, for positions whose worker keeps dying
+MAX_ATTEMPTS = 3
+
+Analysis = namedtuple('Analysis', ['position', 'move', 'score', 'depth', 'nodes', 'seconds', 'pv', 'cached',
+                                   'error'])
+Analysis.__doc__ = """
+The analysis of one position: the position as it was asked about, then the best move, score, depth, nodes,
+seconds and principal variation of its search as in SearchResult, whether the result came from the cache,
+and the reason a position could not be analysed, None when it was.
+"""
+
+# The engine of a worker process, created once by init_worker and kept between positions
+_engine = None
+
+
+def init_worker(tt_size_mb, tablebase_directory):
+    """
+    Creates the engine of a worker process.
+    :param tt_size_mb: integer transposition table size of the worker's engine
+    :param tablebase_directory: string directory of the endgame tablebases to probe, or None
+    :return: Nothing
+    """
+    global _engine
+    tablebases = Tablebases(tablebase_directory) if tablebase_directory else None
+    _engine = ChessEngine(tt_size_mb, tablebases=tablebases)
+
+
+def analyse_position(position, depth):
+    """
+    Searches one position in a worker process.
+    :param position: bytes of the position packed by ChessVar.to_packed
+    :param depth: integer depth to search to
+    :return: tuple of the fields of SearchResult
+    """
+    return tuple(_engine.search(ChessVar.from_packed(position), max_time=None, max_depth=depth))
+
+
+def signed_hash(position_hash):
+    """
+    Turns a 64 bit position hash into the signed integer SQLite stores.
+    :param position_hash: integer from 0 to 2 ** 64 - 1
+    :return: integer from -2 ** 63 to 2 ** 63 - 1
+    """
+    return position_hash - (1 << 64) if position_hash >= 1 << 63 else position_hash
+
+
+class AnalysisCache:
+    """
+    A class that represents the SQLite file of past results. A row holds the FEN of its position as well as
+    the hash, and a row whose FEN does not match the position looked up, another position with the same
+    hash, is not used.
+    """
+    def __init__(self, path):
+        self._path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(SCHEMA)
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Closes the cache file.
+        :return: Nothing
+        """
+        self._connection.close()
+
+    def get_path(self):
+        """Returns the string path of the cache file."""
+        return self._path
+
+    def get_size(self):
+        """Returns the integer number of results in the cache."""
+        return self._connection.execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+
+    def get(self, game, depth):
+        """
+        Looks up the result of a search of a position to a depth, or to a greater depth.
+        :param game: ChessVar object
+        :param depth: integer depth searched
+        :return: SearchResult, or None if the position has not been searched that deep
+        """
+        row = self._connection.execute(
+            'SELECT move, score, searched_depth, nodes, seconds, pv FROM analyses '
+            'WHERE hash = ? AND depth >= ? AND fen = ? ORDER BY depth DESC LIMIT 1',
+            (signed_hash(game.position_hash()), depth, game.to_fen())).fetchone()
+        if row is None:
+            return None
+        move, score, searched_depth, nodes, seconds, pv = row
+        return SearchResult(move, score, searched_depth, nodes, seconds, pv.split() if pv else [])
+
+    def put(self, game, depth, result):
+        """
+        Keeps the result of a search.
+        :param game: ChessVar object searched
+        :param depth: integer depth searched to
+        :param result: SearchResult
+        :return: Nothing
+        """
+        self._connection.execute('INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                 (signed_hash(game.position_hash()), depth, game.to_fen(), result.move,
+                                  result.score, result.depth, result.nodes, result.seconds, ' '.join(result.pv)))
+        self._connection.commit()
+
+
+class AnalysisService:
+    """
+    A class that represents the analysis service: its pool of engines and its cache. Each worker keeps its
+    engine and transposition table between positions, and the pool is started again if a worker dies.
+    """
+    def __init__(self, cache_path='analysis.sqlite', workers=None, tt_size_mb=16, tablebase_directory=None):
+        self._workers = workers or os.cpu_count() or 1
+        self._tt_size_mb = tt_size_mb
+        self._tablebase_directory = tablebase_directory
+        self._cache = AnalysisCache(cache_path)
+        self._pool = None
+        self.restart_pool()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_workers(self):
+        """Returns the number of worker processes."""
+        return self._workers
+
+    def get_cache(self):
+        """Returns the AnalysisCache of the service."""
+        return self._cache
+
+    def close(self):
+        """
+        Shuts down the worker processes and closes the cache.
+        :return: Nothing
+        """
+        self._pool.shutdown()
+        self._cache.close()
+
+    def restart_pool(self):
+        """
+        Starts a new pool of worker processes, shutting down the old one, which can take no more searches
+        once one of its workers has died.
+        :return: Nothing
+        """
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+        self._pool = ProcessPoolExecutor(max_workers=self._workers, initializer=init_worker,
+                                         initargs=(self._tt_size_mb, self._tablebase_directory))
+
+    def finish(self, request, depth, result):
+        """
+        Keeps the result of a search and answers every request for its position.
+        :param request: tuple (ChessVar object searched, list of labels of the requests)
+        :param depth: integer depth searched to
+        :param result: SearchResult
+        :return: list of Analysis
+        """
+        game, labels = request
+        self._cache.put(game, depth, result)
+        return [Analysis(label, *result, cached=False, error=None) for label in labels]
+
+    def analyse(self, positions, depth=4):
+        """
+        Analyses a stream of positions, giving back each result as soon as it is known: at once for a
+        position in the cache or one that cannot be read, and when its search finishes for the others.
+        :param positions: iterable of positions, each a FEN string or a ChessVar object
+        :param depth: integer depth to search each position to
+        :return: generator of Analysis, in the order they finish
+        """
+        positions = iter(positions)
+        # Searches running, by future, with the position searched and what asked for it by position key
+        pending = {}
+        requests = {}
+        # Packed positions to hand to the pool by position key, and searches lost to dead workers so far
+        waiting = {}
+        attempts = {}
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) + len(waiting) < self._workers * QUEUE_PER_WORKER:
+                try:
+                    position = next(positions)
+                except StopIteration:
+                    exhausted = True
+                    break
+                try:
+                    game = ChessVar.from_fen(position) if isinstance(position, str) else position
+                except ValueError as error:
+                    yield Analysis(position, None, 0, 0, 0, 0.0, [], False, str(error))
+                    continue
+                if not game.is_position_valid():
+                    yield Analysis(position, None, 0, 0, 0, 0.0, [], False,
+                                   'a position needs one king of each color')
+                    continue
+                label = position if isinstance(position, str) else game.to_fen()
+                result = self._cache.get(game, depth)
+                if result is not None:
+                    yield Analysis(label, *result, cached=True, error=None)
+                    continue
+                key = (game.position_hash(), game.to_fen())
+                if key in requests:
+                    requests[key][1].append(label)
+                    continue
+                try:
+                    packed = game.to_packed()
+                except ValueError as error:
+                    yield Analysis(label, None, 0, 0, 0, 0.0, [], False, str(error))
+                    continue
+                requests[key] = (game.copy(), [label])
+                waiting[key] = packed
+
+            try:
+                for key in list(waiting):
+                    pending[self._pool.submit(analyse_position, waiting[key], depth)] = key
+                    del waiting[key]
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = SearchResult(*future.result())
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as error:
+                        # A search that failed in its worker fails every request for its position, and the
+                        # other searches go on
+                        for label in requests.pop(pending.pop(future))[1]:
+                            yield Analysis(label, None, 0, 0, 0, 0.0, [], False, f'search failed: {error!r}')
+                        continue
+                    yield from self.finish(requests.pop(pending.pop(future)), depth, result)
+            except BrokenProcessPool:
+                # Searches that finished before the worker died are kept; the others are searched again by a
+                # new pool, or given up on after MAX_ATTEMPTS
+                for future, key in pending.items():
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        yield from self.finish(requests.pop(key), depth, SearchResult(*future.result()))
+                        continue
+                    attempts[key] = attempts.get(key, 0) + 1
+                    if attempts[key] < MAX_ATTEMPTS:
+                        waiting[key] = requests[key][0].to_packed()
+                        continue
+                    for label in requests.pop(key)[1]:
+                        yield Analysis(label, None, 0, 0, 0, 0.0, [], False, 'search failed: worker process died')
+                pending.clear()
+                self.restart_pool()
+
+
+def read_positions(source):
+    """
+    Reads FEN positions one per line, skipping blank lines.
+    :param source: file object
+    :return: generator of string FEN
+    """
+    for line in source:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def main(argv=None):
+    """
+    Analyses positions from the command line, writing each result as a JSON line as it finishes and a
+    summary at the end.
+    :param argv: list of command line arguments
+    :return: integer exit status
+    """
+    parser = argparse.ArgumentParser(description='Analyses atomic chess positions on a pool of engines.')
+    parser.add_argument('positions', nargs='?',
+                        help='file of FEN positions, one per line, standard input by default')
+    parser.add_argument('--depth', type=int, default=4, help='depth to search each position to')
+    parser.add_argument('--workers', type=int, help='number of worker processes, one per core by default')
+    parser.add_argument('--cache', default='analysis.sqlite', help='path of the SQLite file of results')
+    parser.add_argument('--tt-size', type=int, default=16, help='transposition table size of each engine in MB')
+    parser.add_argument('--tablebases', help='directory of endgame tablebases for the engines to probe')
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    counts = {'positions': 0, 'cached': 0, 'errors': 0}
+    source = open(args.positions) if args.positions else sys.stdin
+    try:
+        with AnalysisService(args.cache, args.workers, args.tt_size, args.tablebases) as service:
+            for analysis in service.analyse(read_positions(source), args.depth):
+                counts['positions'] += 1
+                counts['cached'] += analysis.cached
+                counts['errors'] += analysis.error is not None
+                print(json.dumps(analysis._asdict()), flush=True)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(f"{counts['positions']} positions ({counts['cached']} from the cache, {counts['errors']} unreadable) "
+          f'in {time.perf_counter() - start_time:.2f} s', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Lookup tables for atomic chess built once at import time. Every table is indexed by the
+#              square index row * 8 + col of a board position (row 0 is rank 8), and comes in two forms:
+#              a bitboard for BitboardChessVar and a tuple of (row, col) positions for ChessVar.
+
+KING_OFFSETS = [(0, 1), (0, -1), (1, 0), (1, 1), (1, -1), (-1, -1), (-1, 0), (-1, 1)]
+KNIGHT_OFFSETS = [(-2, -1), (2, -1), (-1, -2), (1, -2), (-2, 1), (-1, 2), (1, 2), (2, 1)]
+PAWN_CAPTURE_OFFSETS = {'WHITE': [(-1, -1), (-1, 1)], 'BLACK': [(1, -1), (1, 1)]}
+BLAST_OFFSETS = [(0, 0), (1, 0), (1, 1), (0, 1), (-1, 0), (-1, 1), (-1, -1), (0, -1), (1, -1)]
+
+# One shared (row, col) tuple per square, used by every table and by the pieces of every game
+POSITIONS = [divmod(square, 8) for square in range(64)]
+# Algebraic name of each square, and the square index and shared position of each square by name
+SQUARE_NAMES = [f'{col}{8 - row}' for row in range(8) for col in 'abcdefgh']
+SQUARE_INDEX = {name: square for square, name in enumerate(SQUARE_NAMES)}
+SQUARE_POSITIONS = {name: POSITIONS[square] for square, name in enumerate(SQUARE_NAMES)}
+
+
+def build_square_table(offsets):
+    """
+    Creates, for every square, the tuple of on-board positions reached by adding each offset.
+    :param offsets: list of (row, col) offsets
+    :return: list of 64 tuples of (row, col) positions
+    """
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        targets = []
+        for row_offset, col_offset in offsets:
+            new_row, new_col = row + row_offset, col + col_offset
+            if 0 <= new_row <= 7 and 0 <= new_col <= 7:
+                targets.append(POSITIONS[new_row * 8 + new_col])
+        table.append(tuple(targets))
+    return table
+
+
+def build_mask_table(square_table):
+    """
+    Converts a table of positions into a table of bitboards.
+    :param square_table: list of 64 tuples of (row, col) positions
+    :return: list of 64 integer bitboards
+    """
+    table = []
+    for targets in square_table:
+        mask = 0
+        for row, col in targets:
+            mask |= 1 << (row * 8 + col)
+        table.append(mask)
+    return table
+
+
+KING_SQUARES = build_square_table(KING_OFFSETS)
+KNIGHT_SQUARES = build_square_table(KNIGHT_OFFSETS)
+PAWN_CAPTURE_SQUARES = {color: build_square_table(offsets) for color, offsets in PAWN_CAPTURE_OFFSETS.items()}
+BLAST_SQUARES = build_square_table(BLAST_OFFSETS)
+
+KING_ATTACKS = build_mask_table(KING_SQUARES)
+KNIGHT_ATTACKS = build_mask_table(KNIGHT_SQUARES)
+# Indexed by color number, 0 for white and 1 for black
+PAWN_ATTACKS = [build_mask_table(PAWN_CAPTURE_SQUARES['WHITE']), build_mask_table(PAWN_CAPTURE_SQUARES['BLACK'])]
+BLAST_MASKS = build_mask_table(BLAST_SQUARES)
+
+# Ray directions as (row, col) steps. Rays heading south or east run toward higher square indexes,
+# so their nearest blocker is the lowest set bit; the other rays' nearest blocker is the highest.
+NORTH, SOUTH, EAST, WEST, NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST = range(8)
+RAY_OFFSETS = [(-1, 0), (1, 0), (0, 1), (0, -1), (-1, 1), (-1, -1), (1, 1), (1, -1)]
+ROOK_DIRECTIONS = (NORTH, SOUTH, EAST, WEST)
+BISHOP_DIRECTIONS = (NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST)
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+_RAY_INCREASING = [row_offset * 8 + col_offset > 0 for row_offset, col_offset in RAY_OFFSETS]
+
+
+def build_ray_table(row_offset, col_offset):
+    """
+    Creates, for every square, the tuple of positions a slider passes through in one direction,
+    nearest first, up to the edge of the board.
+    :param row_offset: integer row step of the direction
+    :param col_offset: integer column step of the direction
+    :return: list of 64 tuples of (row, col) positions
+    """
+    table = []
+    for square in range(64):
+        row, col = divmod(square, 8)
+        ray = []
+        row, col = row + row_offset, col + col_offset
+        while 0 <= row <= 7 and 0 <= col <= 7:
+            ray.append(POSITIONS[row * 8 + col])
+            row, col = row + row_offset, col + col_offset
+        table.append(tuple(ray))
+    return table
+
+
+RAY_SQUARES = [build_ray_table(row_offset, col_offset) for row_offset, col_offset in RAY_OFFSETS]
+RAY_MASKS = [build_mask_table(ray_table) for ray_table in RAY_SQUARES]
+
+
+def slider_attacks(square, occupied, directions):
+    """
+    Returns the squares a slider on a square attacks along the given directions for an occupancy,
+    including the first occupied square of each ray. Each ray costs one table lookup and one
+    bit scan, independent of its length.
+    :param square: integer square index of the slider
+    :param occupied: integer bitboard of all occupied squares
+    :param directions: tuple of ray directions, such as ROOK_DIRECTIONS
+    :return: integer bitboard
+    """
+    attacks = 0
+    for direction in directions:
+        ray = RAY_MASKS[direction][square]
+        blockers = ray & occupied
+        if blockers:
+            if _RAY_INCREASING[direction]:
+                nearest = (blockers & -blockers).bit_length() - 1
+            else:
+                nearest = blockers.bit_length() - 1
+            ray ^= RAY_MASKS[direction][nearest]
+        attacks |= ray
+    return attacks
@@ -0,0 +1,450 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Plays thousands of atomic chess games at once for tuning and dataset generation. Each game of a
+#              batch is a row of twelve bitboards in one NumPy uint64 array, and move generation, moves and
+#              explosions are whole-set bitboard operations over every game of the batch at once, so the cost
+#              of a ply hardly depends on the number of games. Follows the rules of ChessVar.make_move
+#              exactly. Requires numpy.
+
+import numpy as np
+
+from AttackTables import BLAST_MASKS, RAY_MASKS, RAY_OFFSETS, RAY_SQUARES
+from BitboardChessVar import (BISHOP, BLACK, COLORS, FULL_BOARD, KING, KNIGHT, NOT_FILE_A, NOT_FILE_H, PAWN, QUEEN,
+                              ROOK, WHITE, BitboardChessVar)
+from PositionEncoding import MAX_PIECES, PACKED_SIZE, decode_piece_code
+
+# Game results. A game is DRAWN when it stops without a winner: the player to move has no legal move, or
+# the ply limit is reached. ChessVar has no such state and would report these games as UNFINISHED.
+UNFINISHED = 0
+WHITE_WON = 1
+BLACK_WON = 2
+DRAWN = 3
+GAME_STATES = ('UNFINISHED', 'WHITE_WON', 'BLACK_WON', 'DRAWN')
+
+NOT_FILE_AB = NOT_FILE_A & (FULL_BOARD ^ 0x0202020202020202)
+NOT_FILE_GH = NOT_FILE_H & (FULL_BOARD ^ 0x4040404040404040)
+ALL_SQUARES = np.uint64(FULL_BOARD)
+# Squares a piece can land on after a step of 1 or 2 columns without wrapping around the board
+_COLUMN_MASKS = {-2: NOT_FILE_GH, -1: NOT_FILE_H, 0: FULL_BOARD, 1: NOT_FILE_A, 2: NOT_FILE_AB}
+
+
+def build_step(row_offset, col_offset):
+    """
+    Describes a step on the board as a square index offset and the squares it may land on.
+    :param row_offset: integer row step
+    :param col_offset: integer column step
+    :return: tuple (integer square index offset, uint64 mask of landing squares)
+    """
+    return row_offset * 8 + col_offset, np.uint64(_COLUMN_MASKS[col_offset])
+
+
+# Ray directions in the order of AttackTables.RAY_OFFSETS, then the knight and king steps
+RAY_STEPS = [build_step(row_offset, col_offset) for row_offset, col_offset in RAY_OFFSETS]
+KNIGHT_STEPS = [build_step(row_offset, col_offset) for row_offset, col_offset in
+                [(-2, -1), (2, -1), (-1, -2), (1, -2), (-2, 1), (-1, 2), (1, 2), (2, 1)]]
+KING_STEPS = RAY_STEPS
+# The ray direction that points back along each ray direction
+OPPOSITE_DIRECTIONS = [RAY_OFFSETS.index((-row_offset, -col_offset)) for row_offset, col_offset in RAY_OFFSETS]
+
+# A move set is a bitboard of end squares in which every set bit is exactly one move. The first eight sets
+# hold the moves of the sliding pieces along each ray direction, the others a single step of a knight, a
+# king or a pawn, whose start square is the end square minus the set's offset.
+SLIDER_SETS = 8
+MOVE_SET_COUNT = 8 + 8 + 8 + 4
+
+BLAST_BOARDS = np.array(BLAST_MASKS, dtype=np.uint64)
+RAY_BOARDS = np.array(RAY_MASKS, dtype=np.uint64)
+_RAY_INCREASING = np.array([offset > 0 for offset, _ in RAY_STEPS])
+
+
+def shift(bitboards, offset, mask):
+    """
+    Moves every bit of the bitboards by a square index offset.
+    :param bitboards: uint64 array
+    :param offset: integer square index offset, positive toward h1
+    :param mask: uint64 mask of the squares that can be landed on
+    :return: uint64 array
+    """
+    if offset > 0:
+        return (bitboards << np.uint64(offset)) & mask
+    return (bitboards >> np.uint64(-offset)) & mask
+
+
+def slide(sliders, empty, offset, mask):
+    """
+    Finds every square sliders reach along one direction, up to and including the first occupied square,
+    with a Kogge-Stone fill.
+    :param sliders: uint64 array of the sliding pieces
+    :param empty: uint64 array of the empty squares
+    :param offset: integer square index offset of one step
+    :param mask: uint64 mask of the squares a step can land on
+    :return: uint64 array of the squares reached
+    """
+    empty = empty & mask
+    sliders = sliders | (empty & shift(sliders, offset, mask))
+    empty = empty & shift(empty, offset, mask)
+    sliders = sliders | (empty & shift(sliders, 2 * offset, ALL_SQUARES))
+    empty = empty & shift(empty, 2 * offset, ALL_SQUARES)
+    sliders = sliders | (empty & shift(sliders, 4 * offset, ALL_SQUARES))
+    return shift(sliders, offset, mask)
+
+
+def popcount(bitboards):
+    """
+    Counts the set bits of each bitboard.
+    :param bitboards: uint64 array
+    :return: integer array of the same shape
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.intp)
+    bits = np.unpackbits(bitboards.astype('<u8').view(np.uint8).reshape(*bitboards.shape, 8), axis=-1)
+    return bits.sum(axis=-1, dtype=np.intp)
+
+
+def bit_squares(bits):
+    """
+    Converts bitboards holding one set bit each into the square index of that bit.
+    :param bits: uint64 array of single bits
+    :return: intp array of square indexes
+    """
+    return (np.frexp(bits.astype(np.float64))[1] - 1).astype(np.intp)
+
+
+def highest_bits(bitboards):
+    """
+    Keeps only the highest set bit of each bitboard.
+    :param bitboards: uint64 array
+    :return: uint64 array
+    """
+    for amount in (1, 2, 4, 8, 16, 32):
+        bitboards = bitboards | (bitboards >> np.uint64(amount))
+    return bitboards ^ (bitboards >> np.uint64(1))
+
+
+def nth_set_squares(bitboards, indexes):
+    """
+    Finds the square of the n-th lowest set bit of each bitboard.
+    :param bitboards: uint64 array of shape (N,)
+    :param indexes: integer array of shape (N,) of which set bit to find, counting from 0
+    :return: intp array of shape (N,) of square indexes
+    """
+    bits = np.unpackbits(bitboards.astype('<u8').view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    return np.argmax(np.cumsum(bits, axis=1) > indexes[:, None], axis=1)
+
+
+class BatchSimulator:
+    """
+    A class that represents a batch of atomic chess games played side by side, one ply of every unfinished
+    game at a time. Every game starts from the starting position unless the batch is built with
+    from_chess_vars. Moves are chosen at random from a seeded generator, so a batch with the same seed plays
+    the same games; a capture bias makes the random player prefer captures.
+    """
+    def __init__(self, games, seed=None, max_plies=400, capture_bias=0.0):
+        self._rng = np.random.default_rng(seed)
+        self._max_plies = max_plies
+        self._capture_bias = capture_bias
+        self._plies = 0
+        start = BitboardChessVar()
+        # Indexed by game, color and piece type like BitboardChessVar.get_bitboard
+        self._bitboards = np.tile(np.array([[start.get_bitboard(color, piece_type) for piece_type in range(6)]
+                                            for color in (WHITE, BLACK)], dtype=np.uint64), (games, 1, 1))
+        self._unmoved_pawns = np.full(games, start.get_bitboard(WHITE, PAWN) | start.get_bitboard(BLACK, PAWN),
+                                      dtype=np.uint64)
+        self._turns = np.full(games, WHITE, dtype=np.intp)
+        self._results = np.full(games, UNFINISHED, dtype=np.int8)
+
+    @classmethod
+    def from_chess_vars(cls, games, seed=None, max_plies=400, capture_bias=0.0):
+        """
+        Builds a batch from the current positions of ChessVar games.
+        :param games: list of ChessVar objects
+        :param seed: integer seed of the move choices, or None
+        :param max_plies: integer number of plies after which an unfinished game is drawn
+        :param capture_bias: float chance of choosing among the captures when a game has any
+        :return: BatchSimulator object
+        """
+        batch = cls(len(games), seed, max_plies, capture_bias)
+        for index, game in enumerate(games):
+            position = BitboardChessVar.from_chess_var(game)
+            for color in (WHITE, BLACK):
+                for piece_type in range(6):
+                    batch._bitboards[index, color, piece_type] = position.get_bitboard(color, piece_type)
+            unmoved = 0
+            for row in game.get_board():
+                for piece in row:
+                    if piece and piece.get_piece_type() == 'PAWN' and not piece.get_pawn_move_status():
+                        unmoved |= 1 << (piece.get_position()[0] * 8 + piece.get_position()[1])
+            batch._unmoved_pawns[index] = unmoved
+            batch._turns[index] = COLORS.index(game.get_player_turn())
+            batch._results[index] = GAME_STATES.index(game.get_game_state())
+        return batch
+
+    @classmethod
+    def from_packed(cls, data, seed=None, max_plies=400, capture_bias=0.0):
+        """
+        Builds a batch from positions packed by ChessVar.to_packed, decoding all of them at once with array
+        operations rather than one position at a time.
+        :param data: bytes-like object, such as a file read or mapped into memory, of packed positions
+                     one after another
+        :param seed: integer seed of the move choices, or None
+        :param max_plies: integer number of plies after which an unfinished game is drawn
+        :param capture_bias: float chance of choosing among the captures when a game has any
+        :return: BatchSimulator object
+        """
+        records = np.frombuffer(data, dtype=np.uint8).reshape(-1, PACKED_SIZE)
+        batch = cls(len(records), seed, max_plies, capture_bias)
+        batch._bitboards[:] = 0
+        batch._unmoved_pawns[:] = 0
+
+        # The n-th occupied square of a position holds the n-th piece code
+        occupied = np.unpackbits(records[:, :8], axis=1, bitorder='little').astype(bool)
+        nibbles = np.empty((len(records), MAX_PIECES), dtype=np.uint8)
+        nibbles[:, 0::2] = records[:, 8:24] & 15
+        nibbles[:, 1::2] = records[:, 8:24] >> 4
+        piece_indexes = np.clip(np.cumsum(occupied, axis=1) - 1, 0, MAX_PIECES - 1)
+        codes = np.where(occupied, np.take_along_axis(nibbles, piece_indexes, axis=1), 0)
+        for code in range(1, 15):
+            color, piece_type, unmoved = decode_piece_code(code)
+            squares = np.packbits(codes == code, axis=1, bitorder='little').view('<u8')[:, 0].astype(np.uint64)
+            batch._bitboards[:, color, piece_type] |= squares
+            if unmoved:
+                batch._unmoved_pawns |= squares
+
+        batch._turns[:] = records[:, 24] & 1
+        batch._results[:] = records[:, 24] >> 1
+        return batch
+
+    def get_bitboards(self):
+        """Returns the uint64 bitboards, an array of shape (N, 2, 6) indexed by game, color and piece type."""
+        return self._bitboards
+
+    def get_boards(self):
+        """
+        Returns the boards as an int8 array of shape (N, 8, 8) indexed by game, row then column. A square
+        holds 0 when empty, piece type + 1 for a white piece and -(piece type + 1) for a black piece.
+        :return: int8 array
+        """
+        bits = np.unpackbits(self._bitboards.astype('<u8').view(np.uint8).reshape(-1, 2, 6, 8), axis=3,
+                             bitorder='little').astype(np.int8)
+        codes = np.arange(1, 7, dtype=np.int8)
+        boards = (bits[:, WHITE] * codes[:, None]).sum(axis=1) - (bits[:, BLACK] * codes[:, None]).sum(axis=1)
+        return boards.astype(np.int8).reshape(-1, 8, 8)
+
+    def get_results(self):
+        """Returns an int8 array of each game's result: UNFINISHED, WHITE_WON, BLACK_WON or DRAWN."""
+        return self._results
+
+    def get_game_states(self):
+        """Returns a list of each game's result as a string, such as 'WHITE_WON'."""
+        return [GAME_STATES[result] for result in self._results]
+
+    def get_plies(self):
+        """Returns the number of plies played."""
+        return self._plies
+
+    def generate_move_sets(self, games, color):
+        """
+        Finds the legal moves of some unfinished games that all have the same player to move, as move sets.
+        :param games: intp array of game indexes
+        :param color: WHITE or BLACK, the player to move in every one of the games
+        :return: tuple (uint64 array of shape (MOVE_SET_COUNT, len(games)) of move sets, uint64 array of the
+                 opponent's pieces, uint64 array of all pieces)
+        """
+        own_pieces = self._bitboards[games, color]
+        enemy = np.bitwise_or.reduce(self._bitboards[games, color ^ 1], axis=1)
+        own = np.bitwise_or.reduce(own_pieces, axis=1)
+        occupied = own | enemy
+        empty = ~occupied
+
+        # A capture may not blow up both kings, which no capture can in a game set up without one of them
+        white_kings = self._bitboards[games, WHITE, KING]
+        black_kings = self._bitboards[games, BLACK, KING]
+        double_blasts = np.where((white_kings != 0) & (black_kings != 0),
+                                 BLAST_BOARDS[bit_squares(white_kings)] & BLAST_BOARDS[bit_squares(black_kings)],
+                                 np.uint64(0))
+        targets = ~own & ~(enemy & double_blasts)
+
+        move_sets = []
+        rook_sliders = own_pieces[:, ROOK] | own_pieces[:, QUEEN]
+        bishop_sliders = own_pieces[:, BISHOP] | own_pieces[:, QUEEN]
+        for direction, (offset, mask) in enumerate(RAY_STEPS):
+            sliders = rook_sliders if direction < 4 else bishop_sliders
+            move_sets.append(slide(sliders, empty, offset, mask) & targets)
+        for offset, mask in KNIGHT_STEPS:
+            move_sets.append(shift(own_pieces[:, KNIGHT], offset, mask) & targets)
+        for offset, mask in KING_STEPS:
+            move_sets.append(shift(own_pieces[:, KING], offset, mask) & empty)
+
+        pawns = own_pieces[:, PAWN]
+        for offset, mask in self.pawn_steps(color):
+            if mask is None:
+                move_sets.append(shift(shift(pawns & self._unmoved_pawns[games], offset // 2, ALL_SQUARES) & empty,
+                                       offset // 2, ALL_SQUARES) & empty)
+            elif offset in (-8, 8):
+                move_sets.append(shift(pawns, offset, mask) & empty)
+            else:
+                move_sets.append(shift(pawns, offset, mask) & enemy & targets)
+        return np.array(move_sets), enemy, occupied
+
+    @staticmethod
+    def pawn_steps(color):
+        """
+        Returns the steps of a player's pawns in move set order: the push, the first-move double push
+        (whose mask is None) and the two captures.
+        :param color: WHITE or BLACK
+        :return: list of tuples (integer square index offset, uint64 landing mask or None)
+        """
+        forward = -1 if color == WHITE else 1
+        push, _ = build_step(forward, 0)
+        return [build_step(forward, 0), (2 * push, None), build_step(forward, -1), build_step(forward, 1)]
+
+    def set_offsets(self, color):
+        """
+        Returns the square index offset from start to end square of every step move set.
+        :param color: WHITE or BLACK, the player to move
+        :return: intp array of shape (MOVE_SET_COUNT,), 0 for the slider sets
+        """
+        return np.array([0] * SLIDER_SETS + [offset for offset, _ in KNIGHT_STEPS] +
+                        [offset for offset, _ in KING_STEPS] + [offset for offset, _ in self.pawn_steps(color)],
+                        dtype=np.intp)
+
+    def generate_moves(self, game):
+        """
+        Lists the legal moves of one game, in the form ChessVar uses.
+        :param game: integer game index
+        :return: list of moves, each a tuple (start, end) of board positions
+        """
+        if self._results[game] != UNFINISHED:
+            return []
+        color = int(self._turns[game])
+        move_sets, _, occupied = self.generate_move_sets(np.array([game]), color)
+        offsets = self.set_offsets(color)
+        moves = []
+        for index, move_set in enumerate(move_sets[:, 0]):
+            move_set = int(move_set)
+            while move_set:
+                end = (move_set & -move_set).bit_length() - 1
+                move_set &= move_set - 1
+                if index < SLIDER_SETS:
+                    for row, col in RAY_SQUARES[OPPOSITE_DIRECTIONS[index]][end]:
+                        if int(occupied[0]) >> (row * 8 + col) & 1:
+                            start = row * 8 + col
+                            break
+                else:
+                    start = end - offsets[index]
+                moves.append((divmod(start, 8), divmod(end, 8)))
+        return moves
+
+    def count_moves(self):
+        """
+        Counts the legal moves of every game.
+        :return: intp array of shape (N,), 0 for finished games
+        """
+        counts = np.zeros(len(self._results), dtype=np.intp)
+        for color in (WHITE, BLACK):
+            games = np.flatnonzero((self._results == UNFINISHED) & (self._turns == color))
+            if len(games):
+                counts[games] = popcount(self.generate_move_sets(games, color)[0]).sum(axis=0)
+        return counts
+
+    def choose_moves(self, games, color):
+        """
+        Picks a legal move at random for some unfinished games that all have the same player to move.
+        :param games: intp array of game indexes
+        :param color: WHITE or BLACK, the player to move in every one of the games
+        :return: tuple of intp arrays (start squares, end squares), -1 for a game without a legal move
+        """
+        move_sets, enemy, occupied = self.generate_move_sets(games, color)
+        if self._capture_bias:
+            captures = move_sets & enemy
+            prefer_captures = (self._rng.random(len(games)) < self._capture_bias) & popcount(captures).any(axis=0)
+            move_sets = np.where(prefer_captures, captures, move_sets)
+
+        counts = popcount(move_sets)
+        totals = counts.sum(axis=0)
+        ends_of_sets = np.cumsum(counts, axis=0)
+        choices = (self._rng.random(len(games)) * totals).astype(np.intp)
+        chosen_sets = np.argmax(ends_of_sets > choices, axis=0)
+        columns = np.arange(len(games))
+        ends = nth_set_squares(move_sets[chosen_sets, columns],
+                               choices - ends_of_sets[chosen_sets, columns] + counts[chosen_sets, columns])
+
+        # A slider stands on the first occupied square looking back along its direction
+        starts = ends - self.set_offsets(color)[chosen_sets]
+        sliders = np.flatnonzero(chosen_sets < SLIDER_SETS)
+        if len(sliders):
+            backward = np.array(OPPOSITE_DIRECTIONS)[chosen_sets[sliders]]
+            blockers = RAY_BOARDS[backward, ends[sliders]] & occupied[sliders]
+            nearest = np.where(_RAY_INCREASING[backward], blockers & (~blockers + np.uint64(1)), highest_bits(blockers))
+            starts[sliders] = bit_squares(nearest)
+
+        no_moves = totals == 0
+        starts[no_moves] = -1
+        ends[no_moves] = -1
+        return starts, ends
+
+    def play_moves(self, games, color, starts, ends):
+        """
+        Plays one move in each of some games that all have the same player to move, resolving explosions
+        and ending the games whose king is destroyed.
+        :param games: intp array of game indexes
+        :param color: WHITE or BLACK, the player to move in every one of the games
+        :param starts: intp array of start squares
+        :param ends: intp array of end squares
+        :return: Nothing
+        """
+        start_bits = np.uint64(1) << starts.astype(np.uint64)
+        end_bits = np.uint64(1) << ends.astype(np.uint64)
+        bitboards = self._bitboards
+        movers = np.argmax((bitboards[games, color] & start_bits[:, None]) != 0, axis=1)
+        enemy = np.bitwise_or.reduce(bitboards[games, color ^ 1], axis=1)
+        captures = (enemy & end_bits) != 0
+
+        bitboards[games, color, movers] ^= start_bits | end_bits
+        bitboards[games, color ^ 1] &= ~end_bits[:, None]
+        self._unmoved_pawns[games] &= ~(start_bits | end_bits)
+
+        # The capturing piece and every piece around it except pawns are destroyed
+        blast_games = games[captures]
+        blast = BLAST_BOARDS[ends[captures]]
+        bitboards[blast_games, :, :PAWN] &= ~blast[:, None, None]
+        bitboards[blast_games, :, PAWN] &= ~end_bits[captures][:, None]
+
+        self._results[games[bitboards[games, WHITE, KING] == 0]] = BLACK_WON
+        self._results[games[bitboards[games, BLACK, KING] == 0]] = WHITE_WON
+        self._turns[games] = color ^ 1
+
+    def step(self):
+        """
+        Plays one random move in every unfinished game. Games where the player to move has no legal move,
+        or that reach the ply limit, are drawn.
+        :return: tuple of intp arrays of shape (N,) (start squares, end squares) of the moves played, -1
+                 for games that did not move
+        """
+        starts = np.full(len(self._results), -1, dtype=np.intp)
+        ends = np.full(len(self._results), -1, dtype=np.intp)
+        unfinished = self._results == UNFINISHED
+        players = [(color, np.flatnonzero(unfinished & (self._turns == color))) for color in (WHITE, BLACK)]
+        for color, games in players:
+            if not len(games):
+                continue
+            starts[games], ends[games] = self.choose_moves(games, color)
+            stuck = starts[games] < 0
+            self._results[games[stuck]] = DRAWN
+            moving = games[~stuck]
+            self.play_moves(moving, color, starts[moving], ends[moving])
+
+        self._plies += 1
+        if self._plies >= self._max_plies:
+            self._results[self._results == UNFINISHED] = DRAWN
+        return starts, ends
+
+    def run(self):
+        """
+        Plays every game of the batch to the end.
+        :return: int8 array of shape (N,) of the results
+        """
+        while (self._results == UNFINISHED).any():
+            self.step()
+        return self._results
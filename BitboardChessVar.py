@@ -0,0 +1,519 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: A bitboard backend for atomic chess. Offers the same public API as ChessVar but stores
+#              the position as one 64-bit integer per (color, piece type) instead of piece objects.
+
+from AttackTables import (BISHOP_DIRECTIONS, BLAST_MASKS, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS,
+                          QUEEN_DIRECTIONS, ROOK_DIRECTIONS, SQUARE_INDEX, SQUARE_NAMES, slider_attacks)
+import PositionEncoding
+
+# Square index of a board position (row, col) is row * 8 + col, so bit 0 is a8 and bit 63 is h1,
+# matching the row-major layout of ChessVar._board.
+WHITE = 0
+BLACK = 1
+COLORS = ('WHITE', 'BLACK')
+
+KING = 0
+QUEEN = 1
+ROOK = 2
+BISHOP = 3
+KNIGHT = 4
+PAWN = 5
+PIECE_TYPES = ('KING', 'QUEEN', 'ROOK', 'BISHOP', 'KNIGHT', 'PAWN')
+
+FULL_BOARD = 0xFFFFFFFFFFFFFFFF
+NOT_FILE_A = FULL_BOARD ^ 0x0101010101010101
+NOT_FILE_H = FULL_BOARD ^ 0x8080808080808080
+
+
+def iterate_bits(bitboard):
+    """
+    Yields the square index of every set bit, lowest first.
+    :param bitboard: integer bitboard
+    :return: generator of integer square indexes
+    """
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+class BitboardChessVar:
+    """
+    A class that represents a game of atomic chess stored as bitboards. Accepts and reports moves in
+    algebraic notation exactly like ChessVar.
+    """
+    def __init__(self):
+        self._game_state = 'UNFINISHED'
+        self._player_turn = WHITE
+        self._bitboards = [[0] * 6, [0] * 6]
+        self._occupancy = [0, 0]
+        self._unmoved_pawns = 0
+
+        self.initialize_board()
+
+    @classmethod
+    def from_chess_var(cls, game):
+        """
+        Builds a bitboard position from a ChessVar game.
+        :param game: ChessVar object
+        :return: BitboardChessVar object
+        """
+        position = cls.__new__(cls)
+        position._game_state = game.get_game_state()
+        position._player_turn = COLORS.index(game.get_player_turn())
+        position._bitboards = [[0] * 6, [0] * 6]
+        position._occupancy = [0, 0]
+        position._unmoved_pawns = 0
+        for row in game.get_board():
+            for piece in row:
+                if piece:
+                    square = piece.get_position()[0] * 8 + piece.get_position()[1]
+                    color = COLORS.index(piece.get_color())
+                    piece_type = PIECE_TYPES.index(piece.get_piece_type())
+                    position.add_piece(color, piece_type, square)
+                    if piece_type == PAWN and not piece.get_pawn_move_status():
+                        position._unmoved_pawns |= 1 << square
+        return position
+
+    @classmethod
+    def from_piece_codes(cls, pieces, player_turn=WHITE, game_state=0):
+        """
+        Builds a bitboard position from a position in the form used by PositionEncoding, setting bits
+        directly without creating any piece objects.
+        :param pieces: list of (integer square index, integer piece code) pairs
+        :param player_turn: WHITE or BLACK, the player to move
+        :param game_state: integer index into PositionEncoding.GAME_STATES
+        :return: BitboardChessVar object
+        """
+        position = cls.__new__(cls)
+        position._game_state = PositionEncoding.GAME_STATES[game_state]
+        position._player_turn = player_turn
+        position._bitboards = [[0] * 6, [0] * 6]
+        position._occupancy = [0, 0]
+        position._unmoved_pawns = 0
+        bitboards = position._bitboards
+        for square, code in pieces:
+            color, piece_type, unmoved = PositionEncoding.CODE_PIECES[code]
+            bitboards[color][piece_type] |= 1 << square
+            if unmoved:
+                position._unmoved_pawns |= 1 << square
+        position._occupancy = [bitboards[WHITE][0] | bitboards[WHITE][1] | bitboards[WHITE][2] |
+                               bitboards[WHITE][3] | bitboards[WHITE][4] | bitboards[WHITE][5],
+                               bitboards[BLACK][0] | bitboards[BLACK][1] | bitboards[BLACK][2] |
+                               bitboards[BLACK][3] | bitboards[BLACK][4] | bitboards[BLACK][5]]
+        return position
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        Builds a bitboard position from the FEN dialect of PositionEncoding, or from standard FEN.
+        :param fen: string FEN
+        :return: BitboardChessVar object
+        """
+        return cls.from_piece_codes(*PositionEncoding.from_fen(fen))
+
+    @classmethod
+    def from_packed(cls, data):
+        """
+        Builds a bitboard position from a position packed by to_packed.
+        :param data: bytes of length PositionEncoding.PACKED_SIZE
+        :return: BitboardChessVar object
+        """
+        return cls.from_piece_codes(*PositionEncoding.unpack(data))
+
+    def get_piece_codes(self):
+        """
+        Returns the pieces on the board in the form used by PositionEncoding.
+        :return: list of (integer square index, integer piece code) pairs
+        """
+        pieces = []
+        for color in (WHITE, BLACK):
+            for piece_type in range(6):
+                for square in iterate_bits(self._bitboards[color][piece_type]):
+                    unmoved = piece_type == PAWN and self._unmoved_pawns >> square & 1
+                    pieces.append((square, PositionEncoding.piece_code(color, piece_type, unmoved)))
+        return pieces
+
+    def to_fen(self):
+        """
+        Writes the current position in the FEN dialect of PositionEncoding.
+        :return: string FEN
+        """
+        return PositionEncoding.to_fen(self.get_piece_codes(), self._player_turn,
+                                       PositionEncoding.GAME_STATES.index(self._game_state))
+
+    def to_packed(self):
+        """
+        Packs the current position into PositionEncoding.PACKED_SIZE bytes, the same bytes ChessVar.to_packed
+        gives for the same position.
+        :return: bytes
+        """
+        return PositionEncoding.pack(self.get_piece_codes(), self._player_turn,
+                                     PositionEncoding.GAME_STATES.index(self._game_state))
+
+    def get_game_state(self):
+        """
+        A method that returns a string for the current status of the game -
+        whether the game is unfinished or if a player has won the game.
+        :return: string that represents an unfinished game or if a player has won
+        """
+        return self._game_state
+
+    def get_player_turn(self):
+        """
+        A method that returns a string for which color's turn it is.
+        :return: string that contains current turn's color
+        """
+        return COLORS[self._player_turn]
+
+    def is_position_valid(self):
+        """
+        Checks a position set up from outside can be played from: a game that is not over needs exactly one
+        king of each color.
+        :return: True if the position can be played from or the game is over, False if not
+        """
+        if self._game_state != 'UNFINISHED':
+            return True
+        return self._bitboards[WHITE][KING].bit_count() == 1 and self._bitboards[BLACK][KING].bit_count() == 1
+
+    def get_bitboard(self, color, piece_type):
+        """
+        Returns the bitboard of one piece type.
+        :param color: WHITE or BLACK
+        :param piece_type: KING, QUEEN, ROOK, BISHOP, KNIGHT or PAWN
+        :return: integer bitboard
+        """
+        return self._bitboards[color][piece_type]
+
+    def get_occupancy(self, color=None):
+        """
+        Returns the squares occupied by one color, or by both colors if no color is given.
+        :param color: WHITE, BLACK or None
+        :return: integer bitboard
+        """
+        if color is None:
+            return self._occupancy[WHITE] | self._occupancy[BLACK]
+        return self._occupancy[color]
+
+    def get_piece(self, square):
+        """
+        Returns the color and piece type standing on a square.
+        :param square: string in algebraic notation
+        :return: tuple of strings (color, piece type), or None for an empty square
+        """
+        index = SQUARE_INDEX[square]
+        bit = 1 << index
+        for color in (WHITE, BLACK):
+            if self._occupancy[color] & bit:
+                return COLORS[color], PIECE_TYPES[self.piece_type_at(color, index)]
+        return None
+
+    def initialize_board(self):
+        """
+        Sets up the board for a new game.
+        :return: Nothing
+        """
+        self._game_state = 'UNFINISHED'
+        self._player_turn = WHITE
+        self._bitboards = [[0] * 6, [0] * 6]
+        self._occupancy = [0, 0]
+        back_rank = (ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK)
+        for col, piece_type in enumerate(back_rank):
+            self.add_piece(BLACK, piece_type, col)
+            self.add_piece(BLACK, PAWN, 8 + col)
+            self.add_piece(WHITE, PAWN, 48 + col)
+            self.add_piece(WHITE, piece_type, 56 + col)
+        self._unmoved_pawns = self._bitboards[WHITE][PAWN] | self._bitboards[BLACK][PAWN]
+
+    def add_piece(self, color, piece_type, square):
+        """
+        Puts a piece on an empty square.
+        :param color: WHITE or BLACK
+        :param piece_type: KING, QUEEN, ROOK, BISHOP, KNIGHT or PAWN
+        :param square: integer square index
+        :return: Nothing
+        """
+        bit = 1 << square
+        self._bitboards[color][piece_type] |= bit
+        self._occupancy[color] |= bit
+
+    def piece_type_at(self, color, square):
+        """
+        Returns the type of the piece of the given color on a square.
+        :param color: WHITE or BLACK
+        :param square: integer square index
+        :return: piece type index, or None if the color has no piece there
+        """
+        bit = 1 << square
+        bitboards = self._bitboards[color]
+        for piece_type in range(6):
+            if bitboards[piece_type] & bit:
+                return piece_type
+        return None
+
+    def get_targets(self, square):
+        """
+        Returns every square the piece on a square may move to.
+        :param square: integer square index of an occupied square
+        :return: integer bitboard
+        """
+        bit = 1 << square
+        color = WHITE if self._occupancy[WHITE] & bit else BLACK
+        own = self._occupancy[color]
+        enemy = self._occupancy[color ^ 1]
+        occupied = own | enemy
+        piece_type = self.piece_type_at(color, square)
+
+        # Captures on squares whose explosion covers both kings are not allowed
+        forbidden = enemy & self.get_double_king_blast_mask()
+        enemy ^= forbidden
+        not_own = ~(own | forbidden) & FULL_BOARD
+        if piece_type == KNIGHT:
+            return KNIGHT_ATTACKS[square] & not_own
+        if piece_type == KING:
+            # The king is not allowed to capture, so it only moves to empty squares
+            return KING_ATTACKS[square] & ~occupied
+        if piece_type == PAWN:
+            empty = ~occupied & FULL_BOARD
+            if color == WHITE:
+                single = (bit >> 8) & empty
+                double = (single >> 8) & empty
+            else:
+                single = (bit << 8) & empty
+                double = (single << 8) & empty
+            targets = single | (PAWN_ATTACKS[color][square] & enemy)
+            if bit & self._unmoved_pawns:
+                targets |= double
+            return targets
+        if piece_type == ROOK:
+            directions = ROOK_DIRECTIONS
+        elif piece_type == BISHOP:
+            directions = BISHOP_DIRECTIONS
+        else:
+            directions = QUEEN_DIRECTIONS
+        return slider_attacks(square, occupied, directions) & not_own
+
+    def get_double_king_blast_mask(self):
+        """
+        Returns the squares where a capture would blow up both kings: the squares whose explosion
+        covers both of them.
+        :return: integer bitboard
+        """
+        white_king = self._bitboards[WHITE][KING]
+        black_king = self._bitboards[BLACK][KING]
+        if not white_king or not black_king:
+            return 0
+        return BLAST_MASKS[white_king.bit_length() - 1] & BLAST_MASKS[black_king.bit_length() - 1]
+
+    def generate_targets(self):
+        """
+        Creates, piece type by piece type, the squares every piece other than a pawn of the player
+        whose turn it is can move to. Pawns are handled set-wise by generate_pawn_targets.
+        :return: list of tuples (start square index, integer bitboard of end squares)
+        """
+        if self._game_state != 'UNFINISHED':
+            return []
+        color = self._player_turn
+        bitboards = self._bitboards[color]
+        own = self._occupancy[color]
+        enemy = self._occupancy[color ^ 1]
+        occupied = own | enemy
+        empty = ~occupied & FULL_BOARD
+        # Captures on squares whose explosion covers both kings are not allowed
+        not_own = ~own & ~(enemy & self.get_double_king_blast_mask()) & FULL_BOARD
+        targets = []
+
+        for square in iterate_bits(bitboards[KNIGHT]):
+            targets.append((square, KNIGHT_ATTACKS[square] & not_own))
+        # The king is not allowed to capture, so it only moves to empty squares
+        for square in iterate_bits(bitboards[KING]):
+            targets.append((square, KING_ATTACKS[square] & empty))
+        for square in iterate_bits(bitboards[ROOK]):
+            targets.append((square, slider_attacks(square, occupied, ROOK_DIRECTIONS) & not_own))
+        for square in iterate_bits(bitboards[BISHOP]):
+            targets.append((square, slider_attacks(square, occupied, BISHOP_DIRECTIONS) & not_own))
+        for square in iterate_bits(bitboards[QUEEN]):
+            targets.append((square, slider_attacks(square, occupied, QUEEN_DIRECTIONS) & not_own))
+        return targets
+
+    def generate_pawn_targets(self):
+        """
+        Creates the squares the pawns of the player whose turn it is can move to, a whole set of
+        pawns at a time. Each set comes with the square index offset from a target back to the
+        pawn that moves there.
+        :return: list of tuples (integer bitboard of end squares, integer offset to start square)
+        """
+        if self._game_state != 'UNFINISHED':
+            return []
+        color = self._player_turn
+        pawns = self._bitboards[color][PAWN]
+        enemy = self._occupancy[color ^ 1]
+        empty = ~(self._occupancy[color] | enemy) & FULL_BOARD
+        unmoved = pawns & self._unmoved_pawns
+        enemy &= ~self.get_double_king_blast_mask()
+        if color == WHITE:
+            return [((pawns >> 8) & empty, 8),
+                    ((((unmoved >> 8) & empty) >> 8) & empty, 16),
+                    (((pawns & NOT_FILE_A) >> 9) & enemy, 9),
+                    (((pawns & NOT_FILE_H) >> 7) & enemy, 7)]
+        return [((pawns << 8) & empty, -8),
+                ((((unmoved << 8) & empty) << 8) & empty, -16),
+                (((pawns & NOT_FILE_A) << 7) & enemy, -7),
+                (((pawns & NOT_FILE_H) << 9) & enemy, -9)]
+
+    def generate_moves(self):
+        """
+        Creates a list of all the valid, possible moves for the player whose turn it is.
+        :return: list of tuples (start square index, end square index)
+        """
+        moves = []
+        for start, targets in self.generate_targets():
+            for end in iterate_bits(targets):
+                moves.append((start, end))
+        for targets, offset in self.generate_pawn_targets():
+            for end in iterate_bits(targets):
+                moves.append((end + offset, end))
+        return moves
+
+    def count_moves(self):
+        """
+        Counts the moves of the player whose turn it is without listing them.
+        :return: integer number of moves
+        """
+        count = 0
+        for _, targets in self.generate_targets():
+            count += targets.bit_count()
+        for targets, _ in self.generate_pawn_targets():
+            count += targets.bit_count()
+        return count
+
+    def get_state(self):
+        """
+        Returns a snapshot of the position that set_state can restore.
+        :return: tuple of the position's data members
+        """
+        return ([self._bitboards[WHITE][:], self._bitboards[BLACK][:]], self._occupancy[:], self._unmoved_pawns,
+                self._player_turn, self._game_state)
+
+    def set_state(self, state):
+        """
+        Restores a snapshot taken with get_state.
+        :param state: tuple returned by get_state
+        :return: Nothing
+        """
+        bitboards, occupancy, self._unmoved_pawns, self._player_turn, self._game_state = state
+        self._bitboards = [bitboards[WHITE][:], bitboards[BLACK][:]]
+        self._occupancy = occupancy[:]
+
+    def perft(self, depth):
+        """
+        Counts the positions reached by playing every sequence of moves of the given length, the same
+        count as ChessVar.perft.
+        :param depth: integer number of moves to look ahead
+        :return: integer count of positions
+        """
+        if depth == 0:
+            return 1
+        if depth == 1:
+            return self.count_moves()
+        moves = self.generate_moves()
+        state = self.get_state()
+        nodes = 0
+        for start, end in moves:
+            self.apply_move(start, end)
+            nodes += self.perft(depth - 1)
+            self.set_state(state)
+        return nodes
+
+    def make_move(self, move_from, move_to):
+        """
+        A method for moving a chess piece.
+        :param move_from: string that represents where the piece the player wants to move is in algebraic notation
+        :param move_to: string that represents where the piece is to be moved in algebraic notation
+        :return: True if move is successful, False if not successful
+        """
+        if self._game_state != 'UNFINISHED':
+            return False
+        start = SQUARE_INDEX.get(move_from)
+        end = SQUARE_INDEX.get(move_to)
+        if start is None or end is None:
+            return False
+        if not self._occupancy[self._player_turn] >> start & 1:
+            return False
+        if not self.get_targets(start) >> end & 1:
+            return False
+
+        self.apply_move(start, end)
+        return True
+
+    def apply_move(self, start, end):
+        """
+        Plays a move taken from generate_moves without checking it, resolving any explosion and
+        passing the turn.
+        :param start: integer square index the piece moves from
+        :param end: integer square index the piece moves to
+        :return: Nothing
+        """
+        color = self._player_turn
+        enemy = color ^ 1
+        move_mask = (1 << start) | (1 << end)
+        piece_type = self.piece_type_at(color, start)
+
+        captured_type = None
+        if self._occupancy[enemy] >> end & 1:
+            captured_type = self.piece_type_at(enemy, end)
+            self._bitboards[enemy][captured_type] ^= 1 << end
+            self._occupancy[enemy] ^= 1 << end
+
+        self._bitboards[color][piece_type] ^= move_mask
+        self._occupancy[color] ^= move_mask
+        self._unmoved_pawns &= ~move_mask
+
+        if captured_type is not None:
+            if captured_type == KING:
+                self._game_state = f'{COLORS[color]}_WON'
+            self.explosion(end)
+
+        self._player_turn = enemy
+
+    def explosion(self, square):
+        """
+        Resolves an explosion on a square: the capturing piece and every piece except pawns in the
+        surrounding 3x3 block are removed, and a destroyed king ends the game.
+        :param square: integer square index of the capture
+        :return: Nothing
+        """
+        center = 1 << square
+        blast = BLAST_MASKS[square] & ~self._bitboards[WHITE][PAWN] & ~self._bitboards[BLACK][PAWN] | center
+        for color in (WHITE, BLACK):
+            hit = self._occupancy[color] & blast
+            if not hit:
+                continue
+            bitboards = self._bitboards[color]
+            if hit & bitboards[KING]:
+                self._game_state = f'{COLORS[color ^ 1]}_WON'
+            for piece_type in range(6):
+                bitboards[piece_type] &= ~hit
+            self._occupancy[color] &= ~hit
+
+    def print_board(self):
+        """
+        A method that prints the current board in the same ASCII art styling as ChessVar.print_board.
+        :return: Nothing
+        """
+        print('-------------------------------------------------------------------------------------------------')
+        for row in range(8):
+            print('|           |           |           |           |           |           |           |           |')
+            for col in range(8):
+                print('|', end='')
+                piece = self.get_piece(SQUARE_NAMES[row * 8 + col])
+                if not piece:
+                    print('           ', end='')
+                else:
+                    color, piece_type = piece
+                    print(('  ' + color[0] + ' ' + piece_type).ljust(11), end='')
+            print('|')
+            print('|           |           |           |           |           |           |           |           |')
+            print('-------------------------------------------------------------------------------------------------')
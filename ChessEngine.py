@@ -0,0 +1,397 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: A computer opponent for atomic chess. Searches a ChessVar position with iterative
+#              deepening negamax alpha-beta, a transposition table and a quiescence search over
+#              captures, and stops when its time or node budget runs out. Given an opening book, it
+#              plays the book's moves without searching while the game is still in the book, and given
+#              endgame tablebases, it scores the positions they hold exactly instead of searching them.
+
+import random
+import time
+from collections import namedtuple
+
+from AttackTables import BLAST_SQUARES
+from Evaluation import PIECE_VALUES, evaluate_material
+from Tablebase import DRAW, LOSS
+from TranspositionTable import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable
+
+WIN_SCORE = 100000
+# Scores this close to WIN_SCORE are wins found at a known distance from the root
+WIN_THRESHOLD = WIN_SCORE - 1000
+INFINITY = WIN_SCORE + 1
+# How many nodes are searched between checks of the clock
+CHECK_INTERVAL = 256
+
+SearchResult = namedtuple('SearchResult', ['move', 'score', 'depth', 'nodes', 'seconds', 'pv'])
+SearchResult.__doc__ = """
+The outcome of a search. move is the best move as a string such as 'e2e4' (None if there is no legal
+move), score is in centipawns from the point of view of the side to move, depth is the last fully
+searched depth and pv is the principal variation as a list of move strings.
+"""
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its time or node budget runs out."""
+
+
+def move_to_string(game, move):
+    """
+    Converts a move into a string of its start and end squares in algebraic notation.
+    :param game: ChessVar object
+    :param move: tuple (start, end) of board positions
+    :return: string such as 'e2e4'
+    """
+    return game.translate_position(move[0]) + game.translate_position(move[1])
+
+
+def capture_gain(game, move):
+    """
+    Estimates what a capture wins once its explosion is resolved: the value of the opponent's pieces
+    it destroys minus the value of the player's own, with a destroyed king counting as the game.
+    :param game: ChessVar object
+    :param move: tuple (start, end) of board positions of a capture
+    :return: integer gain in centipawns for the player making the capture
+    """
+    board = game.get_board()
+    (start_row, start_col), (end_row, end_col) = move
+    mover = board[start_row][start_col]
+    color = mover.get_color()
+    gain = PIECE_VALUES[board[end_row][end_col].get_piece_type()] - PIECE_VALUES[mover.get_piece_type()]
+    if board[end_row][end_col].get_piece_type() == 'KING':
+        gain += WIN_SCORE
+    for row, col in BLAST_SQUARES[end_row * 8 + end_col][1:]:
+        piece = board[row][col]
+        if piece and piece is not mover and piece.get_piece_type() != 'PAWN':
+            value = WIN_SCORE if piece.get_piece_type() == 'KING' else PIECE_VALUES[piece.get_piece_type()]
+            gain += -value if piece.get_color() == color else value
+    return gain
+
+
+class ChessEngine:
+    """
+    A class that represents a computer player. Each search works on a copy of the game, so the game
+    and its listeners are left untouched, and results are remembered between searches in a
+    transposition table.
+    """
+    def __init__(self, tt_size_mb=16, evaluation=evaluate_material, book=None, seed=None, tablebases=None):
+        self._table = TranspositionTable(tt_size_mb)
+        self._evaluation = evaluation
+        self._book = book
+        self._tablebases = tablebases
+        self._rng = random.Random(seed)
+        self._nodes = 0
+        self._deadline = None
+        self._max_nodes = None
+
+    def get_transposition_table(self):
+        """Returns the engine's transposition table."""
+        return self._table
+
+    def get_book(self):
+        """Returns the engine's OpeningBook, or None."""
+        return self._book
+
+    def get_tablebases(self):
+        """Returns the engine's Tablebases, or None."""
+        return self._tablebases
+
+    def get_nodes(self):
+        """Returns the number of positions visited since the search started."""
+        return self._nodes
+
+    def start_search(self, max_time=None, max_nodes=None):
+        """
+        Resets the node count and sets the budget for the searches that follow.
+        :param max_time: float seconds from now, or None for no time limit
+        :param max_nodes: integer number of positions to visit, or None for no limit
+        :return: Nothing
+        """
+        self._deadline = time.perf_counter() + max_time if max_time is not None else None
+        self._max_nodes = max_nodes
+        self._nodes = 0
+        self._table.new_search()
+
+    def search(self, game, max_time=0.1, max_depth=64, max_nodes=None):
+        """
+        Finds the best move for the player whose turn it is by searching one move deeper at a time
+        until the time or node budget runs out, keeping the result of the last completed depth. A
+        position in the opening book is answered with a book move at depth 0 instead.
+        :param game: ChessVar object
+        :param max_time: float seconds to search for, or None for no time limit
+        :param max_depth: integer deepest search to start
+        :param max_nodes: integer number of positions to visit, or None for no limit
+        :return: SearchResult
+        """
+        start_time = time.perf_counter()
+        if self._book is not None:
+            book_move = self._book.choose_move(game, self._rng)
+            if book_move:
+                return SearchResult(book_move, 0, 0, 0, time.perf_counter() - start_time, [book_move])
+        self.start_search(max_time, max_nodes)
+        position = game.copy()
+        legal_moves = position.legal_moves()
+        if not legal_moves:
+            return SearchResult(None, 0, 0, 0, 0.0, [])
+        best = SearchResult(move_to_string(position, legal_moves[0]), 0, 0, 0, 0.0,
+                            [move_to_string(position, legal_moves[0])])
+
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self.negamax(position, depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                break
+            pv = self.principal_variation(position, depth)
+            elapsed = time.perf_counter() - start_time
+            best = SearchResult(pv[0] if pv else best.move, score, depth, self._nodes, elapsed, pv or best.pv)
+            # A won or lost game will not change with more depth, and the next depth
+            # usually takes several times longer than all the previous ones together
+            if abs(score) >= WIN_THRESHOLD:
+                break
+            if self._deadline is not None and elapsed * 2 > max_time:
+                break
+
+        return best._replace(nodes=self._nodes, seconds=time.perf_counter() - start_time)
+
+    def play_move(self, game, max_time=0.1, max_depth=64, max_nodes=None):
+        """
+        Searches the game and makes the best move found on it.
+        :param game: ChessVar object
+        :param max_time: float seconds to search for, or None for no time limit
+        :param max_depth: integer deepest search to start
+        :param max_nodes: integer number of positions to visit, or None for no limit
+        :return: SearchResult of the search
+        """
+        result = self.search(game, max_time, max_depth, max_nodes)
+        if result.move:
+            game.make_move(result.move[:2], result.move[2:])
+        return result
+
+    def check_budget(self):
+        """
+        Counts a visited position and stops the search once the budget is spent.
+        :return: Nothing
+        """
+        self._nodes += 1
+        if self._nodes % CHECK_INTERVAL == 0:
+            if self._deadline is not None and time.perf_counter() >= self._deadline:
+                raise SearchTimeout()
+        if self._max_nodes is not None and self._nodes >= self._max_nodes:
+            raise SearchTimeout()
+
+    def terminal_score(self, game, ply):
+        """
+        Scores a finished game from the point of view of the player whose turn it is. Quicker wins
+        score higher.
+        :param game: ChessVar object of a finished game
+        :param ply: integer number of moves from the root
+        :return: integer score
+        """
+        if game.get_game_state() == f'{game.get_player_turn()}_WON':
+            return WIN_SCORE - ply
+        return -WIN_SCORE + ply
+
+    def order_moves(self, game, moves, first_move):
+        """
+        Sorts moves so the best looking are searched first: the transposition table's move, then
+        captures by what their explosion wins, then quiet moves.
+        :param game: ChessVar object
+        :param moves: tuple of moves
+        :param first_move: move to put first, or None
+        :return: list of moves
+        """
+        board = game.get_board()
+        scored = []
+        for move in moves:
+            if move == first_move:
+                score = 2 * INFINITY
+            elif board[move[1][0]][move[1][1]]:
+                score = WIN_SCORE + capture_gain(game, move)
+            else:
+                score = 0
+            scored.append((score, move))
+        scored.sort(key=lambda entry: entry[0], reverse=True)
+        return [move for _, move in scored]
+
+    def negamax(self, game, depth, alpha, beta, ply):
+        """
+        Searches a position to a fixed depth with alpha-beta pruning.
+        :param game: ChessVar object
+        :param depth: integer remaining depth
+        :param alpha: integer lower bound of the score window
+        :param beta: integer upper bound of the score window
+        :param ply: integer number of moves from the root
+        :return: integer score from the point of view of the player whose turn it is
+        """
+        self.check_budget()
+        if game.get_game_state() != 'UNFINISHED':
+            return self.terminal_score(game, ply)
+        if self._tablebases is not None and ply > 0:
+            code = self._tablebases.probe_value(game)
+            if code is not None:
+                return tablebase_score(code, ply)
+        if depth <= 0:
+            return self.quiescence(game, alpha, beta, ply)
+
+        key = game.position_hash()
+        entry = self._table.probe(key)
+        table_move = None
+        if entry is not None:
+            entry_depth, bound, score, table_move = entry
+            score = score_from_table(score, ply)
+            if entry_depth >= depth and ply > 0:
+                if bound == EXACT:
+                    return score
+                if bound == LOWER_BOUND and score >= beta:
+                    return score
+                if bound == UPPER_BOUND and score <= alpha:
+                    return score
+
+        moves = game.legal_moves()
+        if not moves:
+            return 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        for move in self.order_moves(game, moves, table_move):
+            game.push(move)
+            score = -self.negamax(game, depth - 1, -beta, -alpha, ply + 1)
+            game.pop()
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self._table.store(key, depth, bound, score_to_table(best_score, ply), best_move)
+        return best_score
+
+    def quiescence(self, game, alpha, beta, ply):
+        """
+        Searches only captures until the position is quiet, since atomic chess tactics are chains of
+        explosions. The player to move may also stand on the current evaluation.
+        :param game: ChessVar object
+        :param alpha: integer lower bound of the score window
+        :param beta: integer upper bound of the score window
+        :param ply: integer number of moves from the root
+        :return: integer score from the point of view of the player whose turn it is
+        """
+        self.check_budget()
+        if game.get_game_state() != 'UNFINISHED':
+            return self.terminal_score(game, ply)
+        if self._tablebases is not None:
+            code = self._tablebases.probe_value(game)
+            if code is not None:
+                return tablebase_score(code, ply)
+
+        stand_pat = self._evaluation(game)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        board = game.get_board()
+        captures = []
+        for move in game.legal_moves():
+            if board[move[1][0]][move[1][1]]:
+                gain = capture_gain(game, move)
+                # Skip captures that cannot lift the score back into the window
+                if stand_pat + gain > alpha or gain >= WIN_THRESHOLD:
+                    captures.append((gain, move))
+        captures.sort(key=lambda entry: entry[0], reverse=True)
+
+        for _, move in captures:
+            game.push(move)
+            score = -self.quiescence(game, -beta, -alpha, ply + 1)
+            game.pop()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def search_move(self, game, move, depth, alpha=-INFINITY):
+        """
+        Searches one root move to a fixed depth within the budget set by start_search. Only a score
+        above alpha is exact; a lower score means the move is no better than alpha.
+        :param game: ChessVar object, left as it was
+        :param move: tuple (start, end) of a legal move
+        :param depth: integer depth counting the move itself
+        :param alpha: integer score the move has to beat
+        :return: integer score from the point of view of the player making the move
+        """
+        game.push(move)
+        try:
+            return -self.negamax(game, depth - 1, -INFINITY, -alpha, 1)
+        finally:
+            game.pop()
+
+    def principal_variation(self, game, max_length):
+        """
+        Follows the transposition table's best moves from a position to build the expected line of play.
+        :param game: ChessVar object
+        :param max_length: integer longest line to return
+        :return: list of move strings
+        """
+        pv = []
+        for _ in range(max_length):
+            entry = self._table.probe(game.position_hash())
+            if entry is None or entry[3] not in game.legal_moves():
+                break
+            pv.append(move_to_string(game, entry[3]))
+            game.push(entry[3])
+        for _ in pv:
+            game.pop()
+        return pv
+
+
+def tablebase_score(code, ply):
+    """
+    Converts a tablebase result into a search score, so a win found in the tables ranks with the wins
+    found by searching.
+    :param code: integer result code of Tablebase
+    :param ply: integer number of moves from the root
+    :return: integer score from the point of view of the player whose turn it is
+    """
+    if code == DRAW:
+        return 0
+    if code < LOSS:
+        return WIN_SCORE - ply - code
+    return -WIN_SCORE + ply + code - LOSS
+
+
+def score_to_table(score, ply):
+    """
+    Converts a win score counted from the root into one counted from the current position before it
+    is stored, so the same position reached at another distance from the root scores correctly.
+    :param score: integer score
+    :param ply: integer number of moves from the root
+    :return: integer score
+    """
+    if score >= WIN_THRESHOLD:
+        return score + ply
+    if score <= -WIN_THRESHOLD:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    """
+    Reverses score_to_table for a score read from the transposition table.
+    :param score: integer score
+    :param ply: integer number of moves from the root
+    :return: integer score
+    """
+    if score >= WIN_THRESHOLD:
+        return score - ply
+    if score <= -WIN_THRESHOLD:
+        return score + ply
+    return score
@@ -0,0 +1,293 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: A pygame front end for atomic chess. Draws a ChessVar game, turns mouse drags into
+#              make_move calls and animates the rule events the game reports. The event loop runs at a
+#              fixed frame rate: each frame handles input, repaints what changed and advances the
+#              animations by one step, so animations never hold up input or the game.
+
+import os
+
+import pygame
+
+from ChessVar import ChessVar
+
+SQUARE_LEN = 100
+BOARD_OFFSET = 50
+WINDOW_SIZE = 900
+# Pieces are drawn this many pixels in from the corner of their square
+PIECE_MARGIN = 5
+COLOR_BORDER = (92, 64, 51)
+COLOR_LIGHT = (234, 221, 202)
+COLOR_DARK = (150, 105, 25)
+COLOR_TEXT = (255, 255, 255)
+STATUS_POSITION = (300, 0)
+# Frames per second of the event loop, which also bounds the delay between input and the screen
+FRAME_RATE = 30
+IMG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'img')
+
+
+def square_rect(square):
+    """
+    Returns the area of the window a board square covers.
+    :param square: tuple of integers representing a board position
+    :return: pygame.Rect
+    """
+    return pygame.Rect(BOARD_OFFSET + square[1] * SQUARE_LEN, BOARD_OFFSET + square[0] * SQUARE_LEN,
+                       SQUARE_LEN, SQUARE_LEN)
+
+
+class ExplosionAnimation:
+    """
+    A class that represents an explosion playing over a square, one image of the sprite per frame.
+    """
+    def __init__(self, square, images):
+        self._center = square_rect(square).center
+        self._images = images
+        self._frame = 0
+        self._rect = None
+
+    def get_rect(self):
+        """Returns the area the last image was drawn on, or None before the first frame."""
+        return self._rect
+
+    def is_finished(self):
+        """Returns True once every image has been shown."""
+        return self._frame >= len(self._images)
+
+    def draw_next_frame(self, screen):
+        """
+        Draws the next image of the sprite, centered on the square.
+        :param screen: pygame.Surface to draw on
+        :return: pygame.Rect of the area drawn on
+        """
+        image = self._images[self._frame]
+        self._rect = image.get_rect(center=self._center)
+        screen.blit(image, self._rect)
+        self._frame += 1
+        return self._rect
+
+
+class ChessGUI:
+    """
+    A class that represents the window a game of atomic chess is played in. Piece images and the empty
+    board are prepared once, and each redraw only repaints the squares that changed since the last one.
+    """
+    def __init__(self, game):
+        # initializing imported module
+        pygame.init()
+        # displaying a window of height
+        self._screen = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE))
+        pygame.display.set_caption('Atomic Chess')
+        self._font = pygame.font.SysFont('Arial', 45, 1)
+        self._clock = pygame.time.Clock()
+
+        # Explosion animation
+        self._explosion_sprite = [
+            pygame.image.load(os.path.join(IMG_DIR, f"explosion_{str(size)}_pix.png")).convert_alpha()
+            for size in (50, 100, 150, 200, 250, 300)
+        ]
+        self._piece_images = load_piece_images()
+        self._background = render_background()
+
+        # What is on the screen: (color, piece type) by square, and the status line with its area
+        self._shown_pieces = None
+        self._status = None
+        self._status_surface = None
+        self._status_rect = pygame.Rect(STATUS_POSITION, (0, 0))
+        # Animations of rule events waiting for or in the middle of being played, oldest first
+        self._animations = []
+
+        self._game = game
+        self._game.add_listener(self.handle_rule_event)
+
+    def handle_rule_event(self, event, *details):
+        """
+        Listener registered with the game. Queues an animation for each explosion reported by the rules
+        engine and returns at once; the event loop plays the animation over the following frames.
+        :param event: string naming the rule event
+        :param details: event specific values sent by the game
+        :return: Nothing
+        """
+        if event == 'EXPLOSION':
+            self._animations.append(ExplosionAnimation(details[0], self._explosion_sprite))
+
+    def get_animations(self):
+        """Returns the list of animations still to finish, oldest first."""
+        return self._animations
+
+    def advance_animations(self):
+        """
+        Plays one frame of every queued animation: the area each covered in the last frame is repainted,
+        then each unfinished one draws its next image on top. An animation leaves the queue in the frame
+        that repaints the area of its last image.
+        :return: list of pygame.Rect areas that changed
+        """
+        dirty_rects = []
+        for animation in self._animations:
+            if animation.get_rect():
+                self.draw_area(animation.get_rect())
+                dirty_rects.append(animation.get_rect())
+        self._animations = [animation for animation in self._animations if not animation.is_finished()]
+        for animation in self._animations:
+            dirty_rects.append(animation.draw_next_frame(self._screen))
+        return dirty_rects
+
+    def get_status(self):
+        """
+        Returns the line shown above the board: whose turn it is, or who won.
+        :return: string
+        """
+        game_state = self._game.get_game_state()
+        if game_state == 'UNFINISHED':
+            return f"{self._game.get_player_turn().capitalize()}'s turn!"
+        if 'BLACK' in game_state:
+            return 'Black won!'
+        return 'White won!'
+
+    def display_board(self):
+        """
+        Draws the board, the pieces and whose turn it is (or who won). Only the squares whose piece
+        changed since the last call, and the status line if it changed, are repainted and sent to the
+        display; the first call draws the whole window.
+        :return: Nothing
+        """
+        pygame.display.update(self.redraw_board())
+
+    def draw_frame(self):
+        """
+        Draws one frame of the event loop: repaints what changed in the game, advances the animations
+        and sends every changed area to the display.
+        :return: Nothing
+        """
+        dirty_rects = self.redraw_board() + self.advance_animations()
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
+
+    def redraw_board(self):
+        """
+        Repaints the squares whose piece changed since the last redraw, and the status line if it
+        changed, or the whole window the first time.
+        :return: list of pygame.Rect areas that changed
+        """
+        shown_pieces = {}
+        for row in self._game.get_board():
+            for piece in row:
+                if piece:
+                    shown_pieces[piece.get_position()] = (piece.get_color(), piece.get_piece_type())
+
+        dirty_rects = []
+        status = self.get_status()
+        if status != self._status:
+            self._status = status
+            self._status_surface = self._font.render(status, False, COLOR_TEXT)
+            old_rect = self._status_rect
+            self._status_rect = self._status_surface.get_rect(topleft=STATUS_POSITION)
+            dirty_rects.append(old_rect.union(self._status_rect))
+
+        if self._shown_pieces is None:
+            self._shown_pieces = shown_pieces
+            self.draw_area(self._screen.get_rect())
+            return [self._screen.get_rect()]
+
+        changed = {square for square, _ in shown_pieces.items() ^ self._shown_pieces.items()}
+        dirty_rects.extend(square_rect(square) for square in changed)
+        self._shown_pieces = shown_pieces
+        for rect in dirty_rects:
+            self.draw_area(rect)
+        return dirty_rects
+
+    def draw_area(self, rect):
+        """
+        Repaints part of the window from the board background, the pieces shown and the status line.
+        :param rect: pygame.Rect of the area to repaint
+        :return: Nothing
+        """
+        screen = self._screen
+        screen.set_clip(rect)
+        screen.blit(self._background, rect, rect)
+        for square, piece in self._shown_pieces.items():
+            area = square_rect(square)
+            if area.colliderect(rect):
+                screen.blit(self._piece_images[piece], (area.x + PIECE_MARGIN, area.y + PIECE_MARGIN))
+        if self._status_rect.colliderect(rect):
+            screen.blit(self._status_surface, self._status_rect)
+        screen.set_clip(None)
+
+    def run(self):
+        """
+        Runs the event loop until the window is closed. A move is made by pressing the mouse on a
+        piece and releasing it on the destination square. Every frame handles the input that arrived,
+        then draws, so a move shows on screen within a frame even while an explosion is playing.
+        :return: Nothing
+        """
+        self.display_board()
+
+        alg_from_square = None
+        running = True
+        while running:
+            for event in pygame.event.get():
+                if event.type == pygame.MOUSEBUTTONDOWN:
+                    alg_from_square = position_to_algebraic(event.dict['pos'])
+                if event.type == pygame.MOUSEBUTTONUP and alg_from_square:
+                    alg_to_square = position_to_algebraic(event.dict['pos'])
+                    if alg_to_square:
+                        self._game.make_move(alg_from_square, alg_to_square)
+                if event.type == pygame.QUIT:
+                    running = False
+            self.draw_frame()
+            self._clock.tick(FRAME_RATE)
+        pygame.quit()
+
+
+def load_piece_images():
+    """
+    Loads the image of every piece once, so redraws do not read and decode image files.
+    :return: dictionary of surfaces keyed by (color, piece type), such as ('WHITE', 'KING')
+    """
+    return {(color, piece_type): pygame.image.load(os.path.join(IMG_DIR, f'{color}_{piece_type}.png'.lower()))
+            .convert_alpha()
+            for color in ('WHITE', 'BLACK')
+            for piece_type in ('KING', 'QUEEN', 'ROOK', 'BISHOP', 'KNIGHT', 'PAWN')}
+
+
+def render_background():
+    """
+    Draws the empty board with its border onto a surface, which redraws copy from.
+    :return: pygame.Surface the size of the window
+    """
+    background = pygame.Surface((WINDOW_SIZE, WINDOW_SIZE)).convert()
+    background.fill(COLOR_BORDER)
+    for row in range(8):
+        for col in range(8):
+            background.fill(COLOR_LIGHT if (row + col) % 2 == 0 else COLOR_DARK, square_rect((row, col)))
+    return background
+
+
+# Function for converting coords to algebraic notaion
+def position_to_algebraic(pos):
+    """
+    Converts a pixel position in the window to the square it falls on in algebraic notation.
+    :param pos: tuple of integers (x, y) in pixels
+    :return: string of the square in algebraic notation, or '' if off the board
+    """
+    letter_dict = {0: 'a',
+                   1: 'b',
+                   2: 'c',
+                   3: 'd',
+                   4: 'e',
+                   5: 'f',
+                   6: 'g',
+                   7: 'h',
+                   }
+    y, x = pos[0], pos[1]
+    x = int(10 - ((x + (SQUARE_LEN / 2)) // SQUARE_LEN) - 1)
+    y = ((y + (SQUARE_LEN / 2)) // SQUARE_LEN) - 1
+
+    if y not in letter_dict:
+        return ''
+    return f'{letter_dict[y]}{str(x)}'
+
+
+if __name__ == '__main__':
+    ChessGUI(ChessVar()).run()
@@ -1,24 +1,30 @@
 # Author: Reid Singleton
 # GitHub username: reidwarner
 # Date: 5/27/2024
-# Description: A program for playing atomic chess.
+# Description: A program for playing atomic chess. This module holds the rules engine only and does
+#              not depend on pygame; see ChessGUI.py for the graphical front end.
 
-import pygame, os
-from pygame.locals import *
+import copy
 
-SQUARE_LEN = 100
+from AttackTables import (BISHOP_DIRECTIONS, BLAST_MASKS, BLAST_SQUARES, KING_ATTACKS, KING_SQUARES,
+                          KNIGHT_SQUARES, PAWN_CAPTURE_SQUARES, POSITIONS, QUEEN_DIRECTIONS, RAY_SQUARES,
+                          ROOK_DIRECTIONS, SQUARE_NAMES, SQUARE_POSITIONS)
+from Evaluation import MATERIAL_VALUES, PIECE_SQUARE_VALUES
+import PositionEncoding
+from ZobristKeys import PIECE_KEYS, SIDE_KEY, UNMOVED_PAWN_KEYS
 
-pygame.font.init()
-my_font = pygame.font.SysFont('Arial', 45, 1)
 
 class ChessVar:
     """
-    A class that represents a game of atomic chess.
+    A class that represents a game of atomic chess. Games and pieces use __slots__, so an idle game
+    costs the board, its 32 pieces and a few small lists (see MemoryBenchmark.py).
     """
+    __slots__ = ('_game_state', '_player_turn', '_board', '_listeners', '_undo_stack', '_move_list', '_start_fen',
+                 '_hash', '_kings', '_legal_moves', '_material', '_piece_square_score', '_king_exposure')
+
     def __init__(self):
         self._game_state = 'UNFINISHED'
         self._player_turn = 'WHITE'
-        self._pieces = []
         self._board = [
                        [None, None, None, None, None, None, None, None],                # Chess board notation row 8
                        [None, None, None, None, None, None, None, None],
@@ -29,6 +35,16 @@ class ChessVar:
                        [None, None, None, None, None, None, None, None],
                        [None, None, None, None, None, None, None, None],              # Chess board notation row 1
                      ]
+        self._listeners = []
+        self._undo_stack = []
+        self._move_list = []
+        self._start_fen = None
+        self._hash = 0
+        self._kings = {}
+        self._legal_moves = None
+        self._material = 0
+        self._piece_square_score = 0
+        self._king_exposure = {'WHITE': 0, 'BLACK': 0}
 
         self.initialize_board()
 
@@ -47,114 +63,591 @@ class ChessVar:
         """
         return self._player_turn
 
+    def position_hash(self):
+        """
+        A method that returns the 64-bit Zobrist key of the current position. The key covers every
+        piece and square, whether each pawn has made its first move and the side to move, and is
+        kept up to date by push, explosion and pop instead of being recomputed.
+        :return: integer hash of the position
+        """
+        return self._hash
+
+    def compute_hash(self):
+        """
+        Computes the Zobrist key of the current position from scratch by walking the board.
+        :return: integer hash of the position
+        """
+        position_hash = SIDE_KEY if self._player_turn == 'BLACK' else 0
+        for row in self._board:
+            for piece in row:
+                if piece:
+                    position_hash ^= piece.get_zobrist_key()
+        return position_hash
+
+    def get_material(self):
+        """
+        Returns the material balance, kept up to date by push, explosion and pop like the position hash.
+        :return: integer centipawns of white's pieces minus black's, valued by Evaluation.PIECE_VALUES
+        """
+        return self._material
+
+    def get_piece_square_score(self):
+        """
+        Returns the balance of the piece-square bonuses, kept up to date by push, explosion and pop.
+        :return: integer centipawns of white's bonuses minus black's, from Evaluation.PIECE_SQUARE_VALUES
+        """
+        return self._piece_square_score
+
+    def get_king_exposure(self, color):
+        """
+        Returns the number of a player's pieces standing next to its own king, any of which a capture
+        can blow the king up through. Kept up to date by push, explosion and pop.
+        :param color: 'WHITE' or 'BLACK'
+        :return: integer count
+        """
+        return self._king_exposure[color]
+
+    def compute_evaluation_terms(self):
+        """
+        Computes the evaluation terms of the current position from scratch by walking the board.
+        :return: tuple (integer material, integer piece-square score, dictionary of king exposure by color)
+        """
+        material = 0
+        piece_square_score = 0
+        for row in self._board:
+            for piece in row:
+                if piece:
+                    material += piece.get_material_value()
+                    piece_square_score += piece.get_square_value()
+        return material, piece_square_score, {color: self.count_king_exposure(color) for color in ('WHITE', 'BLACK')}
+
+    def count_king_exposure(self, color):
+        """
+        Counts a player's pieces next to its own king by looking at the squares around the king.
+        :param color: 'WHITE' or 'BLACK'
+        :return: integer count, 0 if the player has no king
+        """
+        king = self._kings.get(color)
+        if king is None:
+            return 0
+        count = 0
+        for row, col in KING_SQUARES[king.get_position()[0] * 8 + king.get_position()[1]]:
+            piece = self._board[row][col]
+            if piece and piece.get_color() == color and piece.get_piece_type() != 'KING':
+                count += 1
+        return count
+
+    def remove_evaluation_terms(self, piece):
+        """
+        Takes a piece leaving the board out of the evaluation terms.
+        :param piece: piece object, still holding the position it left
+        :return: Nothing
+        """
+        self._material -= piece.get_material_value()
+        self._piece_square_score -= piece.get_square_value()
+        color = piece.get_color()
+        king = self._kings.get(color)
+        if king is not None and piece is not king:
+            row, col = piece.get_position()
+            king_row, king_col = king.get_position()
+            if KING_ATTACKS[king_row * 8 + king_col] >> (row * 8 + col) & 1:
+                self._king_exposure[color] -= 1
+
+    def copy(self):
+        """
+        Creates an independent copy of the game's current position, for example for a search to play
+        moves on without disturbing the game's listeners. The copy has no listeners and no moves to
+        take back, but it keeps the moves that led to the position.
+        :return: ChessVar object
+        """
+        game = ChessVar.__new__(ChessVar)
+        game._game_state = self._game_state
+        game._player_turn = self._player_turn
+        game._listeners = []
+        game._undo_stack = []
+        game._move_list = self._move_list[:]
+        game._start_fen = self._start_fen
+        game._hash = self._hash
+        game._legal_moves = None
+        game._material = self._material
+        game._piece_square_score = self._piece_square_score
+        game._king_exposure = dict(self._king_exposure)
+        game._board = [[copy.copy(piece) if piece else None for piece in row] for row in self._board]
+        game._kings = {}
+        for color, king in self._kings.items():
+            row, col = king.get_position()
+            on_board = game._board[row][col]
+            game._kings[color] = on_board if on_board and on_board.get_piece_type() == 'KING' else copy.copy(king)
+        return game
+
+    def set_up_position(self, pieces, player_turn='WHITE', game_state='UNFINISHED'):
+        """
+        Replaces the current position with the given pieces, for positions that do not come from the
+        starting position. Listeners are kept but there are no moves to take back, and the move list
+        starts again from the new position.
+        :param pieces: list of piece objects, each holding the position it stands on
+        :param player_turn: 'WHITE' or 'BLACK', the player to move
+        :param game_state: 'UNFINISHED', 'WHITE_WON' or 'BLACK_WON'
+        :return: Nothing
+        """
+        self._game_state = game_state
+        self._player_turn = player_turn
+        self._board = [[None] * 8 for _ in range(8)]
+        self._undo_stack = []
+        self._kings = {}
+        for piece in pieces:
+            row, col = piece.get_position()
+            self._board[row][col] = piece
+            if piece.get_piece_type() == 'KING':
+                self._kings[piece.get_color()] = piece
+        self._hash = self.compute_hash()
+        self._material, self._piece_square_score, self._king_exposure = self.compute_evaluation_terms()
+        self._legal_moves = None
+        self._move_list = []
+        self._start_fen = self.to_fen()
+
+    def is_position_valid(self):
+        """
+        Checks a position set up from outside, such as a FEN sent by a client, can be played from: a game
+        that is not over needs exactly one king of each color.
+        :return: True if the position can be played from or the game is over, False if not
+        """
+        if self._game_state != 'UNFINISHED':
+            return True
+        kings = [piece.get_color() for row in self._board for piece in row
+                 if piece and piece.get_piece_type() == 'KING']
+        return sorted(kings) == ['BLACK', 'WHITE']
+
+    @classmethod
+    def from_piece_codes(cls, pieces, player_turn=0, game_state=0):
+        """
+        Creates a game from a position in the form used by PositionEncoding.
+        :param pieces: list of (integer square index, integer piece code) pairs
+        :param player_turn: integer color to move, 0 for white and 1 for black
+        :param game_state: integer index into PositionEncoding.GAME_STATES
+        :return: ChessVar object
+        """
+        board_pieces = []
+        for square, code in pieces:
+            color, piece_type, unmoved = PositionEncoding.decode_piece_code(code)
+            piece = PIECE_CLASSES[PositionEncoding.PIECE_TYPES[piece_type]](PositionEncoding.COLORS[color],
+                                                                            POSITIONS[square])
+            if PositionEncoding.PIECE_TYPES[piece_type] == 'PAWN' and not unmoved:
+                piece.set_pawn_move_status()
+            board_pieces.append(piece)
+        game = cls.__new__(cls)
+        game._listeners = []
+        game.set_up_position(board_pieces, PositionEncoding.COLORS[player_turn],
+                             PositionEncoding.GAME_STATES[game_state])
+        return game
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        Creates a game from a position in the FEN dialect of PositionEncoding, or in standard FEN.
+        :param fen: string FEN
+        :return: ChessVar object
+        """
+        return cls.from_piece_codes(*PositionEncoding.from_fen(fen))
+
+    @classmethod
+    def from_packed(cls, data):
+        """
+        Creates a game from a position packed by to_packed.
+        :param data: bytes of length PositionEncoding.PACKED_SIZE
+        :return: ChessVar object
+        """
+        return cls.from_piece_codes(*PositionEncoding.unpack(data))
+
+    def get_piece_codes(self):
+        """
+        Returns the pieces on the board in the form used by PositionEncoding.
+        :return: list of (integer square index, integer piece code) pairs
+        """
+        pieces = []
+        square = 0
+        for row in self._board:
+            for piece in row:
+                if piece:
+                    if piece.get_piece_type() == 'PAWN' and not piece.get_pawn_move_status():
+                        code = PositionEncoding.UNMOVED_PAWN_CODES[piece.get_color() == 'BLACK']
+                    else:
+                        code = PositionEncoding.PIECE_CODES[(piece.get_color(), piece.get_piece_type())]
+                    pieces.append((square, code))
+                square += 1
+        return pieces
+
+    def to_fen(self):
+        """
+        Writes the current position in the FEN dialect of PositionEncoding, which also records which
+        pawns have made their first move and whether the game is over.
+        :return: string FEN
+        """
+        return PositionEncoding.to_fen(self.get_piece_codes(), PositionEncoding.COLORS.index(self._player_turn),
+                                       PositionEncoding.GAME_STATES.index(self._game_state))
+
+    def to_packed(self):
+        """
+        Packs the current position into PositionEncoding.PACKED_SIZE bytes.
+        :return: bytes
+        """
+        return PositionEncoding.pack(self.get_piece_codes(), PositionEncoding.COLORS.index(self._player_turn),
+                                     PositionEncoding.GAME_STATES.index(self._game_state))
+
+    def get_move_list(self):
+        """
+        Returns the moves played since the game started or its position was set up, oldest first.
+        :return: list of move strings such as 'e2e4'
+        """
+        return [self.translate_position(start) + self.translate_position(end) for start, end in self._move_list]
+
+    def get_start_fen(self):
+        """
+        Returns the position the move list starts from.
+        :return: string FEN in the dialect of PositionEncoding
+        """
+        return self._start_fen or PositionEncoding.START_FEN
+
+    def get_board(self):
+        """
+        A method that returns the board, a list of lists of piece objects (or None) indexed by row then
+        column, where row 0 is rank 8.
+        :return: list of lists representing the chess board
+        """
+        return self._board
+
+    def add_listener(self, listener):
+        """
+        Registers a callable that is notified of rule events, such as a front end that wants to
+        animate moves and explosions. The rules engine never waits on its listeners.
+        :param listener: callable taking an event name ('MOVE' or 'EXPLOSION') followed by its details
+        :return: Nothing
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Unregisters a callable previously added with add_listener.
+        :param listener: callable to remove
+        :return: Nothing
+        """
+        self._listeners.remove(listener)
+
+    def notify_listeners(self, event, *details):
+        """
+        Sends a rule event to every registered listener.
+        :param event: string naming the event
+        :param details: event specific values, see make_move and explosion
+        :return: Nothing
+        """
+        for listener in self._listeners:
+            listener(event, *details)
+
     def make_move(self, move_from, move_to):
         """
-        A method for moving a chess piece.
+        A method for moving a chess piece. Listeners receive a 'MOVE' event with the start and end
+        squares before any explosion is resolved.
         :param move_from: string that represents where the piece the player wants to move is in algebraic notation
         :param move_to: string that represents where the piece is to be moved in algebraic notation
         :return: True if move is successful, False if not successful
         """
-        # If game has already been won, return False
-        if self._game_state != 'UNFINISHED':
+        result, move = self.validate_move(move_from, move_to)
+        if move is None:
             return False
+        self.push(move)
+        return True
+
+    def validate_move(self, move_from, move_to):
+        """
+        Checks a move for make_move without making it, giving the reason a move is refused.
+        :param move_from: string that represents where the piece the player wants to move is in algebraic notation
+        :param move_to: string that represents where the piece is to be moved in algebraic notation
+        :return: tuple (string result, one of MOVE_RESULTS, and the move as a tuple (start, end) of board
+                 positions ready for push, or None if the move is refused)
+        """
+        # If game has already been won, the move is refused
+        if self._game_state != 'UNFINISHED':
+            return 'GAME_OVER', None
 
         # Get the piece object at the move_from square and check the inputs are valid
         square_start = self.translate_square(move_from)
         if square_start[0] is False:
-            return False
+            return 'BAD_SQUARE', None
         square_end = self.translate_square(move_to)
-        if square_start[1] is False:
-            return False
+        if square_end[0] is False:
+            return 'BAD_SQUARE', None
 
         piece = self._board[square_start[0]][square_start[1]]
 
-        # If a piece is not at start square, return False
+        # If a piece is not at start square, the move is refused
         if not piece:
-            return False
+            return 'NO_PIECE', None
 
         # Check if piece to be moved violates a player's turn
         if piece.get_color() != self._player_turn:
-            return False
-
-        # Get list of valid moves for the piece
-        valid_moves = piece.get_valid_moves(self._board)
+            return 'WRONG_TURN', None
 
-        # If the move_to square is in the list, make the move and return True
-        if square_end in valid_moves:
+        # A position whose legal moves have been generated already answers from them
+        if self._legal_moves is not None and (square_start, square_end) in self._legal_moves:
+            return 'ACCEPTED', (piece.get_position(), square_end)
 
-            # If a piece is being captured, detonate explosion and remove affected pieces
-            captured_piece = self._board[square_end[0]][square_end[1]]
-            if captured_piece:
-                captured_piece.capture_piece()
-                self._board[square_end[0]][square_end[1]] = piece
-                self._board[square_start[0]][square_start[1]] = None
-                self.explosion(self._board, square_end)
+        # The move_to square must be in the piece's list of valid moves. The king's list leaves out the
+        # captures it is not allowed to make, which are told apart from other invalid moves
+        end_index = square_end[0] * 8 + square_end[1]
+        target = self._board[square_end[0]][square_end[1]]
+        if square_end not in piece.get_valid_moves(self._board):
+            if (piece.get_piece_type() == 'KING' and target and target.get_color() != piece.get_color()
+                    and KING_ATTACKS[square_start[0] * 8 + square_start[1]] >> end_index & 1):
+                return 'KING_CAPTURE', None
+            return 'INVALID_MOVE', None
 
-            # Move the piece
-            if not captured_piece:
-                self._board[square_end[0]][square_end[1]] = piece
-                self._board[square_start[0]][square_start[1]] = None
-                piece.set_position((square_end[0], square_end[1]))
+        # A capture may not blow up both kings at the same time
+        if target and self.get_double_king_blast_mask() >> end_index & 1:
+            return 'BLAST_BOTH_KINGS', None
 
-            # Check if pawn to set has moved
-            if piece.get_piece_type() == 'PAWN' and not piece.get_pawn_move_status():
-                piece.set_pawn_move_status()
+        # The move is given with the shared position tuples so that pieces of idle games do not hold their
+        # own copies
+        return 'ACCEPTED', (piece.get_position(), square_end)
 
-            # Change Player Turn
-            if self._player_turn == 'WHITE':
-                self._player_turn = 'BLACK'
-            else:
-                self._player_turn = 'WHITE'
+    def generate_moves(self):
+        """
+        Creates a list of all the moves the pieces of the player whose turn it is can make.
+        :return: list of tuples (start, end) of board positions
+        """
+        moves = []
+        if self._game_state != 'UNFINISHED':
+            return moves
+        board = self._board
+        for row in board:
+            for piece in row:
+                if piece and piece.get_color() == self._player_turn:
+                    start = piece.get_position()
+                    for end in piece.get_valid_moves(board):
+                        moves.append((start, end))
+        return moves
 
+    def is_move_legal(self, move):
+        """
+        Applies the atomic chess rules that hold for every piece to one of a piece's valid moves: the
+        king is not allowed to capture, and a capture may not blow up both kings at the same time.
+        :param move: tuple (start, end) of board positions
+        :return: True if the move is allowed, False if not
+        """
+        square_start, square_end = move
+        piece = self._board[square_start[0]][square_start[1]]
+        if not self._board[square_end[0]][square_end[1]]:
             return True
-        else:
+        if piece.get_piece_type() == 'KING':
             return False
+        return not self.get_double_king_blast_mask() >> (square_end[0] * 8 + square_end[1]) & 1
+
+    def get_double_king_blast_mask(self):
+        """
+        Returns the squares where a capture would blow up both kings: the squares whose explosion
+        covers both of them. A position set up without one of the kings has none.
+        :return: integer bitboard of square indexes row * 8 + col
+        """
+        white_king = self._kings.get('WHITE')
+        black_king = self._kings.get('BLACK')
+        if white_king is None or black_king is None:
+            return 0
+        white_row, white_col = white_king.get_position()
+        black_row, black_col = black_king.get_position()
+        return BLAST_MASKS[white_row * 8 + white_col] & BLAST_MASKS[black_row * 8 + black_col]
+
+    def legal_moves(self):
+        """
+        Creates every legal move for the player whose turn it is in one pass, applying the same rules
+        as make_move. The result is kept until the position changes, so calling it again is free.
+        :return: tuple of moves, each a tuple (start, end) of board positions
+        """
+        if self._legal_moves is None:
+            if self._game_state != 'UNFINISHED':
+                self._legal_moves = ()
+                return self._legal_moves
+            board = self._board
+            double_king_blast = self.get_double_king_blast_mask()
+            moves = []
+            for move in self.generate_moves():
+                row, col = move[1]
+                if board[row][col] and double_king_blast >> (row * 8 + col) & 1:
+                    continue
+                moves.append(move)
+            self._legal_moves = tuple(moves)
+        return self._legal_moves
+
+    def perft(self, depth, divide=False):
+        """
+        Counts the positions reached by playing every sequence of moves of the given length, a standard
+        check of move generation correctness and speed. Finished games are not played past.
+        :param depth: integer number of moves to look ahead
+        :param divide: if True, return the count under each first move instead of the total
+        :return: integer count, or dictionary of move string (such as 'e2e4') to count if divide is True
+        """
+        if not divide:
+            return self._perft(depth)
+        counts = {}
+        for move in self.legal_moves():
+            self.push(move)
+            counts[self.translate_position(move[0]) + self.translate_position(move[1])] = self._perft(depth - 1)
+            self.pop()
+        return counts
+
+    def _perft(self, depth):
+        """
+        Recursive helper for perft.
+        :param depth: integer number of moves to look ahead
+        :return: integer count of positions
+        """
+        if depth == 0:
+            return 1
+        moves = self.legal_moves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.push(move)
+            nodes += self._perft(depth - 1)
+            self.pop()
+        return nodes
+
+    def push(self, move):
+        """
+        Plays a move without checking it is valid, resolving any explosion and passing the turn. The
+        position hash and evaluation terms are updated for the pieces that move or are removed only. An
+        undo record holding the pieces the move removed, the moving pawn's first-move status, the
+        previous game state, hash and evaluation terms is kept so pop can take the move back, and the move
+        joins the move list.
+        Listeners receive a 'MOVE' event with the start and end squares before any explosion is resolved.
+        :param move: tuple (start, end) of board positions, such as an entry of a piece's valid moves
+        :return: Nothing
+        """
+        square_start, square_end = move
+        board = self._board
+        piece = board[square_start[0]][square_start[1]]
+        captured_piece = board[square_end[0]][square_end[1]]
+        previous_state = self._game_state
+        pawn_status = None
+        removed = []
+
+        previous_hash = self._hash
+        previous_terms = (self._material, self._piece_square_score, self._king_exposure)
+        self._legal_moves = None
+
+        self.notify_listeners('MOVE', square_start, square_end)
+
+        self._hash ^= piece.get_zobrist_key()
+        board[square_end[0]][square_end[1]] = piece
+        board[square_start[0]][square_start[1]] = None
+        piece.set_position(square_end)
+
+        # Check if pawn to set has moved
+        if piece.get_piece_type() == 'PAWN':
+            pawn_status = piece.get_pawn_move_status()
+            piece.set_pawn_move_status()
+        self._hash ^= piece.get_zobrist_key()
+
+        # Update the evaluation terms for the moving piece. A moving king has new neighbours, and any
+        # other piece may step next to or away from its king. The exposure counts are copied before
+        # they change, since the undo record holds the old ones
+        color = piece.get_color()
+        start_index = square_start[0] * 8 + square_start[1]
+        end_index = square_end[0] * 8 + square_end[1]
+        square_values = PIECE_SQUARE_VALUES[(color, piece.get_piece_type())]
+        self._piece_square_score += square_values[end_index] - square_values[start_index]
+        king = self._kings.get(color)
+        if piece is king:
+            self._king_exposure = dict(self._king_exposure)
+            self._king_exposure[color] = self.count_king_exposure(color)
+        elif king is not None:
+            king_row, king_col = king.get_position()
+            king_squares = KING_ATTACKS[king_row * 8 + king_col]
+            change = (king_squares >> end_index & 1) - (king_squares >> start_index & 1)
+            if change:
+                self._king_exposure = dict(self._king_exposure)
+                self._king_exposure[color] += change
+
+        # If a piece is being captured, detonate explosion and remove affected pieces
+        if captured_piece:
+            self._hash ^= captured_piece.get_zobrist_key()
+            if self._king_exposure is previous_terms[2]:
+                self._king_exposure = dict(self._king_exposure)
+            self.remove_evaluation_terms(captured_piece)
+            captured_piece.capture_piece()
+            removed.append(captured_piece)
+            if captured_piece.get_piece_type() == 'KING':
+                self._game_state = f'{piece.get_color()}_WON'
+            for destroyed_piece in self.explosion(board, square_end):
+                if destroyed_piece is not piece:
+                    removed.append(destroyed_piece)
+
+        # Change Player Turn
+        if self._player_turn == 'WHITE':
+            self._player_turn = 'BLACK'
+        else:
+            self._player_turn = 'WHITE'
+        self._hash ^= SIDE_KEY
+
+        self._undo_stack.append((square_start, square_end, piece, pawn_status, removed, previous_state,
+                                 previous_hash, previous_terms))
+        self._move_list.append(move)
+
+    def pop(self):
+        """
+        Takes back the last move played with push or make_move, putting back every piece the move
+        removed.
+        :return: tuple (start, end) of board positions of the move taken back
+        """
+        (square_start, square_end, piece, pawn_status, removed, previous_state,
+         previous_hash, previous_terms) = self._undo_stack.pop()
+        self._move_list.pop()
+        board = self._board
+
+        board[square_end[0]][square_end[1]] = None
+        for removed_piece in removed:
+            row, col = removed_piece.get_position()
+            board[row][col] = removed_piece
+            removed_piece.restore_piece()
+
+        board[square_start[0]][square_start[1]] = piece
+        piece.set_position(square_start)
+        piece.restore_piece()
+        if pawn_status is not None:
+            piece.set_pawn_move_status(pawn_status)
+
+        if self._player_turn == 'WHITE':
+            self._player_turn = 'BLACK'
+        else:
+            self._player_turn = 'WHITE'
+        self._game_state = previous_state
+        self._hash = previous_hash
+        self._material, self._piece_square_score, self._king_exposure = previous_terms
+        self._legal_moves = None
+
+        return square_start, square_end
 
     def initialize_board(self):
         """
-        Sets up the board for a new game.
+        Sets up the board for a new game, replacing any game in progress. Listeners are kept.
         :return: Nothing
         """
-        # Initialize white pieces
-        white_king = self._pieces.append(King('WHITE', self.translate_square('e1')))
-        white_queen = self._pieces.append(Queen("WHITE", self.translate_square('d1')))
-        white_rook_1 = self._pieces.append(Rook('WHITE', self.translate_square('a1')))
-        white_rook_2 = self._pieces.append(Rook('WHITE', self.translate_square('h1')))
-        white_knight_1 = self._pieces.append(Knight("WHITE", self.translate_square('b1')))
-        white_knight_2 = self._pieces.append(Knight("WHITE", self.translate_square('g1')))
-        white_bishop_1 = self._pieces.append(Bishop("WHITE", self.translate_square('c1')))
-        white_bishop_2 = self._pieces.append(Bishop("WHITE", self.translate_square('f1')))
-        white_pawn_1 = self._pieces.append(Pawn("WHITE", self.translate_square('a2')))
-        white_pawn_2 = self._pieces.append(Pawn("WHITE", self.translate_square('b2')))
-        white_pawn_3 = self._pieces.append(Pawn("WHITE", self.translate_square('c2')))
-        white_pawn_4 = self._pieces.append(Pawn("WHITE", self.translate_square('d2')))
-        white_pawn_5 = self._pieces.append(Pawn("WHITE", self.translate_square('e2')))
-        white_pawn_6 = self._pieces.append(Pawn("WHITE", self.translate_square('f2')))
-        white_pawn_7 = self._pieces.append(Pawn("WHITE", self.translate_square('g2')))
-        white_pawn_8 = self._pieces.append(Pawn("WHITE", self.translate_square('h2')))
-
-        # Initialize black pieces
-        black_king = self._pieces.append(King('BLACK', self.translate_square('e8')))
-        black_queen = self._pieces.append(Queen("BLACK", self.translate_square('d8')))
-        black_rook_1 = self._pieces.append(Rook('BLACK', self.translate_square('a8')))
-        black_rook_2 = self._pieces.append(Rook('BLACK', self.translate_square('h8')))
-        black_knight_1 = self._pieces.append(Knight("BLACK", self.translate_square('b8')))
-        black_knight_2 = self._pieces.append(Knight("BLACK", self.translate_square('g8')))
-        black_bishop_1 = self._pieces.append(Bishop("BLACK", self.translate_square('c8')))
-        black_bishop_2 = self._pieces.append(Bishop("BLACK", self.translate_square('f8')))
-        black_pawn_1 = self._pieces.append(Pawn("BLACK", self.translate_square('a7')))
-        black_pawn_2 = self._pieces.append(Pawn("BLACK", self.translate_square('b7')))
-        black_pawn_3 = self._pieces.append(Pawn("BLACK", self.translate_square('c7')))
-        black_pawn_4 = self._pieces.append(Pawn("BLACK", self.translate_square('d7')))
-        black_pawn_5 = self._pieces.append(Pawn("BLACK", self.translate_square('e7')))
-        black_pawn_6 = self._pieces.append(Pawn("BLACK", self.translate_square('f7')))
-        black_pawn_7 = self._pieces.append(Pawn("BLACK", self.translate_square('g7')))
-        black_pawn_8 = self._pieces.append(Pawn("BLACK", self.translate_square('h7')))
-
-        # Add to board
-        for piece in self._pieces:
-            x_coord, y_coord = piece.get_position()
-            self._board[x_coord][y_coord] = piece
+        self._game_state = 'UNFINISHED'
+        self._player_turn = 'WHITE'
+        self._board = [[None] * 8 for _ in range(8)]
+        self._undo_stack = []
+        self._move_list = []
+        self._start_fen = None
+        self._kings = {}
+
+        for color, back_row, pawn_row in (('WHITE', 7, 6), ('BLACK', 0, 1)):
+            for col, piece_class in enumerate(BACK_RANK):
+                self._board[back_row][col] = piece_class(color, POSITIONS[back_row * 8 + col])
+                self._board[pawn_row][col] = Pawn(color, POSITIONS[pawn_row * 8 + col])
+            self._kings[color] = self._board[back_row][4]
+
+        self._hash = self.compute_hash()
+        self._material, self._piece_square_score, self._king_exposure = self.compute_evaluation_terms()
+        self._legal_moves = None
 
     def print_board(self):
         """
@@ -186,67 +679,38 @@ class ChessVar:
         Takes in a square as a parameter in chess board algebraic notation. Returns
         a tuple of the square's address for use in a 2D python array.
         :param square: a string in algebraic notation
-        :return: a tuple of integers
-        """
-        row_dict = {'1': 7,
-                    '2': 6,
-                    '3': 5,
-                    '4': 4,
-                    '5': 3,
-                    '6': 2,
-                    '7': 1,
-                    '8': 0
-                    }
-
-        col_dict = {'a': 0,
-                    'b': 1,
-                    'c': 2,
-                    'd': 3,
-                    'e': 4,
-                    'f': 5,
-                    'g': 6,
-                    'h': 7,
-                    }
-        if square[0] not in col_dict or square[1] not in row_dict:
-            return False, False
-        else:
-            return row_dict[square[1]], col_dict[square[0]]
+        :return: a tuple of integers, or (False, False) if the string does not name a square
+        """
+        return SQUARE_POSITIONS.get(square[:2], NOT_A_SQUARE)
+
+    def translate_position(self, position):
+        """
+        Takes in a board position as a parameter and returns the square in chess board algebraic
+        notation, the reverse of translate_square.
+        :param position: a tuple of integers (row, col)
+        :return: a string in algebraic notation
+        """
+        return SQUARE_NAMES[position[0] * 8 + position[1]]
 
     def explosion(self, board, square):
         """
         A method that represents an explosion when a chess piece attacks an opponent's piece. Updates the
-        game board data member if the explosion removes chess pieces.
+        game board data member if the explosion removes chess pieces, then notifies listeners with an
+        'EXPLOSION' event carrying the square and the list of destroyed pieces.
         :param board: list of lists representing the chess board
         :param square: tuple of integers representing a board position
-        :return: Nothing
+        :return: list of destroyed piece objects
         """
-        blast_radius = [(0, 0), (1, 0), (1, 1), (0, 1), (-1, 0), (-1, 1), (-1, -1), (0, -1), (1, -1)]
-
-        # Animate Explosion
-        explode_x = square[1] * SQUARE_LEN + SQUARE_LEN - (SQUARE_LEN / 4)
-        explode_y = square[0] * SQUARE_LEN + SQUARE_LEN - (SQUARE_LEN / 4)
-
-        for image in explosion_sprite:
-            clock.tick(25)
-            screen.blit(image, (explode_x, explode_y))
-            explode_x -= SQUARE_LEN / 4
-            explode_y -= SQUARE_LEN / 4
-            pygame.display.update()
-
+        destroyed = []
 
         # Check if a pawn suicide
         if board[square[0]][square[1]].get_piece_type() == 'PAWN':
+            destroyed.append(board[square[0]][square[1]])
+            self._hash ^= board[square[0]][square[1]].get_zobrist_key()
+            self.remove_evaluation_terms(board[square[0]][square[1]])
             board[square[0]][square[1]] = None
 
-        for position in blast_radius:
-            blast_x = square[1] + position[1]
-            blast_y = square[0] + position[0]
-
-            if blast_x < 0 or blast_x > 7:
-                continue
-            if blast_y < 0 or blast_y > 7:
-                continue
-
+        for blast_y, blast_x in BLAST_SQUARES[square[0] * 8 + square[1]]:
             affected_piece = board[blast_y][blast_x]
             if affected_piece and affected_piece.get_piece_type() != 'PAWN':
                 affected_piece.capture_piece()
@@ -257,76 +721,38 @@ class ChessVar:
                     else:
                         winner = 'BLACK'
                     self._game_state = f'{winner}_WON'
+                destroyed.append(affected_piece)
+                self._hash ^= affected_piece.get_zobrist_key()
+                self.remove_evaluation_terms(affected_piece)
                 board[blast_y][blast_x] = None
 
-    def display_board(self):
-        """
-        """
-        # Display the board background
-        color_brown = (92, 64, 51)
-        pygame.draw.rect(screen, color_brown, pygame.Rect(0, 0, 900, 900))
-
-        # Initializing Color
-        color_light = (234, 221, 202)
-        color_dark = (150, 105, 25)
-
-        # Drawing Rectangle
-        red_index_left = 50
-        red_index_top = 50
-        for index_i in range(0, 7, 2):
-            for index_j in range(0, 8, 2):
-                pygame.draw.rect(screen, color_light, pygame.Rect(red_index_left + (index_j * SQUARE_LEN),
-                                                                  red_index_top + (index_i * SQUARE_LEN), SQUARE_LEN,
-                                                                  SQUARE_LEN))
-                pygame.draw.rect(screen, color_dark, pygame.Rect(red_index_left + ((index_j + 1) * SQUARE_LEN),
-                                                                 red_index_top + (index_i * SQUARE_LEN), SQUARE_LEN,
-                                                                 SQUARE_LEN))
-            for index_j in range(0, 8, 2):
-                pygame.draw.rect(screen, color_dark, pygame.Rect(red_index_left + (index_j * SQUARE_LEN),
-                                                                 (index_i * SQUARE_LEN) + SQUARE_LEN + red_index_top,
-                                                                 SQUARE_LEN, SQUARE_LEN))
-                pygame.draw.rect(screen, color_light, pygame.Rect(red_index_left + ((index_j + 1) * SQUARE_LEN),
-                                                                  (index_i * SQUARE_LEN) + SQUARE_LEN + red_index_top,
-                                                                  SQUARE_LEN, SQUARE_LEN))
-        # Display current pieces
-        for row in self._board:
-            for piece in row:
-                if piece:
-                    color = piece.get_color()
-                    position =piece.get_position()
-                    piece_type = piece.get_piece_type()
-                    filename = f'{color}_{piece_type}.png'
-                    image = pygame.image.load(os.path.join('img', filename)).convert_alpha()
-                    img_x = position[1] * SQUARE_LEN + (SQUARE_LEN / 2) + 5
-                    img_y = position[0] * SQUARE_LEN + (SQUARE_LEN / 2) + 5
-                    screen.blit(image, (img_x, img_y))
-
-        if self.get_game_state() == 'UNFINISHED':
-            player_turn = self.get_player_turn()
-            player_turn = player_turn.capitalize()
-            text_surface = my_font.render(f"{player_turn}'s turn!", False, (255, 255, 255))
-            screen.blit(text_surface, (300, 0))
-        else:
-            won = self.get_game_state()
-            if 'BLACK' in won:
-                winner = 'Black won!'
-            else:
-                winner = 'White won!'
-            text_surface = my_font.render(winner, False, (255, 255, 255))
-            screen.blit(text_surface, (300, 0))
-
-        pygame.display.flip()
+        self.notify_listeners('EXPLOSION', square, destroyed)
+        return destroyed
 
 
 class ChessPiece:
     """
-    A class that represents the different types of chess pieces. Each piece type inherits from this class.
+    A class that represents the different types of chess pieces. Each piece type inherits from this class
+    and sets its type as a class attribute, so a piece only stores its color, position and captured status.
     """
+    __slots__ = ('_color', '_position', '_captured')
+    _piece_type = ''
+
     def __init__(self, color, position):
         self._color = color
         self._position = position
         self._captured = False
-        self._piece_type = ''
+
+    def __copy__(self):
+        """
+        Creates a copy of the piece for copy.copy, which is otherwise slow for classes with __slots__.
+        :return: piece object of the same class
+        """
+        piece = self.__class__.__new__(self.__class__)
+        piece._color = self._color
+        piece._position = self._position
+        piece._captured = self._captured
+        return piece
 
     def get_color(self):
         """Returns the piece color."""
@@ -352,10 +778,38 @@ class ChessPiece:
         """
         self._captured = True
 
+    def restore_piece(self):
+        """
+        Changes a pieces captured status back to not captured, used when a move is taken back.
+        :return: Nothing
+        """
+        self._captured = False
+
     def get_piece_type(self):
         """Returns the type of piece a piece object is."""
         return self._piece_type
 
+    def get_zobrist_key(self):
+        """
+        Returns the Zobrist key of the piece standing on its current position.
+        :return: integer key
+        """
+        return PIECE_KEYS[(self._color, self._piece_type)][self._position[0] * 8 + self._position[1]]
+
+    def get_material_value(self):
+        """
+        Returns the material value of the piece, negative for black pieces.
+        :return: integer centipawns
+        """
+        return MATERIAL_VALUES[(self._color, self._piece_type)]
+
+    def get_square_value(self):
+        """
+        Returns the piece-square bonus of the piece on its current position, negative for black pieces.
+        :return: integer centipawns
+        """
+        return PIECE_SQUARE_VALUES[(self._color, self._piece_type)][self._position[0] * 8 + self._position[1]]
+
     def is_move_valid(self, board, new_x_coord, new_y_coord, color):
         """
         A method that checks if a potential move is in bounds on the chess board and if a move
@@ -379,275 +833,79 @@ class King(ChessPiece):
     A class that represents a king chess piece. Inherits from
     the ChessPiece class. Can move one square in any direction.
     """
-    def __init__(self, color, position):
-        super().__init__(color=color, position=position)
-        self._piece_type = 'KING'
-        self._king_moves = [(0, 1), (0, -1), (1, 0), (1, 1), (1, -1), (-1, -1), (-1, 0), (-1, 1)]
-
-
+    __slots__ = ()
+    _piece_type = 'KING'
 
     def get_valid_moves(self, board):
         """
-        Creates a list of all the valid, possible moves for a King.
+        Creates a list of all the valid, possible moves for a King. The king is not allowed to
+        capture, so only empty neighbouring squares are valid.
         :param board: list of lists that represents a chess board
         :return: list of tuples that represent coordinates on the chess board
         """
-        x_coord = self._position[1]
-        y_coord = self._position[0]
-        valid_moves = []
-
-        for move in self._king_moves:
-            new_x_coord = x_coord + move[1]
-            new_y_coord = y_coord + move[0]
-            is_valid = self.is_move_valid(board, new_x_coord, new_y_coord, self._color)
-            if is_valid and not board[new_y_coord][new_x_coord]:
-                valid_moves.append((new_y_coord, new_x_coord))
-        return valid_moves
+        return [target for target in KING_SQUARES[self._position[0] * 8 + self._position[1]]
+                if not board[target[0]][target[1]]]
 
 
-class Queen(ChessPiece):
+class SlidingPiece(ChessPiece):
     """
-    A class that represents a Queen chess piece. Inherits from
-    the ChessPiece class. Can move any amount of squares diagonally, vertically
-    or horizontally.
+    A class that represents a chess piece that moves any amount of squares in a line until it
+    reaches the edge of the board or another piece. Queen, Rook and Bishop inherit from this class
+    and only differ in the directions they slide in.
     """
-    def __init__(self, color, position):
-        super().__init__(color=color, position=position)
-        self._piece_type = 'QUEEN'
-        self._queen_moves = []
-
-    def generate_queen_moves(self, board):
-        """
-        Creates a list of all the valid, possible moves for a Queen and saves them to a data member for the Queen
-        object.
-        :param board: list of lists that represents a chess board
-        :return: Nothing
-        """
-        x_coord = self._position[1]
-        y_coord = self._position[0]
-
-        self._queen_moves = []
-
-        # Checks if spaces above piece are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord, y_coord - index, self.get_color()):
-                self._queen_moves.append((y_coord - index, x_coord))
-                if board[y_coord - index][x_coord]:
-                    break
-            else:
-                break
-
-        # Checks if spaces below piece are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord, y_coord + index, self.get_color()):
-                self._queen_moves.append((y_coord + index, x_coord))
-                if board[y_coord + index][x_coord]:
-                    break
-            else:
-                break
-
-        # Checks if spaces left of the piece are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord - index, y_coord, self.get_color()):
-                self._queen_moves.append((y_coord, x_coord - index))
-                if board[y_coord][x_coord - index]:
-                    break
-            else:
-                break
-
-        # Check if spaces right of the piece are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord + index, y_coord, self.get_color()):
-                self._queen_moves.append((y_coord, x_coord + index))
-                if board[y_coord][x_coord + index]:
-                    break
-            else:
-                break
-
-        # Check if spaces right/below are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord + index, y_coord + index, self.get_color()):
-                self._queen_moves.append((y_coord + index, x_coord + index))
-                if board[y_coord + index][x_coord + index]:
-                    break
-            else:
-                break
-
-        # Checks if spaces left/above are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord - index, y_coord - index, self.get_color()):
-                self._queen_moves.append((y_coord - index, x_coord - index))
-                if board[y_coord - index][x_coord - index]:
-                    break
-            else:
-                break
-
-        # Check if spaces right/above are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord + index, y_coord - index, self.get_color()):
-                self._queen_moves.append((y_coord - index, x_coord + index))
-                if board[y_coord - index][x_coord + index]:
-                    break
-            else:
-                break
-
-        # Checks if spaces left/below are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord - index, y_coord + index, self.get_color()):
-                self._queen_moves.append((y_coord + index, x_coord - index))
-                if board[y_coord + index][x_coord - index]:
-                    break
-            else:
-                break
+    __slots__ = ()
+    _directions = ()
 
     def get_valid_moves(self, board):
         """
-        Creates a list of all the valid, possible moves for a Queen.
+        Creates a list of all the valid, possible moves for a sliding piece by walking the
+        precomputed rays from its square.
         :param board: list of lists that represents a chess board
         :return: list of tuples that represent coordinates on the chess board
         """
-        self.generate_queen_moves(board)
-        valid_moves = self._queen_moves
+        square = self._position[0] * 8 + self._position[1]
+        valid_moves = []
+        for direction in self._directions:
+            for target in RAY_SQUARES[direction][square]:
+                occupant = board[target[0]][target[1]]
+                if occupant:
+                    if occupant.get_color() != self._color:
+                        valid_moves.append(target)
+                    break
+                valid_moves.append(target)
         return valid_moves
 
 
-class Rook(ChessPiece):
+class Queen(SlidingPiece):
     """
-    A class that represents a Rook chess piece. Inherits from
-    the ChessPiece class. Can move any amount of squares vertically
+    A class that represents a Queen chess piece. Inherits from
+    the SlidingPiece class. Can move any amount of squares diagonally, vertically
     or horizontally.
     """
-    def __init__(self, color, position):
-        super().__init__(color=color, position=position)
-        self._piece_type = 'ROOK'
-        self._rook_moves = []
-
-    def generate_rook_moves(self, board):
-        """
-        Creates a list of all the valid, possible moves for a Rook and saves them to a data member for the Rook
-        object.
-        :param board: list of lists that represents a chess board
-        :return: Nothing
-        """
-        x_coord = self._position[1]
-        y_coord = self._position[0]
+    __slots__ = ()
+    _piece_type = 'QUEEN'
+    _directions = QUEEN_DIRECTIONS
 
-        self._rook_moves = []
 
-        # Checks if spaces above piece are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord, y_coord - index, self.get_color()):
-                self._rook_moves.append((y_coord - index, x_coord))
-                if board[y_coord - index][x_coord]:
-                    break
-            else:
-                break
-
-        # Checks if spaces below piece are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord, y_coord + index, self.get_color()):
-                self._rook_moves.append((y_coord + index, x_coord))
-                if board[y_coord + index][x_coord]:
-                    break
-            else:
-                break
-
-        # Checks if spaces left of the piece are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord - index, y_coord, self.get_color()):
-                self._rook_moves.append((y_coord, x_coord - index))
-                if board[y_coord][x_coord - index]:
-                    break
-            else:
-                break
-
-        # Check if spaces right of the piece are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord + index, y_coord, self.get_color()):
-                self._rook_moves.append((y_coord, x_coord + index))
-                if board[y_coord][x_coord + index]:
-                    break
-            else:
-                break
-
-    def get_valid_moves(self, board):
-        """
-        Creates a list of all the valid, possible moves for a Rook.
-        :param board: list of lists that represents a chess board
-        :return: list of tuples that represent coordinates on the chess board
-        """
-        self.generate_rook_moves(board)
-        valid_moves = self._rook_moves
-        return valid_moves
+class Rook(SlidingPiece):
+    """
+    A class that represents a Rook chess piece. Inherits from
+    the SlidingPiece class. Can move any amount of squares vertically
+    or horizontally.
+    """
+    __slots__ = ()
+    _piece_type = 'ROOK'
+    _directions = ROOK_DIRECTIONS
 
 
-class Bishop(ChessPiece):
+class Bishop(SlidingPiece):
     """
     A class that represents a Bishop chess piece. Inherits from
-    the ChessPiece class. Can move any amount of squares diagonally.
+    the SlidingPiece class. Can move any amount of squares diagonally.
     """
-    def __init__(self, color, position):
-        super().__init__(color=color, position=position)
-        self._piece_type = 'BISHOP'
-        self._bishop_moves = []
-
-    def generate_bishop_moves(self, board):
-        """
-        Creates a list of all the valid, possible moves for a bishop and saves them to a data member for the bishop
-        object.
-        :param board: list of lists that represents a chess board
-        :return: Nothing
-        """
-        x_coord = self._position[1]
-        y_coord = self._position[0]
-
-        self._bishop_moves = []
-
-        # Check if spaces right/below are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord + index, y_coord + index, self.get_color()):
-                self._bishop_moves.append((y_coord + index, x_coord + index))
-                if board[y_coord + index][x_coord + index]:
-                    break
-            else:
-                break
-
-        # Checks if spaces left/above are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord - index, y_coord - index, self.get_color()):
-                self._bishop_moves.append((y_coord - index, x_coord - index))
-                if board[y_coord - index][x_coord - index]:
-                    break
-            else:
-                break
-
-        # Check if spaces right/above are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord + index, y_coord - index, self.get_color()):
-                self._bishop_moves.append((y_coord - index, x_coord + index))
-                if board[y_coord - index][x_coord + index]:
-                    break
-            else:
-                break
-
-        # Checks if spaces left/below are valid moves
-        for index in range(1, 8):
-            if self.is_move_valid(board, x_coord - index, y_coord + index, self.get_color()):
-                self._bishop_moves.append((y_coord + index, x_coord - index))
-                if board[y_coord + index][x_coord - index]:
-                    break
-            else:
-                break
-
-    def get_valid_moves(self, board):
-        """
-        Creates a list of all the valid, possible moves for a bishop.
-        :param board: list of lists that represents a chess board
-        :return: list of tuples that represent coordinates on the chess board
-        """
-        self.generate_bishop_moves(board)
-        valid_moves = self._bishop_moves
-        return valid_moves
+    __slots__ = ()
+    _piece_type = 'BISHOP'
+    _directions = BISHOP_DIRECTIONS
 
 
 class Knight(ChessPiece):
@@ -656,28 +914,20 @@ class Knight(ChessPiece):
     the ChessPiece class. Moves in an ‘L-shape,’ two squares in a
     straight direction, and then one square perpendicular to that.
     """
-    def __init__(self, color, position):
-        super().__init__(color=color, position=position)
-        self._piece_type = 'KNIGHT'
-        self._knight_moves = [(-2, -1), (2, -1), (-1, -2), (1, -2), (-2, 1), (-1, 2), (1, 2), (2, 1)]
+    __slots__ = ()
+    _piece_type = 'KNIGHT'
 
     def get_valid_moves(self, board):
         """
-        Creates a list of all the valid, possible moves for a Knight and saves them to a data member for the Knight
-        object.
+        Creates a list of all the valid, possible moves for a Knight.
         :param board: list of lists that represents a chess board
         :return: List of tuples of coordinates of possible knight moves
         """
-        x_coord = self._position[1]
-        y_coord = self._position[0]
         valid_moves = []
-
-        for move in self._knight_moves:
-            new_x_coord = x_coord + move[1]
-            new_y_coord = y_coord + move[0]
-            is_valid = self.is_move_valid(board, new_x_coord, new_y_coord, self._color)
-            if is_valid:
-                valid_moves.append((new_y_coord, new_x_coord))
+        for target in KNIGHT_SQUARES[self._position[0] * 8 + self._position[1]]:
+            occupant = board[target[0]][target[1]]
+            if not occupant or occupant.get_color() != self._color:
+                valid_moves.append(target)
         return valid_moves
 
 
@@ -687,10 +937,21 @@ class Pawn(ChessPiece):
     the ChessPiece class. Moves one square forward, but on its first move,
     it can move two squares forward. It captures diagonally one square forward.
     """
+    __slots__ = ('_has_moved',)
+    _piece_type = 'PAWN'
+
     def __init__(self, color, position):
         super().__init__(color=color, position=position)
         self._has_moved = False
-        self._piece_type = 'PAWN'
+
+    def __copy__(self):
+        """
+        Creates a copy of the pawn for copy.copy, including whether it has made its first move.
+        :return: Pawn object
+        """
+        pawn = super().__copy__()
+        pawn._has_moved = self._has_moved
+        return pawn
 
     def get_pawn_move_status(self):
         """
@@ -699,11 +960,24 @@ class Pawn(ChessPiece):
         """
         return self._has_moved
 
-    def set_pawn_move_status(self):
+    def set_pawn_move_status(self, has_moved=True):
         """
-        If called, sets the pawn move status to True.
+        If called, sets the pawn move status to True, or to the given status when a move is taken back.
+        :param has_moved: boolean move status
         """
-        self._has_moved = True
+        self._has_moved = has_moved
+
+    def get_zobrist_key(self):
+        """
+        Returns the Zobrist key of the pawn on its current position, including whether it has made
+        its first move.
+        :return: integer key
+        """
+        square = self._position[0] * 8 + self._position[1]
+        key = PIECE_KEYS[(self._color, 'PAWN')][square]
+        if not self._has_moved:
+            key ^= UNMOVED_PAWN_KEYS[square]
+        return key
 
     def get_valid_moves(self, board):
         """
@@ -712,87 +986,31 @@ class Pawn(ChessPiece):
         :return: list of tuples that represent coordinates on the chess board
         """
         x_coord, y_coord = self._position[1], self._position[0]
+        forward = -1 if self._color == 'WHITE' else 1
         valid_moves = []
 
-        if self._color == 'WHITE':
-            if self.is_move_valid(board, x_coord, y_coord - 2, self.get_color()):
-                if not self._has_moved and not board[y_coord - 2][x_coord]:
-                    valid_moves.append((y_coord - 2, x_coord))
-            if self.is_move_valid(board, x_coord, y_coord - 1, self.get_color()):
-                if not board[y_coord - 1][x_coord]:
-                    valid_moves.append((y_coord - 1, x_coord))
-            if self.is_move_valid(board, x_coord - 1, y_coord - 1, self.get_color()):
-                if board[y_coord - 1][x_coord - 1] and board[y_coord - 1][x_coord - 1].get_color() != 'WHITE':
-                    valid_moves.append((y_coord - 1, x_coord - 1))
-            if self.is_move_valid(board, x_coord + 1, y_coord - 1, self.get_color()):
-                if board[y_coord - 1][x_coord + 1] and board[y_coord - 1][x_coord + 1].get_color() != 'WHITE':
-                    valid_moves.append((y_coord - 1, x_coord + 1))
-        else:
-            if self.is_move_valid(board, x_coord, y_coord + 2, self.get_color()):
-                if not self._has_moved and not board[y_coord + 2][x_coord]:
-                    valid_moves.append((y_coord + 2, x_coord))
-            if self.is_move_valid(board, x_coord, y_coord + 1, self.get_color()):
-                if not board[y_coord + 1][x_coord]:
-                    valid_moves.append((y_coord + 1, x_coord))
-            if self.is_move_valid(board, x_coord + 1, y_coord + 1, self.get_color()):
-                if board[y_coord + 1][x_coord - 1] and board[y_coord + 1][x_coord - 1].get_color() != 'BLACK':
-                    valid_moves.append((y_coord + 1, x_coord - 1))
-            if self.is_move_valid(board, x_coord + 1, y_coord + 1, self.get_color()):
-                if board[y_coord + 1][x_coord + 1] and board[y_coord + 1][x_coord + 1].get_color() != 'BLACK':
-                    valid_moves.append((y_coord + 1, x_coord + 1))
+        # Pushes, two squares on the pawn's first move if both squares are empty
+        if self.is_move_valid(board, x_coord, y_coord + forward, self._color):
+            if not board[y_coord + forward][x_coord]:
+                valid_moves.append((y_coord + forward, x_coord))
+                if not self._has_moved and self.is_move_valid(board, x_coord, y_coord + 2 * forward, self._color):
+                    if not board[y_coord + 2 * forward][x_coord]:
+                        valid_moves.append((y_coord + 2 * forward, x_coord))
+
+        # Diagonal captures
+        for target in PAWN_CAPTURE_SQUARES[self._color][y_coord * 8 + x_coord]:
+            occupant = board[target[0]][target[1]]
+            if occupant and occupant.get_color() != self._color:
+                valid_moves.append(target)
         return valid_moves
 
 
-
-# initializing imported module
-pygame.init()
-# displaying a window of height
-screen = pygame.display.set_mode((900, 900))
-pygame.display.set_caption('Atomic Chess')
-
-# Explosion animation
-explosion_sprite = [
-                    pygame.image.load(os.path.join('img', f"explosion_{str(50)}_pix.png")).convert_alpha(),
-                    pygame.image.load(os.path.join('img', f"explosion_{str(100)}_pix.png")).convert_alpha(),
-                    pygame.image.load(os.path.join('img', f"explosion_{str(150)}_pix.png")).convert_alpha(),
-                    pygame.image.load(os.path.join('img', f"explosion_{str(200)}_pix.png")).convert_alpha(),
-                    pygame.image.load(os.path.join('img', f"explosion_{str(250)}_pix.png")).convert_alpha(),
-                    pygame.image.load(os.path.join('img', f"explosion_{str(300)}_pix.png")).convert_alpha(),
-                    ]
-clock = pygame.time.Clock()
-
-# Function for converting coords to algebraic notaion
-def position_to_algebraic(pos):
-    """"""
-    letter_dict = {0: 'a',
-                   1: 'b',
-                   2: 'c',
-                   3: 'd',
-                   4: 'e',
-                   5: 'f',
-                   6: 'g',
-                   7: 'h',
-                   }
-    y, x = pos[0], pos[1]
-    x = int(10 - ((x + (SQUARE_LEN / 2)) // SQUARE_LEN) - 1)
-    y = ((y + (SQUARE_LEN / 2)) // SQUARE_LEN) - 1
-
-    return f'{letter_dict[y]}{str(x)}'
-
-
-game = ChessVar()
-game.display_board()
-
-running = True
-x_cord_from, y_cord_from, x_cord_to, y_cord_to = 0, 0, 0, 0
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.MOUSEBUTTONDOWN:
-            alg_from_square = position_to_algebraic(event.dict['pos'])
-        if event.type == pygame.MOUSEBUTTONUP:
-            alg_to_square = position_to_algebraic(event.dict['pos'])
-            game.make_move(alg_from_square, alg_to_square)
-            game.display_board()
-        if event.type == pygame.QUIT:
-            running = False
-
+# What translate_square gives for a string that does not name a square
+NOT_A_SQUARE = (False, False)
+# Results of ChessVar.validate_move: the move is made, or the reason it is refused
+MOVE_RESULTS = ('ACCEPTED', 'GAME_OVER', 'BAD_SQUARE', 'NO_PIECE', 'WRONG_TURN', 'INVALID_MOVE', 'KING_CAPTURE',
+                'BLAST_BOTH_KINGS')
+# Piece classes by piece type, for building pieces from a saved position
+PIECE_CLASSES = {'KING': King, 'QUEEN': Queen, 'ROOK': Rook, 'BISHOP': Bishop, 'KNIGHT': Knight, 'PAWN': Pawn}
+# Piece classes of the back rank from the a-file to the h-file
+BACK_RANK = (Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook)
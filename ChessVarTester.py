@@ -11,13 +11,21 @@ class TestKingMove(unittest.TestCase):
         Tests out of bounds moves.
         """
         game = ChessVar()
-        game.initialize_board()
+        for move_from, move_to in [('e2', 'e4'), ('e7', 'e5')]:
+            self.assertTrue(game.make_move(move_from, move_to))
         self.assertTrue(game.make_move('e1', 'e2'))
-        game.initialize_board()
+
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('e7', 'e5'), ('f1', 'c4'), ('b8', 'c6')]:
+            self.assertTrue(game.make_move(move_from, move_to))
         self.assertTrue(game.make_move('e1', 'f1'))
-        game.initialize_board()
+
+        game = ChessVar()
+        for move_from, move_to in [('d2', 'd4'), ('d7', 'd5'), ('d1', 'd3'), ('b8', 'c6')]:
+            self.assertTrue(game.make_move(move_from, move_to))
         self.assertTrue(game.make_move('e1', 'd1'))
-        game.initialize_board()
+
+        game = ChessVar()
         self.assertFalse(game.make_move('e1', 'e0'))
 
 
@@ -29,4 +37,1407 @@ class TestKingMove(unittest.TestCase):
     def test_3(self):
         """
         Tests if a move is invalid due to an illegal jump.
-        """
\ No newline at end of file
+        """
+
+
+class TestRuleEvents(unittest.TestCase):
+    """
+    Tests the events the rules engine reports to front ends.
+    """
+    def test_1(self):
+        """
+        Tests the rules engine does not load pygame.
+        """
+        import sys
+        self.assertNotIn('pygame', sys.modules)
+
+    def test_2(self):
+        """
+        Tests listeners are told about moves and the pieces destroyed by an explosion.
+        """
+        game = ChessVar()
+        events = []
+        game.add_listener(lambda event, *details: events.append((event, details)))
+        self.assertTrue(game.make_move('e2', 'e4'))
+        self.assertTrue(game.make_move('d7', 'd5'))
+        self.assertTrue(game.make_move('e4', 'd5'))
+        self.assertEqual(events[0], ('MOVE', ((6, 4), (4, 4))))
+        self.assertEqual(events[-1][0], 'EXPLOSION')
+        square, destroyed = events[-1][1]
+        self.assertEqual(square, (3, 3))
+        self.assertEqual([piece.get_piece_type() for piece in destroyed], ['PAWN'])
+
+
+class TestCaptures(unittest.TestCase):
+    """
+    Tests captures and the game state they produce.
+    """
+    def test_1(self):
+        """
+        Tests capturing the king directly wins the game.
+        """
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('f7', 'f6'), ('d1', 'h5'), ('e8', 'f7')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        self.assertTrue(game.make_move('h5', 'f7'))
+        self.assertEqual(game.get_game_state(), 'WHITE_WON')
+        self.assertFalse(game.make_move('a7', 'a6'))
+
+    def test_2(self):
+        """
+        Tests a pawn may not jump over a piece on its first move.
+        """
+        game = ChessVar()
+        self.assertTrue(game.make_move('b1', 'c3'))
+        self.assertTrue(game.make_move('a7', 'a6'))
+        self.assertFalse(game.make_move('c2', 'c4'))
+
+
+class TestBitboardBackend(unittest.TestCase):
+    """
+    Tests the bitboard backend agrees with ChessVar.
+    """
+    def test_1(self):
+        """
+        Tests the starting moves and the squares pieces stand on.
+        """
+        from BitboardChessVar import BitboardChessVar, SQUARE_NAMES
+        game = ChessVar()
+        position = BitboardChessVar()
+        self.assertEqual(len(position.generate_moves()), 20)
+        for index, name in enumerate(SQUARE_NAMES):
+            piece = game.get_board()[index // 8][index % 8]
+            expected = (piece.get_color(), piece.get_piece_type()) if piece else None
+            self.assertEqual(position.get_piece(name), expected)
+
+    def test_2(self):
+        """
+        Tests a game with explosions plays out the same on both backends.
+        """
+        from BitboardChessVar import BitboardChessVar
+        moves = [('e2', 'e4'), ('d7', 'd5'), ('e4', 'd5'), ('d8', 'd5'), ('g1', 'f3'), ('d5', 'd2')]
+        game = ChessVar()
+        position = BitboardChessVar()
+        for move_from, move_to in moves:
+            self.assertTrue(game.make_move(move_from, move_to))
+            self.assertTrue(position.make_move(move_from, move_to))
+            self.assertEqual(game.get_player_turn(), position.get_player_turn())
+            self.assertEqual(game.get_game_state(), position.get_game_state())
+        self.assertEqual(position.get_game_state(), 'BLACK_WON')
+        self.assertEqual(BitboardChessVar.from_chess_var(game).get_occupancy(), position.get_occupancy())
+
+
+class TestAttackTables(unittest.TestCase):
+    """
+    Tests the precomputed leaper and explosion tables.
+    """
+    def test_1(self):
+        """
+        Tests the tables stay on the board at the corners and edges.
+        """
+        from AttackTables import BLAST_MASKS, BLAST_SQUARES, KING_SQUARES, KNIGHT_SQUARES, PAWN_CAPTURE_SQUARES
+        self.assertEqual(sorted(KNIGHT_SQUARES[0]), [(1, 2), (2, 1)])
+        self.assertEqual(len(KING_SQUARES[63]), 3)
+        self.assertEqual(PAWN_CAPTURE_SQUARES['WHITE'][48], ((5, 1),))
+        self.assertEqual(PAWN_CAPTURE_SQUARES['BLACK'][15], ((2, 6),))
+        self.assertEqual(BLAST_SQUARES[27][0], (3, 3))
+        self.assertEqual(bin(BLAST_MASKS[7]).count('1'), 4)
+
+    def test_2(self):
+        """
+        Tests slider attacks stop at the first occupied square of each ray.
+        """
+        from AttackTables import BISHOP_DIRECTIONS, QUEEN_DIRECTIONS, ROOK_DIRECTIONS, slider_attacks
+        self.assertEqual(bin(slider_attacks(56, 0, ROOK_DIRECTIONS)).count('1'), 14)
+        self.assertEqual(bin(slider_attacks(27, 0, QUEEN_DIRECTIONS)).count('1'), 27)
+        # Bishop on c1 with pawns on b2 and d2 attacks only those two squares
+        blockers = (1 << 49) | (1 << 51)
+        self.assertEqual(slider_attacks(58, blockers, BISHOP_DIRECTIONS), blockers)
+
+    def test_3(self):
+        """
+        Tests the sliding pieces share one move generator.
+        """
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('d7', 'd5'), ('d1', 'g4'), ('c8', 'f5')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        queen = game.get_board()[4][6]
+        self.assertIsInstance(queen, SlidingPiece)
+        self.assertEqual(sorted(queen.get_valid_moves(game.get_board())),
+                         [(1, 6), (2, 6), (3, 5), (3, 6), (3, 7), (4, 5), (4, 7), (5, 5), (5, 6), (5, 7),
+                          (6, 4), (7, 3)])
+
+
+class TestUndo(unittest.TestCase):
+    """
+    Tests taking moves back with push and pop.
+    """
+    def test_1(self):
+        """
+        Tests pop puts back every piece an explosion removed.
+        """
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('d7', 'd5'), ('g1', 'f3'), ('c8', 'g4')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        before = [[piece for piece in row] for row in game.get_board()]
+        game.push(((5, 5), (4, 6)))
+        self.assertIsNone(game.get_board()[4][6])
+        self.assertIsNone(game.get_board()[5][5])
+        self.assertEqual(game.pop(), ((5, 5), (4, 6)))
+        self.assertEqual(game.get_board(), before)
+        self.assertEqual(game.get_board()[5][5].get_position(), (5, 5))
+        self.assertEqual(game.get_player_turn(), 'WHITE')
+
+    def test_2(self):
+        """
+        Tests pop restores the game state, the turn and a pawn's first-move status.
+        """
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('f7', 'f6'), ('d1', 'h5'), ('e8', 'f7'), ('h5', 'f7')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        self.assertEqual(game.get_game_state(), 'WHITE_WON')
+        for _ in range(5):
+            game.pop()
+        self.assertEqual(game.get_game_state(), 'UNFINISHED')
+        self.assertEqual(game.get_player_turn(), 'WHITE')
+        self.assertFalse(game.get_board()[6][4].get_pawn_move_status())
+        self.assertTrue(game.make_move('e2', 'e4'))
+
+
+class TestPositionHash(unittest.TestCase):
+    """
+    Tests the incrementally updated Zobrist key.
+    """
+    def test_1(self):
+        """
+        Tests move orders reaching the same position share a key.
+        """
+        game_1 = ChessVar()
+        game_2 = ChessVar()
+        for move_from, move_to in [('g1', 'f3'), ('b8', 'c6'), ('b1', 'c3')]:
+            self.assertTrue(game_1.make_move(move_from, move_to))
+        for move_from, move_to in [('b1', 'c3'), ('b8', 'c6'), ('g1', 'f3')]:
+            self.assertTrue(game_2.make_move(move_from, move_to))
+        self.assertEqual(game_1.position_hash(), game_2.position_hash())
+        self.assertNotEqual(game_1.position_hash(), ChessVar().position_hash())
+
+    def test_2(self):
+        """
+        Tests the key tracks explosions, pawn first moves and the side to move, and pop restores it.
+        """
+        game = ChessVar()
+        start = game.position_hash()
+        for move_from, move_to in [('e2', 'e4'), ('d7', 'd5'), ('e4', 'd5'), ('d8', 'd5'), ('g1', 'f3')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+            self.assertEqual(game.position_hash(), game.compute_hash())
+        for _ in range(5):
+            game.pop()
+        self.assertEqual(game.position_hash(), start)
+
+
+class TestTranspositionTable(unittest.TestCase):
+    """
+    Tests the fixed-size transposition table.
+    """
+    def test_1(self):
+        """
+        Tests entries are stored and found again, and the table stays within its memory budget.
+        """
+        from TranspositionTable import TranspositionTable, EXACT
+        table = TranspositionTable(size_mb=1)
+        self.assertLessEqual(table.get_memory_usage(), 1024 * 1024)
+        self.assertGreater(table.get_memory_usage(), 512 * 1024)
+        game = ChessVar()
+        self.assertIsNone(table.probe(game.position_hash()))
+        table.store(game.position_hash(), 3, EXACT, -25, ((6, 4), (4, 4)))
+        self.assertEqual(table.probe(game.position_hash()), (3, EXACT, -25, ((6, 4), (4, 4))))
+
+    def test_2(self):
+        """
+        Tests a full bucket keeps the deeper entry and replaces entries from earlier searches first.
+        """
+        from TranspositionTable import TranspositionTable, LOWER_BOUND
+        table = TranspositionTable(size_mb=1)
+        # Keys that differ only above the index bits land in the same bucket
+        step = table.get_entry_count()
+        table.store(1, 8, LOWER_BOUND, 10, None)
+        table.store(1 + step, 2, LOWER_BOUND, 20, None)
+        table.store(1 + 2 * step, 5, LOWER_BOUND, 30, None)
+        self.assertIsNotNone(table.probe(1))
+        self.assertIsNone(table.probe(1 + step))
+        self.assertIsNotNone(table.probe(1 + 2 * step))
+        table.new_search()
+        table.store(1 + 3 * step, 1, LOWER_BOUND, 40, None)
+        self.assertIsNone(table.probe(1 + 2 * step))
+        self.assertEqual(table.probe(1 + 3 * step)[2], 40)
+
+
+class TestPerft(unittest.TestCase):
+    """
+    Tests move generation against known perft node counts.
+    """
+    def test_1(self):
+        """
+        Tests the counts from the starting position and that divide adds up to the total.
+        """
+        game = ChessVar()
+        self.assertEqual([game.perft(depth) for depth in range(4)], [1, 20, 400, 8902])
+        divide = game.perft(2, divide=True)
+        self.assertEqual(len(divide), 20)
+        self.assertEqual(divide['e2e4'], 20)
+        self.assertEqual(sum(divide.values()), 400)
+
+    def test_2(self):
+        """
+        Tests both backends agree on the benchmark positions one move less deep than the benchmark.
+        """
+        from BitboardChessVar import BitboardChessVar
+        from PerftBenchmark import POSITIONS, setup_position
+        for position in POSITIONS:
+            game = setup_position(ChessVar, position['moves'])
+            bitboard_game = setup_position(BitboardChessVar, position['moves'])
+            self.assertEqual(game.perft(position['depth'] - 1), bitboard_game.perft(position['depth'] - 1))
+
+
+class TestLegalMoves(unittest.TestCase):
+    """
+    Tests the full legal move list.
+    """
+    def test_1(self):
+        """
+        Tests a capture that would blow up both kings is not allowed.
+        """
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('f7', 'f5'), ('e1', 'e2'), ('e8', 'f7'), ('e2', 'e3'),
+                                   ('b7', 'b5'), ('e3', 'f4'), ('f7', 'e6')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        self.assertIn(((4, 4), (3, 5)), game.generate_moves())
+        self.assertNotIn(((4, 4), (3, 5)), game.legal_moves())
+        self.assertFalse(game.make_move('e4', 'f5'))
+        self.assertEqual(len(game.legal_moves()), len(game.generate_moves()) - 1)
+
+    def test_2(self):
+        """
+        Tests the list is kept until the position changes and matches make_move.
+        """
+        game = ChessVar()
+        moves = game.legal_moves()
+        self.assertEqual(len(moves), 20)
+        self.assertIs(game.legal_moves(), moves)
+        self.assertTrue(game.make_move('e2', 'e4'))
+        self.assertIsNot(game.legal_moves(), moves)
+        self.assertTrue(all(start[0] <= 1 for start, _ in game.legal_moves()))
+        game.pop()
+        self.assertEqual(game.legal_moves(), moves)
+
+
+class TestChessEngine(unittest.TestCase):
+    """
+    Tests the alpha-beta search engine.
+    """
+    def test_1(self):
+        """
+        Tests the engine takes a king that can be captured and leaves the game untouched.
+        """
+        from ChessEngine import ChessEngine, WIN_THRESHOLD
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('f7', 'f6'), ('d1', 'h5'), ('e8', 'f7')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        result = ChessEngine(tt_size_mb=1).search(game, max_time=1.0)
+        self.assertEqual(result.move, 'h5f7')
+        self.assertEqual(result.pv[0], 'h5f7')
+        self.assertGreaterEqual(result.score, WIN_THRESHOLD)
+        self.assertEqual(game.get_player_turn(), 'WHITE')
+        self.assertEqual(game.get_game_state(), 'UNFINISHED')
+
+    def test_2(self):
+        """
+        Tests a search stops close to its time limit and returns a legal move with its line of play.
+        """
+        from ChessEngine import ChessEngine
+        game = ChessVar()
+        result = ChessEngine(tt_size_mb=1).search(game, max_time=0.1)
+        self.assertLess(result.seconds, 0.2)
+        self.assertGreaterEqual(result.depth, 1)
+        self.assertIn(result.move, [game.translate_position(start) + game.translate_position(end)
+                                    for start, end in game.legal_moves()])
+        self.assertEqual(result.pv[0], result.move)
+
+    def test_3(self):
+        """
+        Tests a node budget stops the search and play_move makes the move found.
+        """
+        from ChessEngine import ChessEngine
+        game = ChessVar()
+        result = ChessEngine(tt_size_mb=1).play_move(game, max_time=None, max_nodes=500)
+        self.assertLessEqual(result.nodes, 500)
+        self.assertEqual(game.get_player_turn(), 'BLACK')
+
+
+class TestParallelSearch(unittest.TestCase):
+    """
+    Tests the search shared out to worker processes.
+    """
+    def test_1(self):
+        """
+        Tests a position sent to a worker is rebuilt with the same hash and moves.
+        """
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('d7', 'd5'), ('e4', 'd5'), ('g8', 'f6')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        position = game.to_packed()
+        self.assertEqual(len(position), 25)
+        copy = ChessVar.from_packed(position)
+        self.assertEqual(copy.position_hash(), game.position_hash())
+        self.assertEqual(copy.compute_hash(), game.position_hash())
+        self.assertEqual(sorted(copy.legal_moves()), sorted(game.legal_moves()))
+
+    def test_2(self):
+        """
+        Tests the workers find a king capture and agree with the single process engine's score.
+        """
+        from ChessEngine import ChessEngine
+        from ParallelSearch import ParallelSearch
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('f7', 'f6'), ('d1', 'h5'), ('e8', 'f7')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        with ParallelSearch(workers=2, tt_size_mb=1) as search:
+            result = search.search(game, max_time=None, max_depth=3)
+            self.assertEqual(result.move, 'h5f7')
+            self.assertEqual(result.score, ChessEngine(tt_size_mb=1).search(game, max_time=None, max_depth=3).score)
+
+
+class TestBatchSimulator(unittest.TestCase):
+    """
+    Tests the NumPy batch simulator plays by the same rules as ChessVar.
+    """
+    def setUp(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('numpy is not installed')
+
+    def test_1(self):
+        """
+        Tests random batch games replay move for move on ChessVar with the same legal moves and results.
+        """
+        from BatchSimulator import BatchSimulator
+        batch = BatchSimulator(8, seed=7, max_plies=120, capture_bias=0.5)
+        games = [ChessVar() for _ in range(8)]
+        while batch.get_game_states().count('UNFINISHED'):
+            for index, game in enumerate(games):
+                if batch.get_game_states()[index] == 'UNFINISHED':
+                    self.assertEqual(sorted(batch.generate_moves(index)), sorted(game.legal_moves()))
+            starts, ends = batch.step()
+            for index, game in enumerate(games):
+                if starts[index] >= 0:
+                    self.assertTrue(game.make_move(game.translate_position(divmod(int(starts[index]), 8)),
+                                                   game.translate_position(divmod(int(ends[index]), 8))))
+                if game.get_game_state() != 'UNFINISHED':
+                    self.assertEqual(batch.get_game_states()[index], game.get_game_state())
+        for index, game in enumerate(games):
+            for row in range(8):
+                for col in range(8):
+                    piece = game.get_board()[row][col]
+                    self.assertEqual(bool(batch.get_boards()[index, row, col]), bool(piece))
+
+    def test_2(self):
+        """
+        Tests batches with the same seed play the same games and a batch can start from ChessVar games.
+        """
+        from BatchSimulator import BatchSimulator
+        first = BatchSimulator(50, seed=3)
+        second = BatchSimulator(50, seed=3)
+        self.assertEqual(list(first.run()), list(second.run()))
+        self.assertTrue((first.get_boards() == second.get_boards()).all())
+
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('d7', 'd5'), ('e4', 'd5')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        batch = BatchSimulator.from_chess_vars([game, ChessVar()])
+        self.assertEqual(sorted(batch.generate_moves(0)), sorted(game.legal_moves()))
+        self.assertEqual(list(batch.count_moves()), [len(game.legal_moves()), 20])
+
+    def test_3(self):
+        """
+        Tests a game set up without a king of one color forbids no capture for blowing up both kings, as
+        ChessVar does, whichever king is missing.
+        """
+        from BatchSimulator import BatchSimulator
+        games = [ChessVar.from_fen(fen) for fen in
+                 ['6R1/8/8/8/8/8/6p1/7K w - *', '7k/6P1/8/8/8/8/8/6r1 b - *', 'r7/8/8/8/N7/8/8/K7 b - *']]
+        batch = BatchSimulator.from_chess_vars(games)
+        for index, game in enumerate(games):
+            self.assertEqual(sorted(batch.generate_moves(index)), sorted(game.legal_moves()))
+        self.assertEqual(list(batch.count_moves()), [len(game.legal_moves()) for game in games])
+
+
+class TestPositionEncoding(unittest.TestCase):
+    """
+    Tests the FEN dialect and packed form of a position.
+    """
+    def test_1(self):
+        """
+        Tests positions come back from FEN and packed form with the same hash, moves and pawn first moves.
+        """
+        game = ChessVar()
+        self.assertEqual(game.to_fen(), 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - *')
+        for move_from, move_to in [('e2', 'e4'), ('d7', 'd5'), ('e4', 'd5'), ('g8', 'f6')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        for copy in (ChessVar.from_fen(game.to_fen()), ChessVar.from_packed(game.to_packed())):
+            self.assertEqual(copy.position_hash(), game.position_hash())
+            self.assertEqual(copy.get_player_turn(), game.get_player_turn())
+            self.assertEqual(sorted(copy.legal_moves()), sorted(game.legal_moves()))
+
+        # A pawn back on its starting rank after moving is listed, as is an unmoved pawn off it
+        from ChessVar import King, Pawn
+        moved_pawn = Pawn('WHITE', (6, 0))
+        moved_pawn.set_pawn_move_status()
+        unmoved_pawn = Pawn('BLACK', (4, 7))
+        unmoved_pawn.set_pawn_move_status(False)
+        game = ChessVar()
+        game.set_up_position([King('WHITE', (7, 4)), King('BLACK', (0, 4)), moved_pawn, unmoved_pawn])
+        self.assertEqual(game.to_fen(), '4k3/8/8/8/7p/8/P7/4K3 w h4a2 *')
+        copy = ChessVar.from_fen(game.to_fen())
+        self.assertEqual(sorted(copy.legal_moves()), sorted(game.legal_moves()))
+        self.assertEqual(copy.to_packed(), game.to_packed())
+
+    def test_2(self):
+        """
+        Tests the bitboard backend writes and reads the same forms, and standard FEN is accepted.
+        """
+        from BitboardChessVar import BitboardChessVar
+        game = ChessVar()
+        bitboard_game = BitboardChessVar()
+        for move_from, move_to in [('d2', 'd4'), ('e7', 'e5'), ('d4', 'e5'), ('f8', 'b4')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+            self.assertTrue(bitboard_game.make_move(move_from, move_to))
+        self.assertEqual(bitboard_game.to_packed(), game.to_packed())
+        self.assertEqual(bitboard_game.to_fen(), game.to_fen())
+        copy = BitboardChessVar.from_packed(game.to_packed())
+        self.assertEqual(copy.get_piece_codes(), bitboard_game.get_piece_codes())
+        self.assertEqual(sorted(copy.generate_moves()), sorted(bitboard_game.generate_moves()))
+
+        standard = ChessVar.from_fen('rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1')
+        self.assertEqual(standard.to_fen(), 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b - *')
+        self.assertRaises(ValueError, ChessVar.from_fen, 'rnbqkbnr/pppppppp/8/8 w - *')
+
+    def test_3(self):
+        """
+        Tests a batch loaded from packed positions matches one loaded from the games.
+        """
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('numpy is not installed')
+        from BatchSimulator import BatchSimulator
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('d7', 'd5'), ('e4', 'd5')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        batch = BatchSimulator.from_packed(game.to_packed() + ChessVar().to_packed())
+        expected = BatchSimulator.from_chess_vars([game, ChessVar()])
+        self.assertTrue((batch.get_bitboards() == expected.get_bitboards()).all())
+        self.assertEqual(list(batch.count_moves()), [len(game.legal_moves()), 20])
+
+    def test_4(self):
+        """
+        Tests positions set up without a king can be played from, with both backends agreeing.
+        """
+        from BitboardChessVar import BitboardChessVar
+        self.assertEqual(len(ChessVar.from_fen('8/8/8/8/8/8/8/K7 w - *').legal_moves()), 3)
+        for fen in ('r7/8/8/8/N7/8/8/K7 b - *', '8/8/8/8/8/2k5/4n3/3R4 w - *'):
+            game = ChessVar.from_fen(fen)
+            bitboard_game = BitboardChessVar.from_fen(fen)
+            self.assertEqual(game.perft(3), bitboard_game.perft(3))
+        game = ChessVar.from_fen('r7/8/8/8/N7/8/8/K7 b - *')
+        bitboard_game = BitboardChessVar.from_fen('r7/8/8/8/N7/8/8/K7 b - *')
+        self.assertTrue(game.make_move('a8', 'a4'))
+        self.assertTrue(bitboard_game.make_move('a8', 'a4'))
+        self.assertEqual(game.to_fen(), bitboard_game.to_fen())
+
+    def test_5(self):
+        """
+        Tests corrupt packed positions, with a piece code or game state that does not exist or more squares
+        than pieces, are refused with ValueError.
+        """
+        from BitboardChessVar import BitboardChessVar
+        data = ChessVar().to_packed()
+        corrupt = [data[:8] + bytes((data[8] & 0xF0,)) + data[9:], data[:8] + bytes((data[8] | 0x0F,)) + data[9:],
+                   data[:24] + bytes((7,)), bytes((255,)) * 8 + data[8:]]
+        for packed in corrupt:
+            for game_class in (ChessVar, BitboardChessVar):
+                with self.assertRaises(ValueError):
+                    game_class.from_packed(packed)
+
+
+class TestGameRecord(unittest.TestCase):
+    """
+    Tests the move list of a game and the PGN-style archive format.
+    """
+    def test_1(self):
+        """
+        Tests the move list follows push, pop and copy, and starts again from a set up position.
+        """
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('d7', 'd5'), ('e4', 'd5')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        self.assertFalse(game.make_move('e4', 'e5'))
+        self.assertEqual(game.get_move_list(), ['e2e4', 'd7d5', 'e4d5'])
+        self.assertEqual(game.copy().get_move_list(), ['e2e4', 'd7d5', 'e4d5'])
+        game.pop()
+        self.assertEqual(game.get_move_list(), ['e2e4', 'd7d5'])
+        self.assertEqual(game.get_start_fen(), 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - *')
+
+        fen = '4k3/8/8/8/7p/8/P7/4K3 b h4a2 *'
+        game = ChessVar.from_fen(fen)
+        self.assertTrue(game.make_move('e8', 'd8'))
+        self.assertEqual(game.get_move_list(), ['e8d8'])
+        self.assertEqual(game.get_start_fen(), fen)
+
+    def test_2(self):
+        """
+        Tests records written to a gzip archive stream back unchanged and replay on both rules engines.
+        """
+        import os
+        import tempfile
+        from GameRecord import read_games, record_game, replay_archive, write_games
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('f7', 'f6'), ('d1', 'h5'), ('e8', 'f7'), ('h5', 'f7')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        set_up = ChessVar.from_fen('4k3/8/8/8/7p/8/P7/4K3 b h4a2 *')
+        self.assertTrue(set_up.make_move('e8', 'd8'))
+        records = [record_game(game, {'White': 'first "engine"'}), record_game(set_up)]
+        self.assertEqual(records[0].result, '1-0')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'games.pgn.gz')
+            self.assertEqual(write_games(path, iter(records)), 2)
+            with open(path, 'rb') as archive:
+                self.assertEqual(archive.read(2), b'\x1f\x8b')
+            self.assertEqual(list(read_games(path)), records)
+            for validator in ('rules', 'fast'):
+                self.assertEqual([replay.error for replay in replay_archive(path, validator)], [None, None])
+
+    def test_3(self):
+        """
+        Tests comments, variations and move numbers are skipped, and replay reports illegal moves and
+        results the board contradicts.
+        """
+        import io
+        from GameRecord import read_games, replay_game
+        text = ('[White "a"]\n[Result "1-0"]\n\n1. e2e4 {a comment\nover two lines} f7f6 ; to the end\n'
+                '2. d1h5 $1 (2. d2d4 d7d5) e8f7 3. h5f7! 1-0\n\n[White "b"]\n\n1. e2e5 *\n')
+        first, second = read_games(io.StringIO(text))
+        self.assertEqual(first.moves, ['e2e4', 'f7f6', 'd1h5', 'e8f7', 'h5f7'])
+        self.assertEqual(first.headers, {'White': 'a', 'Result': '1-0'})
+        self.assertIsNone(replay_game(first).error)
+        self.assertEqual(replay_game(first._replace(result='0-1'), 'fast').error,
+                         'result 0-1 but the board shows WHITE_WON')
+        self.assertEqual(replay_game(second).error, "illegal move 'e2e5' at ply 1")
+
+    def test_4(self):
+        """
+        Tests a game set up from a FEN without one king of each color is reported, and the replay of an
+        archive goes on past it.
+        """
+        from GameRecord import GameRecord, replay_archive, replay_game
+        kingless = GameRecord({'FEN': 'r7/8/8/8/N7/8/8/K7 b - *'}, ['a8a4'], '*')
+        for validator in ('rules', 'fast'):
+            result = replay_game(kingless, validator)
+            self.assertEqual(result.error, 'bad FEN: a position needs one king of each color')
+            self.assertEqual(result.plies, 0)
+        self.assertEqual(replay_game(kingless._replace(headers={'FEN': '8/8/8/8/8/2k5/8/KK6 w - *'})).error,
+                         'bad FEN: a position needs one king of each color')
+        # A finished game may have lost a king, and a replay of it with no moves is accepted
+        for validator in ('rules', 'fast'):
+            won = GameRecord({'FEN': '8/8/8/8/8/2k5/8/8 b - 0-1'}, [], '0-1')
+            self.assertIsNone(replay_game(won, validator).error)
+        text = ('[FEN "r7/8/8/8/N7/8/8/K7 b - *"]\n\n1... a8a4 *\n\n'
+                '[FEN "4k3/8/8/8/8/8/4P3/4K3 w - *"]\n\n1. e2e4 *\n')
+        self.assertEqual([result.error is None for result in replay_archive(text.splitlines(True))],
+                         [False, True])
+
+
+class TestChessGUI(unittest.TestCase):
+    """
+    Tests the pygame front end. The window is never shown, and the front end runs in its own process so
+    this one never loads pygame.
+    """
+    def run_script(self, script):
+        """
+        Runs a script in a new process with a window that is never shown, and fails if the script does.
+        :param script: string Python source
+        :return: Nothing
+        """
+        import importlib.util
+        import os
+        import subprocess
+        import sys
+        if importlib.util.find_spec('pygame') is None:
+            self.skipTest('pygame is not installed')
+        directory = os.path.dirname(os.path.abspath(__file__))
+        completed = subprocess.run([sys.executable, '-c', script], cwd=directory, capture_output=True, text=True,
+                                   env=dict(os.environ, SDL_VIDEODRIVER='dummy', PYTHONPATH=directory))
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+
+    def test_1(self):
+        """
+        Tests a move repaints its two squares and the status line without loading any images.
+        """
+        self.run_script(
+            'from unittest import mock\n'
+            'from ChessGUI import ChessGUI, square_rect\n'
+            'from ChessVar import ChessVar\n'
+            'gui = ChessGUI(ChessVar())\n'
+            'gui.display_board()\n'
+            "with mock.patch('pygame.image.load') as load, mock.patch('pygame.display.update') as update:\n"
+            "    assert gui._game.make_move('e2', 'e4')\n"
+            '    gui.display_board()\n'
+            'load.assert_not_called()\n'
+            'rects = update.call_args[0][0]\n'
+            'assert len(rects) == 3, rects\n'
+            'assert square_rect((6, 4)) in rects and square_rect((4, 4)) in rects, rects\n'
+        )
+
+    def test_2(self):
+        """
+        Tests a capture queues its explosion without drawing, the explosion plays one image per frame and
+        the window is left as a full redraw would draw it.
+        """
+        self.run_script(
+            'from unittest import mock\n'
+            'import pygame\n'
+            'from ChessGUI import ChessGUI\n'
+            'from ChessVar import ChessVar\n'
+            'gui = ChessGUI(ChessVar())\n'
+            'gui.display_board()\n'
+            "for move_from, move_to in [('e2', 'e4'), ('d7', 'd5')]:\n"
+            '    assert gui._game.make_move(move_from, move_to)\n'
+            "with mock.patch('pygame.display.update') as update:\n"
+            "    assert gui._game.make_move('e4', 'd5')\n"
+            'update.assert_not_called()\n'
+            'assert len(gui.get_animations()) == 1\n'
+            'frames = 0\n'
+            'while gui.get_animations():\n'
+            '    gui.draw_frame()\n'
+            '    frames += 1\n'
+            'assert frames == 7, frames\n'
+            "drawn = pygame.image.tostring(gui._screen, 'RGB')\n"
+            'gui._shown_pieces = None\n'
+            'gui.display_board()\n'
+            "assert drawn == pygame.image.tostring(gui._screen, 'RGB')\n"
+        )
+
+
+class TestGameServer(unittest.TestCase):
+    """
+    Tests the network game server with clients on the same event loop.
+    """
+    def test_1(self):
+        """
+        Tests moves are checked, sent to both players and a spectator, and a game ends when everyone leaves.
+        """
+        import asyncio
+        import json
+        from GameServer import GameServer
+
+        async def exchange(server):
+            connections = [await asyncio.open_connection('127.0.0.1', server.get_port()) for _ in range(3)]
+            (white_reader, white), (black_reader, black), (watcher_reader, watcher) = connections
+
+            async def request(writer, reader, message):
+                writer.write(json.dumps(message).encode() + b'\n')
+                return json.loads(await reader.readline())
+
+            created = await request(white, white_reader, {'type': 'new'})
+            game_id = created['game_id']
+            self.assertEqual(created['color'], 'WHITE')
+            self.assertEqual((await request(black, black_reader, {'type': 'join', 'game_id': game_id}))['color'],
+                             'BLACK')
+            self.assertEqual(json.loads(await black_reader.readline())['type'], 'state')
+            self.assertEqual(json.loads(await white_reader.readline())['players'], {'WHITE': True, 'BLACK': True})
+            state = await request(watcher, watcher_reader, {'type': 'watch', 'game_id': game_id})
+            self.assertEqual(state['fen'], 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - *')
+
+            self.assertEqual(await request(black, black_reader, {'type': 'move', 'game_id': game_id, 'move': 'e7e5'}),
+                             {'type': 'error', 'reason': 'not your turn', 'game_id': game_id})
+            self.assertEqual((await request(white, white_reader, {'type': 'move', 'game_id': game_id,
+                                                                  'move': 'e2e5'}))['reason'], 'illegal move')
+            moved = await request(white, white_reader, {'type': 'move', 'game_id': game_id, 'move': 'e2e4'})
+            self.assertEqual(moved, {'type': 'move', 'game_id': game_id, 'move': 'e2e4', 'ply': 1, 'turn': 'BLACK',
+                                     'game_state': 'UNFINISHED'})
+            self.assertEqual(json.loads(await black_reader.readline()), moved)
+            self.assertEqual(json.loads(await watcher_reader.readline()), moved)
+            self.assertEqual((await request(watcher, watcher_reader, {'type': 'state', 'game_id': 99}))['reason'],
+                             'unknown game')
+            white.write(b'not json\n')
+            self.assertEqual(json.loads(await white_reader.readline())['reason'], 'bad request')
+
+            for _, writer in connections:
+                writer.close()
+                await writer.wait_closed()
+            for _ in range(100):
+                if not server.get_sessions():
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual(server.get_sessions(), {})
+
+        async def run():
+            server = GameServer()
+            await server.start('127.0.0.1', 0)
+            try:
+                await asyncio.wait_for(exchange(server), 10)
+            finally:
+                await server.close()
+
+        asyncio.run(run())
+
+    def test_2(self):
+        """
+        Tests the load test plays its games through a server without errors and reports latencies.
+        """
+        import asyncio
+        from GameServer import GameServer
+        from LoadTestClient import percentile, run_load_test
+        self.assertEqual(percentile([1, 2, 3, 4], 0.5), 3)
+        self.assertIsNone(percentile([], 0.99))
+
+        async def run():
+            server = GameServer()
+            await server.start('127.0.0.1', 0)
+            try:
+                return await run_load_test('127.0.0.1', server.get_port(), games=20, connections=3, moves=6,
+                                           think_time=0)
+            finally:
+                await server.close()
+
+        result = asyncio.run(run())
+        self.assertEqual(result['errors'], 0)
+        self.assertGreater(result['moves'], 20)
+        self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+
+class TestMemory(unittest.TestCase):
+    """
+    Tests the memory held by idle games.
+    """
+    def test_1(self):
+        """
+        Tests starting a new game on a played one resets it completely instead of adding pieces.
+        """
+        game = ChessVar()
+        for move_from, move_to in [('e2', 'e4'), ('d7', 'd5'), ('e4', 'd5'), ('d8', 'd5')]:
+            self.assertTrue(game.make_move(move_from, move_to))
+        game.initialize_board()
+        fresh = ChessVar()
+        self.assertEqual(game.to_fen(), fresh.to_fen())
+        self.assertEqual(game.position_hash(), fresh.position_hash())
+        self.assertEqual(game.get_move_list(), [])
+        self.assertEqual(sorted(game.legal_moves()), sorted(fresh.legal_moves()))
+        self.assertRaises(IndexError, game.pop)
+        self.assertEqual(sum(1 for row in game.get_board() for piece in row if piece), 32)
+
+    def test_2(self):
+        """
+        Tests games and pieces have no per-instance dictionaries and an idle game stays small.
+        """
+        from MemoryBenchmark import measure_memory
+        game = ChessVar()
+        self.assertFalse(hasattr(game, '__dict__'))
+        self.assertFalse(any(hasattr(piece, '__dict__') for row in game.get_board() for piece in row if piece))
+        self.assertLess(measure_memory(ChessVar, 1000), 4500)
+
+
+class CrashingEngine:
+    """
+    An engine for TestTournament whose worker process dies the first time it is used, until a marker file
+    given by the CRASH_MARKER environment variable exists.
+    """
+    def __init__(self, tt_size_mb=16):
+        from ChessEngine import ChessEngine
+        self._engine = ChessEngine(tt_size_mb)
+
+    def get_transposition_table(self):
+        return self._engine.get_transposition_table()
+
+    def search(self, game, **limits):
+        import os
+        marker = os.environ['CRASH_MARKER']
+        if not os.path.exists(marker):
+            open(marker, 'w').close()
+            os._exit(1)
+        return self._engine.search(game, **limits)
+
+
+class TestTournament(unittest.TestCase):
+    """
+    Tests the match runner.
+    """
+    def test_1(self):
+        """
+        Tests the Elo estimate of a match and its error.
+        """
+        from Tournament import elo_difference
+        self.assertEqual(elo_difference(5, 0, 5), (0.0, elo_difference(5, 0, 5)[1]))
+        elo, error = elo_difference(60, 20, 20)
+        self.assertAlmostEqual(elo, 147.2, places=1)
+        self.assertGreater(error, 0)
+        self.assertLess(elo_difference(600, 200, 200)[1], error)
+        self.assertEqual(elo_difference(3, 0, 0), (None, None))
+
+    def test_2(self):
+        """
+        Tests a match survives a worker process dying, streams every game to disk and is not played again
+        when run a second time.
+        """
+        import json
+        import os
+        import tempfile
+        from Tournament import Player, TimeControl, Tournament
+        with tempfile.TemporaryDirectory() as directory:
+            os.environ['CRASH_MARKER'] = os.path.join(directory, 'crashed')
+            output = os.path.join(directory, 'games.jsonl')
+            tournament = Tournament(Player('first', max_depth=1, tt_size_mb=1),
+                                    Player('second', engine='ChessVarTester.CrashingEngine', max_depth=1,
+                                           tt_size_mb=1),
+                                    games=4, output_path=output, workers=2, time_control=TimeControl(5.0),
+                                    opening_plies=2, max_plies=30, seed=1)
+            summary = tournament.run()
+            self.assertTrue(os.path.exists(os.environ['CRASH_MARKER']))
+            self.assertEqual(summary['games'], 4)
+            self.assertEqual(summary['wins'] + summary['draws'] + summary['losses'], 4)
+            with open(output) as lines:
+                records = [json.loads(line) for line in lines]
+            self.assertEqual(sorted(record['game_id'] for record in records), [0, 1, 2, 3])
+            self.assertEqual(records[0]['opening'], [record for record in records if record['game_id'] ==
+                                                     records[0]['game_id'] ^ 1][0]['opening'])
+            self.assertEqual(tournament.run()['games'], 4)
+            with open(output) as lines:
+                self.assertEqual(len(lines.readlines()), 4)
+
+
+class TestOpeningBook(unittest.TestCase):
+    """
+    Tests building, reading and playing from an opening book.
+    """
+    def test_1(self):
+        """
+        Tests a book built from an archive finds the moves played in each position, totals their games and
+        weights, and skips moves that are not legal in the position looked up.
+        """
+        import os
+        import tempfile
+        from GameRecord import GameRecord, write_games
+        from OpeningBook import BookMove, OpeningBook, build_book
+        records = [GameRecord({}, ['e2e4', 'e7e5'], '1-0'), GameRecord({}, ['e2e4', 'd7d5'], '0-1'),
+                   GameRecord({}, ['d2d4', 'd7d5'], '1/2-1/2'), GameRecord({}, ['d2d4', 'e2e9'], '1-0')]
+        with tempfile.TemporaryDirectory() as directory:
+            archive = os.path.join(directory, 'games.pgn')
+            path = os.path.join(directory, 'book.bin')
+            write_games(archive, records)
+            result = build_book([archive], path)
+            self.assertEqual((result.games, result.illegal, result.positions, result.entries), (4, 1, 3, 5))
+            with OpeningBook(path) as book:
+                self.assertEqual(book.get_entry_count(), 5)
+                game = ChessVar()
+                self.assertEqual(book.get_moves(game), [BookMove('d2d4', 3, 2), BookMove('e2e4', 2, 2)])
+                game.make_move('e2', 'e4')
+                self.assertEqual(book.get_moves(game), [BookMove('d7d5', 2, 1), BookMove('e7e5', 0, 1)])
+                game.make_move('d7', 'd5')
+                self.assertEqual(book.get_moves(game), [])
+                self.assertIsNone(book.choose_move(game))
+
+    def test_2(self):
+        """
+        Tests weighted choices follow the weights, and that an engine with a book plays from it without
+        searching.
+        """
+        import os
+        import random
+        import tempfile
+        from ChessEngine import ChessEngine
+        from GameRecord import GameRecord
+        from OpeningBook import OpeningBook, collect_moves, write_book
+        records = [GameRecord({}, ['e2e4'], '1-0')] * 3 + [GameRecord({}, ['d2d4'], '1-0')]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'book.bin')
+            write_book(path, collect_moves(records)[0])
+            with OpeningBook(path) as book:
+                rng = random.Random(0)
+                choices = [book.choose_move(ChessVar(), rng) for _ in range(400)]
+                self.assertEqual(set(choices), {'e2e4', 'd2d4'})
+                self.assertGreater(choices.count('e2e4'), choices.count('d2d4') * 2)
+                result = ChessEngine(tt_size_mb=1, book=book, seed=0).search(ChessVar(), max_depth=2)
+                self.assertIn(result.move, ('e2e4', 'd2d4'))
+                self.assertEqual((result.depth, result.nodes), (0, 0))
+                game = ChessVar()
+                game.make_move('a2', 'a3')
+                self.assertGreater(ChessEngine(tt_size_mb=1, book=book).search(game, max_depth=1).depth, 0)
+
+
+class TestTablebase(unittest.TestCase):
+    """
+    Tests endgame tablebases agree with ChessVar and are used by the engine. The KRvK table, and the KvK
+    table its captures lead to, are generated once for the class.
+    """
+    @classmethod
+    def setUpClass(cls):
+        import tempfile
+        from Tablebase import generate_tables
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.reports = generate_tables(['KvKR'], cls.directory.name, workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_1(self):
+        """
+        Tests every sampled position's result follows from its children as played by ChessVar: a win in n
+        has a move to a loss in n - 1, a loss in n has only moves to wins of at most n - 1, and a draw has
+        neither.
+        """
+        import random
+        from Tablebase import Tablebases
+        self.assertEqual([report.material for report in self.reports], ['KvK', 'KRvK'])
+        self.assertEqual(self.reports[1].positions, self.reports[1].wins + self.reports[1].losses +
+                         self.reports[1].draws)
+        rng = random.Random(3)
+        with Tablebases(self.directory.name) as tablebases:
+            self.assertEqual(tablebases.probe(ChessVar.from_fen('8/8/8/8/8/8/8/K3k2R w - *')), ('WIN', 1))
+            self.assertEqual(tablebases.probe(ChessVar.from_fen('8/8/8/8/8/8/8/k3K2r b - *')), ('WIN', 1))
+            self.assertIsNone(tablebases.probe(ChessVar()))
+            results = set()
+            for _ in range(150):
+                squares = rng.sample(range(64), 3)
+                rows = [['1'] * 8 for _ in range(8)]
+                for letter, square in zip('Kkr' if rng.random() < 0.5 else 'KkR', squares):
+                    rows[square // 8][square % 8] = letter
+                game = ChessVar.from_fen('/'.join(''.join(row) for row in rows) + rng.choice([' w', ' b']) + ' - *')
+                result = tablebases.probe(game)
+                results.add(result.result)
+                children = []
+                for move in game.legal_moves():
+                    game.push(move)
+                    if game.get_game_state() == 'UNFINISHED':
+                        children.append(tuple(tablebases.probe(game)))
+                    else:
+                        children.append(('LOSS', 0) if game.get_game_state() != f'{game.get_player_turn()}_WON'
+                                        else ('WIN', 0))
+                    game.pop()
+                losses = [plies for outcome, plies in children if outcome == 'LOSS']
+                if losses:
+                    self.assertEqual(result, ('WIN', min(losses) + 1))
+                elif children and all(outcome == 'WIN' for outcome, _ in children):
+                    self.assertEqual(result, ('LOSS', max(plies for _, plies in children) + 1))
+                else:
+                    self.assertEqual(result, ('DRAW', 0))
+            self.assertEqual(results, {'WIN', 'LOSS', 'DRAW'})
+
+    def test_2(self):
+        """
+        Tests the engine scores tablebase positions exactly and plays the quickest win.
+        """
+        from ChessEngine import WIN_SCORE, ChessEngine
+        from Tablebase import Tablebases
+        with Tablebases(self.directory.name) as tablebases:
+            game = ChessVar.from_fen('8/8/8/3k4/8/8/8/K6R w - *')
+            plies = tablebases.probe(game).plies
+            result = ChessEngine(tt_size_mb=1, tablebases=tablebases).search(game, max_time=None, max_depth=3)
+            self.assertEqual(result.score, WIN_SCORE - plies)
+            self.assertEqual(result.depth, 1)
+            game.make_move(result.move[:2], result.move[2:])
+            self.assertEqual(tablebases.probe(game), ('LOSS', plies - 1))
+
+
+class TestEvaluation(unittest.TestCase):
+    """
+    Tests the evaluation terms ChessVar keeps up to date.
+    """
+    def test_1(self):
+        """
+        Tests the terms match a count from scratch after every move of random games full of captures and
+        explosions, and after every move is taken back.
+        """
+        import random
+        rng = random.Random(11)
+        for _ in range(20):
+            game = ChessVar()
+            start_terms = game.compute_evaluation_terms()
+            self.assertEqual((game.get_material(), game.get_piece_square_score(),
+                              {color: game.get_king_exposure(color) for color in ('WHITE', 'BLACK')}), start_terms)
+            plies = 0
+            while game.get_game_state() == 'UNFINISHED' and game.legal_moves() and plies < 60:
+                board = game.get_board()
+                captures = [move for move in game.legal_moves() if board[move[1][0]][move[1][1]]]
+                game.push(rng.choice(captures if captures and rng.random() < 0.6 else game.legal_moves()))
+                plies += 1
+                terms = game.compute_evaluation_terms()
+                self.assertEqual((game.get_material(), game.get_piece_square_score(),
+                                  {color: game.get_king_exposure(color) for color in ('WHITE', 'BLACK')}), terms)
+                copied = game.copy()
+                self.assertEqual(copied.compute_evaluation_terms(), terms)
+                self.assertEqual(copied.get_material(), terms[0])
+            for _ in range(plies):
+                game.pop()
+            self.assertEqual(game.get_material(), start_terms[0])
+            self.assertEqual(game.get_piece_square_score(), start_terms[1])
+            self.assertEqual(game.get_king_exposure('WHITE'), start_terms[2]['WHITE'])
+
+    def test_2(self):
+        """
+        Tests the scores of positions from the point of view of the side to move.
+        """
+        from Evaluation import KING_EXPOSURE_PENALTY, evaluate_material, evaluate_position
+        game = ChessVar()
+        self.assertEqual((evaluate_material(game), evaluate_position(game)), (0, 0))
+        self.assertEqual(game.get_king_exposure('WHITE'), 5)
+        game = ChessVar.from_fen('4k3/8/8/8/8/8/3PN3/4K3 b - *')
+        self.assertEqual(game.get_king_exposure('WHITE'), 2)
+        self.assertEqual(game.get_king_exposure('BLACK'), 0)
+        self.assertEqual(evaluate_material(game), -420)
+        self.assertEqual(evaluate_position(game), -420 - game.get_piece_square_score() + 2 * KING_EXPOSURE_PENALTY)
+        game.make_move('e8', 'e7')
+        self.assertEqual(evaluate_material(game), 420)
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Tests the reasons moves are refused and the opt-in instrumentation of the rules engine.
+    """
+    def test_1(self):
+        """
+        Tests make_move calls are counted by result, blasts and move generation are recorded, and
+        disabling puts the original methods back.
+        """
+        import Instrumentation
+        from ChessVar import Knight
+        game = ChessVar()
+        self.assertEqual(game.validate_move('e2', 'e4'), ('ACCEPTED', ((6, 4), (4, 4))))
+        self.assertEqual(game.validate_move('z2', 'e4'), ('BAD_SQUARE', None))
+        self.assertEqual(game.validate_move('e4', 'e5'), ('NO_PIECE', None))
+        self.assertEqual(game.validate_move('e7', 'e5'), ('WRONG_TURN', None))
+        self.assertEqual(game.validate_move('e2', 'e5'), ('INVALID_MOVE', None))
+        self.assertEqual(ChessVar.from_fen('k7/8/8/8/8/8/4p3/4K3 w - *').validate_move('e1', 'e2'),
+                         ('KING_CAPTURE', None))
+        self.assertEqual(ChessVar.from_fen('4R3/8/8/8/8/5k2/4p3/3K4 w - *').validate_move('e8', 'e2'),
+                         ('BLAST_BOTH_KINGS', None))
+
+        make_move = ChessVar.make_move
+        get_valid_moves = Knight.get_valid_moves
+        metrics = Instrumentation.enable()
+        try:
+            self.assertTrue(Instrumentation.is_enabled())
+            game = ChessVar()
+            for move in ('e2e4', 'e2e4', 'd7d5', 'e4d5', 'e7e6'):
+                game.make_move(move[:2], move[2:])
+            game.legal_moves()
+        finally:
+            self.assertIs(Instrumentation.disable(), metrics)
+        self.assertIs(ChessVar.make_move, make_move)
+        self.assertIs(Knight.get_valid_moves, get_valid_moves)
+        self.assertFalse(Instrumentation.is_enabled())
+
+        self.assertEqual(metrics.get_move_results()['ACCEPTED'], 4)
+        self.assertEqual(metrics.get_move_results()['NO_PIECE'], 1)
+        self.assertEqual(metrics.get_make_move().get_count(), 5)
+        self.assertEqual(metrics.get_explosion().get_count(), 1)
+        self.assertEqual(metrics.get_blast_pieces().get_sum(), 1)
+        self.assertEqual(metrics.get_move_generation()['KNIGHT'].get_count(), 2)
+        self.assertEqual(metrics.get_moves_generated()['KNIGHT'], 5)
+        self.assertEqual(metrics.get_translate_square().get_count(), 10)
+        game.make_move('d8', 'd5')
+        self.assertEqual(metrics.get_make_move().get_count(), 5)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['make_move']['results']['ACCEPTED'], 4)
+        self.assertEqual(snapshot['explosion']['pieces_destroyed']['buckets']['+Inf'], 1)
+        exported = metrics.to_prometheus()
+        self.assertIn('atomic_make_move_total{result="NO_PIECE"} 1\n', exported)
+        self.assertIn('atomic_move_generation_seconds_count{piece="KNIGHT"} 2\n', exported)
+        self.assertIn('atomic_explosion_pieces_destroyed_bucket{le="1.0"} 1\n', exported)
+        metrics.reset()
+        self.assertEqual(metrics.get_make_move().get_count(), 0)
+
+    def test_2(self):
+        """
+        Tests a game server started with metrics serves them over HTTP in both formats.
+        """
+        import asyncio
+        import json
+        import Instrumentation
+        from GameServer import GameServer
+
+        async def fetch(port, path):
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET {path} HTTP/1.0\r\nHost: localhost\r\n\r\n'.encode())
+            response = await reader.read()
+            writer.close()
+            head, _, body = response.partition(b'\r\n\r\n')
+            return head.split(b'\r\n')[0].decode(), body.decode()
+
+        async def run():
+            server = GameServer(metrics=Instrumentation.get_metrics())
+            await server.start('127.0.0.1', 0)
+            metrics_port = await server.start_metrics('127.0.0.1', 0)
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', server.get_port())
+                writer.write(b'{"type": "new"}\n')
+                game_id = json.loads(await reader.readline())['game_id']
+                writer.write(json.dumps({'type': 'move', 'game_id': game_id, 'move': 'e2e4'}).encode() + b'\n')
+                await reader.readline()
+                writer.close()
+                return (await fetch(metrics_port, '/metrics'), await fetch(metrics_port, '/metrics.json'),
+                        await fetch(metrics_port, '/other'))
+            finally:
+                await server.close()
+
+        Instrumentation.enable()
+        try:
+            (status, text), (json_status, body), (missing, _) = asyncio.run(run())
+        finally:
+            Instrumentation.disable()
+        self.assertEqual(status, 'HTTP/1.0 200 OK')
+        self.assertIn('atomic_make_move_total{result="ACCEPTED"} 1\n', text)
+        self.assertEqual(json_status, 'HTTP/1.0 200 OK')
+        self.assertEqual(json.loads(body)['make_move']['results']['ACCEPTED'], 1)
+        self.assertEqual(missing, 'HTTP/1.0 404 Not Found')
+
+
+    def test_3(self):
+        """
+        Tests the instrumented make_move runs the make_move it replaced, so a change to it is kept while
+        instrumentation is on.
+        """
+        from unittest import mock
+        import Instrumentation
+        make_move = ChessVar.make_move
+        validate_move = ChessVar.validate_move
+
+        def refuse_e_pawn(game, move_from, move_to):
+            return move_from != 'e2' and make_move(game, move_from, move_to)
+
+        with mock.patch.object(ChessVar, 'make_move', refuse_e_pawn):
+            metrics = Instrumentation.enable()
+            try:
+                game = ChessVar()
+                self.assertFalse(game.make_move('e2', 'e4'))
+                self.assertTrue(game.make_move('g1', 'f3'))
+                self.assertFalse(game.make_move('f3', 'e5'))
+            finally:
+                Instrumentation.disable()
+            self.assertIs(ChessVar.make_move, refuse_e_pawn)
+        self.assertIs(ChessVar.validate_move, validate_move)
+        self.assertEqual(metrics.get_make_move().get_count(), 3)
+        self.assertEqual({result: count for result, count in metrics.get_move_results().items() if count},
+                         {'INVALID_MOVE': 1, 'ACCEPTED': 1, 'WRONG_TURN': 1})
+
+class TestMoveValidation(unittest.TestCase):
+    """
+    Tests bulk move validation.
+    """
+    def test_1(self):
+        """
+        Tests the results of a batch for games and positions, and that moves checked from a position's
+        legal moves get the same results as moves checked one piece at a time.
+        """
+        import random
+        from MoveValidation import LEGAL_MOVES_THRESHOLD, MoveValidator
+        game = ChessVar()
+        self.assertEqual(game.translate_square('a8'), (0, 0))
+        self.assertEqual(game.translate_square('h1'), (7, 7))
+        self.assertEqual(game.translate_square('i1'), (False, False))
+        self.assertEqual(game.translate_square('e'), (False, False))
+        self.assertEqual(game.translate_position((6, 4)), 'e2')
+
+        games = {1: ChessVar(), 2: ChessVar()}
+        validator = MoveValidator(games.get, cache_size=1)
+        after_e4 = 'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b - *'
+        results = validator.validate_batch([
+            (1, 'e2', 'e4'), (1, 'e7', 'e5'), (3, 'e2', 'e4'), (after_e4, 'e7', 'e5'), (after_e4, 'd2', 'd4'),
+            ('not a position', 'e2', 'e4'), ('8/8/8/8/8/8/8/K7 w - *', 'a1', 'a2'), (2, 'e2', None),
+        ], play=True)
+        self.assertEqual(results, ['ACCEPTED', 'ACCEPTED', 'UNKNOWN_GAME', 'ACCEPTED', 'WRONG_TURN',
+                                   'BAD_POSITION', 'BAD_POSITION', 'BAD_SQUARE'])
+        # Squares that are not strings are refused just as squares ChessVar cannot read
+        self.assertEqual(validator.validate_batch([(2, 'z9', 'e4'), (2, 4, 'e4')]), ['BAD_SQUARE', 'BAD_SQUARE'])
+        self.assertEqual(games[1].get_move_list(), ['e2e4', 'e7e5'])
+        self.assertEqual(validator.get_position(after_e4).get_move_list(), [])
+        self.assertEqual(validator.get_cached_positions(), 1)
+        self.assertEqual(validator.validate(2, 'e2', 'e4'), 'ACCEPTED')
+        self.assertEqual(games[2].get_move_list(), [])
+
+        squares = [column + row for column in 'abcdefgh' for row in '12345678']
+        rng = random.Random(5)
+        for _ in range(10):
+            game = ChessVar()
+            for _ in range(rng.randrange(30)):
+                if not game.legal_moves():
+                    break
+                game.push(rng.choice(game.legal_moves()))
+            requests = [(0, rng.choice(squares), rng.choice(squares)) for _ in range(200)]
+            requests += [(0, game.translate_position(start), game.translate_position(end))
+                         for start, end in game.legal_moves()]
+            expected = [game.copy().validate_move(move_from, move_to)[0] for _, move_from, move_to in requests]
+            self.assertGreaterEqual(len(requests), LEGAL_MOVES_THRESHOLD)
+            self.assertEqual(MoveValidator({0: game.copy()}.get).validate_batch(requests), expected)
+
+    def test_2(self):
+        """
+        Tests a game server answers a validate request without playing the moves.
+        """
+        import asyncio
+        import json
+        from GameServer import GameServer
+
+        async def run():
+            server = GameServer()
+            await server.start('127.0.0.1', 0)
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', server.get_port())
+                writer.write(b'{"type": "new"}\n')
+                game_id = json.loads(await reader.readline())['game_id']
+                moves = [[game_id, 'e2', 'e4'], [game_id, 'e7', 'e5'], [99, 'e2', 'e4'],
+                         ['rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b - *', 'e7', 'e5']]
+                writer.write(json.dumps({'type': 'validate', 'moves': moves}).encode() + b'\n')
+                validation = json.loads(await reader.readline())
+                writer.write(b'{"type": "validate", "moves": [[1, "e2"]]}\n')
+                error = json.loads(await reader.readline())
+                writer.close()
+                return validation, error, server.find_game(game_id).get_move_list()
+            finally:
+                await server.close()
+
+        validation, error, move_list = asyncio.run(run())
+        self.assertEqual(validation, {'type': 'validation',
+                                      'results': ['ACCEPTED', 'WRONG_TURN', 'UNKNOWN_GAME', 'ACCEPTED']})
+        self.assertEqual(error, {'type': 'error', 'reason': 'bad request'})
+        self.assertEqual(move_list, [])
+
+
+class TestAnalysisService(unittest.TestCase):
+    """
+    Tests the batch analysis service and its cache.
+    """
+    def test_1(self):
+        """
+        Tests results are kept by position and depth, serve shallower depths and are not given to another
+        position.
+        """
+        import os
+        import tempfile
+        from AnalysisService import AnalysisCache, signed_hash
+        from ChessEngine import SearchResult
+        self.assertEqual(signed_hash(5), 5)
+        self.assertEqual(signed_hash((1 << 64) - 1), -1)
+        game = ChessVar()
+        result = SearchResult('e2e4', 35, 4, 1000, 0.5, ['e2e4', 'e7e5'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'analysis.sqlite')
+            with AnalysisCache(path) as cache:
+                self.assertIsNone(cache.get(game, 4))
+                cache.put(game, 4, result)
+            with AnalysisCache(path) as cache:
+                self.assertEqual(cache.get_size(), 1)
+                self.assertEqual(cache.get(game, 4), result)
+                self.assertEqual(cache.get(game, 2), result)
+                self.assertIsNone(cache.get(game, 5))
+                game.make_move('e2', 'e4')
+                self.assertIsNone(cache.get(game, 4))
+
+    def test_2(self):
+        """
+        Tests a stream of positions is analysed as a direct search would, with repeated positions searched
+        once, unreadable positions reported and a second pass answered from the cache.
+        """
+        import os
+        import tempfile
+        from AnalysisService import AnalysisService
+        from ChessEngine import ChessEngine
+        start = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - *'
+        game = ChessVar()
+        game.make_move('e2', 'e4')
+        positions = [start, game, start, 'not a position', '8/8/8/8/8/8/8/K7 w - *']
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'analysis.sqlite')
+            with AnalysisService(path, workers=1, tt_size_mb=1) as service:
+                first = list(service.analyse(iter(positions), depth=2))
+                self.assertEqual(service.get_cache().get_size(), 2)
+            with AnalysisService(path, workers=1, tt_size_mb=1) as service:
+                second = list(service.analyse(positions, depth=1))
+
+        self.assertEqual(len(first), 5)
+        self.assertEqual(sorted(analysis.position for analysis in first if analysis.error is None),
+                         sorted([start, start, game.to_fen()]))
+        self.assertEqual(sum(analysis.error is not None for analysis in first), 2)
+        # The repeated start position is searched once, whether it is still being searched when it comes up
+        # again or already in the cache
+        self.assertLessEqual(sum(analysis.cached for analysis in first), 1)
+        expected = ChessEngine(tt_size_mb=1).search(ChessVar(), max_time=None, max_depth=2)
+        for analysis in first:
+            if analysis.position == start:
+                self.assertEqual((analysis.move, analysis.score, analysis.depth, analysis.pv),
+                                 (expected.move, expected.score, expected.depth, expected.pv))
+        self.assertEqual([analysis.cached for analysis in second if analysis.error is None], [True, True, True])
+        self.assertEqual({analysis.depth for analysis in second if analysis.error is None}, {2})
+
+    def test_3(self):
+        """
+        Tests a position that cannot be packed for a worker is reported and the positions around it are still
+        analysed.
+        """
+        import os
+        import tempfile
+        from AnalysisService import AnalysisService
+        start = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - *'
+        crowded = 'rnbqkbnr/pppppppp/8/8/8/7N/PPPPPPPP/RNBQKBNR w - *'
+        ending = '4k3/8/8/8/8/8/4P3/4K3 w - *'
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'analysis.sqlite')
+            with AnalysisService(path, workers=1, tt_size_mb=1) as service:
+                analyses = {analysis.position: analysis
+                            for analysis in service.analyse([start, crowded, ending], depth=1)}
+                self.assertEqual(service.get_cache().get_size(), 2)
+
+        self.assertEqual(sorted(analyses), sorted([start, crowded, ending]))
+        self.assertIsNone(analyses[crowded].move)
+        self.assertIn('32 pieces', analyses[crowded].error)
+        for position in (start, ending):
+            self.assertIsNone(analyses[position].error)
+            self.assertIsNotNone(analyses[position].move)
+
+    def test_4(self):
+        """
+        Tests a worker process that dies mid-search costs the positions being searched an attempt, and the
+        pool is started again to search them.
+        """
+        import multiprocessing
+        import os
+        import tempfile
+        from unittest import mock
+        from AnalysisService import AnalysisService
+        from ChessEngine import ChessEngine
+        if multiprocessing.get_start_method() != 'fork':
+            self.skipTest('the workers only see the patched engine when forked')
+        start = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - *'
+        deadly = '4k3/8/8/8/8/8/4P3/4K3 w - *'
+        search = ChessEngine.search
+
+        with tempfile.TemporaryDirectory() as directory:
+            marker = os.path.join(directory, 'died')
+
+            def die_once(engine, game, *args, **kwargs):
+                # The first worker to search the deadly position dies, as one killed by the system would
+                if game.to_fen() == deadly and not os.path.exists(marker):
+                    open(marker, 'w').close()
+                    os._exit(1)
+                return search(engine, game, *args, **kwargs)
+
+            with mock.patch.object(ChessEngine, 'search', die_once):
+                with AnalysisService(os.path.join(directory, 'analysis.sqlite'), workers=1,
+                                     tt_size_mb=1) as service:
+                    analyses = list(service.analyse([start, deadly, '8/8/8/8/8/2k5/8/K7 w - *'], depth=1))
+            self.assertTrue(os.path.exists(marker))
+
+        self.assertEqual(len(analyses), 3)
+        self.assertEqual([analysis.error for analysis in analyses], [None, None, None])
@@ -0,0 +1,103 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Position evaluation for atomic chess. A position is scored from three terms that ChessVar
+#              keeps up to date as pieces move, are captured and explode, so scoring a position costs a few
+#              additions rather than a walk over the board:
+#
+#                  material       the value of each side's pieces
+#                  piece-square   a bonus or penalty for each piece on its square
+#                  king exposure  the number of each side's pieces next to its own king. A capture on
+#                                 any of those squares blows the king up with it, so every one of them
+#                                 is a way to lose the game.
+#
+#              The tables here hold each term's value from white's point of view, with black's entries
+#              negated, so a term is the sum of the entries of the pieces on the board.
+
+PIECE_VALUES = {'KING': 0, 'QUEEN': 900, 'ROOK': 500, 'BISHOP': 330, 'KNIGHT': 320, 'PAWN': 100}
+# Centipawns lost for each of a player's pieces standing next to its own king
+KING_EXPOSURE_PENALTY = 20
+
+# Bonuses for white pieces by square, row 0 being rank 8; black pieces use the rows in reverse
+_WHITE_PIECE_SQUARES = {
+    'KING': [0] * 64,
+    'QUEEN': [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    'ROOK': [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    'BISHOP': [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    'KNIGHT': [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    'PAWN': [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+}
+
+# Indexed by (color, piece type): signed material value of the piece
+MATERIAL_VALUES = {(color, piece_type): value if color == 'WHITE' else -value
+                   for color in ('WHITE', 'BLACK') for piece_type, value in PIECE_VALUES.items()}
+# Indexed by (color, piece type) and then by square index row * 8 + col: signed bonus of the piece there
+PIECE_SQUARE_VALUES = {(color, piece_type): list(table) if color == 'WHITE' else
+                       [-table[(7 - square // 8) * 8 + square % 8] for square in range(64)]
+                       for color in ('WHITE', 'BLACK') for piece_type, table in _WHITE_PIECE_SQUARES.items()}
+
+
+def evaluate_material(game):
+    """
+    Scores a position by material from the point of view of the player whose turn it is.
+    :param game: ChessVar object
+    :return: integer score in centipawns
+    """
+    return game.get_material() if game.get_player_turn() == 'WHITE' else -game.get_material()
+
+
+def evaluate_position(game):
+    """
+    Scores a position by material, piece placement and king exposure from the point of view of the
+    player whose turn it is.
+    :param game: ChessVar object
+    :return: integer score in centipawns
+    """
+    score = game.get_material() + game.get_piece_square_score() - KING_EXPOSURE_PENALTY * (
+        game.get_king_exposure('WHITE') - game.get_king_exposure('BLACK'))
+    return score if game.get_player_turn() == 'WHITE' else -score
@@ -0,0 +1,295 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: PGN-style game records for atomic chess. Games are written with the usual PGN tag pairs and
+#              movetext, with moves in coordinate notation such as 'e2e4', and read back by a generator that
+#              holds one game at a time, so archives of any size, plain or gzip compressed, stream through in
+#              bounded memory. Each game can be replayed through ChessVar or through the faster bitboard
+#              backend to check it still follows the rules. Run as a script to check a whole archive:
+#
+#              python GameRecord.py games.pgn.gz [--validator fast] [--show 20]
+
+import argparse
+import gzip
+import re
+import sys
+import time
+from collections import namedtuple
+
+from BitboardChessVar import BitboardChessVar
+from ChessVar import ChessVar
+import PositionEncoding
+
+# A game as read from or written to an archive: dictionary of tag pairs, list of move strings and result
+GameRecord = namedtuple('GameRecord', ['headers', 'moves', 'result'])
+# The outcome of replaying a record: the game after its last legal move, the number of moves played and
+# a message saying what is wrong with the record, or None
+ReplayResult = namedtuple('ReplayResult', ['record', 'game', 'plies', 'error'])
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+GAME_STATE_RESULTS = {'UNFINISHED': '*', 'WHITE_WON': '1-0', 'BLACK_WON': '0-1'}
+# The tags every PGN game starts with, in this order
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+LINE_LENGTH = 79
+GZIP_MAGIC = b'\x1f\x8b'
+
+# The rules engines a record can be replayed through
+VALIDATORS = {'rules': ChessVar, 'fast': BitboardChessVar}
+
+TAG_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+MOVE_NUMBER_PATTERN = re.compile(r'^\d+\.+')
+
+
+def record_game(game, headers=None, result=None):
+    """
+    Creates the record of a game played on a ChessVar object.
+    :param game: ChessVar object
+    :param headers: dictionary of extra tag pairs such as {'White': 'engine'}
+    :param result: string result, by default the one shown on the board
+    :return: GameRecord
+    """
+    result = result or GAME_STATE_RESULTS[game.get_game_state()]
+    tags = {tag: '?' for tag in SEVEN_TAG_ROSTER}
+    tags['Variant'] = 'Atomic'
+    tags.update(headers or {})
+    tags['Result'] = result
+    if game.get_start_fen() != PositionEncoding.START_FEN:
+        tags['SetUp'] = '1'
+        tags['FEN'] = game.get_start_fen()
+    return GameRecord(tags, game.get_move_list(), result)
+
+
+def format_game(record):
+    """
+    Writes a game record as PGN text.
+    :param record: GameRecord
+    :return: string ending with a blank line
+    """
+    lines = [f'[{tag} "{escape_tag(str(value))}"]' for tag, value in record.headers.items()]
+    lines.append('')
+
+    black_first = record.headers.get('FEN', 'w').split()[1:2] == ['b']
+    tokens = []
+    for ply, move in enumerate(record.moves, 1 if black_first else 0):
+        if ply % 2 == 0:
+            tokens.append(f'{ply // 2 + 1}.')
+        elif not tokens:
+            tokens.append('1...')
+        tokens.append(move)
+    tokens.append(record.result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = f'{line} {token}' if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+def escape_tag(value):
+    """
+    Escapes the backslashes and quotes of a tag value.
+    :param value: string
+    :return: string
+    """
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def unescape_tag(value):
+    """
+    Undoes escape_tag.
+    :param value: string
+    :return: string
+    """
+    return re.sub(r'\\(.)', r'\1', value)
+
+
+def open_archive(path, mode='r'):
+    """
+    Opens an archive as text. Archives are read as gzip when they start with the gzip magic number, and
+    written as gzip when their name ends in '.gz'.
+    :param path: string path of the archive
+    :param mode: 'r' to read, 'w' to write or 'a' to append
+    :return: text file object
+    """
+    if mode == 'r':
+        with open(path, 'rb') as archive:
+            compressed = archive.read(2) == GZIP_MAGIC
+    else:
+        compressed = str(path).endswith('.gz')
+    if compressed:
+        return gzip.open(path, mode + 't', encoding='utf-8', errors='replace')
+    return open(path, mode, encoding='utf-8', errors='replace')
+
+
+def write_games(path, records, mode='w'):
+    """
+    Writes game records to an archive one at a time, so records may come from a generator.
+    :param path: string path of the archive, gzip compressed if it ends in '.gz'
+    :param records: iterable of GameRecord
+    :param mode: 'w' to replace the archive or 'a' to add to it
+    :return: integer number of games written
+    """
+    count = 0
+    with open_archive(path, mode) as archive:
+        for record in records:
+            archive.write(format_game(record))
+            count += 1
+    return count
+
+
+def read_games(source):
+    """
+    Reads game records one at a time. Only the game being read is held in memory. Comments, variations,
+    annotation glyphs and move numbers are skipped; a game ends at its result or where the next game's
+    tags start.
+    :param source: string path of an archive, plain or gzip compressed, or an iterable of lines
+    :return: generator of GameRecord
+    """
+    if isinstance(source, str):
+        with open_archive(source) as archive:
+            yield from read_games(archive)
+        return
+
+    headers = {}
+    moves = []
+    in_comment = False
+    variation_depth = 0
+    for line in source:
+        if in_comment:
+            end = line.find('}')
+            if end < 0:
+                continue
+            line = line[end + 1:]
+            in_comment = False
+        line = line.strip()
+        if not line or line[0] == '%':
+            continue
+
+        if line[0] == '[':
+            if moves:
+                yield GameRecord(headers, moves, headers.get('Result', '*'))
+                headers, moves = {}, []
+            match = TAG_PATTERN.match(line)
+            if match:
+                headers[match.group(1)] = unescape_tag(match.group(2))
+            continue
+
+        line, in_comment = strip_comments(line)
+        for token in line.replace('(', ' ( ').replace(')', ' ) ').split():
+            if token == '(':
+                variation_depth += 1
+                continue
+            if token == ')':
+                variation_depth = max(variation_depth - 1, 0)
+                continue
+            token = MOVE_NUMBER_PATTERN.sub('', token).rstrip('!?+#')
+            if variation_depth or not token or token[0] == '$':
+                continue
+            if token in RESULTS:
+                yield GameRecord(headers, moves, token)
+                headers, moves, variation_depth = {}, [], 0
+                continue
+            moves.append(token)
+
+    if headers or moves:
+        yield GameRecord(headers, moves, headers.get('Result', '*'))
+
+
+def strip_comments(line):
+    """
+    Removes the brace and semicolon comments from a line of movetext.
+    :param line: string
+    :return: tuple (string without comments, True if a brace comment continues on the next line)
+    """
+    text = ''
+    while True:
+        start = line.find('{')
+        semicolon = line.find(';')
+        if semicolon >= 0 and (start < 0 or semicolon < start):
+            return text + line[:semicolon], False
+        if start < 0:
+            return text + line, False
+        end = line.find('}', start)
+        if end < 0:
+            return text + line[:start], True
+        text += line[:start] + ' '
+        line = line[end + 1:]
+
+
+def replay_game(record, validator='rules'):
+    """
+    Plays a record's moves to check they are legal and lead to the recorded result. A decided result
+    must match the board once the board shows a destroyed king; games decided some other way, such as on
+    time, may end with both kings standing. A game set up from a FEN must start with one king of each
+    color, unless its FEN records the game as over.
+    :param record: GameRecord
+    :param validator: key of VALIDATORS, 'rules' for ChessVar or 'fast' for BitboardChessVar
+    :return: ReplayResult
+    """
+    game_class = VALIDATORS[validator]
+    fen = record.headers.get('FEN')
+    try:
+        game = game_class.from_fen(fen) if fen else game_class()
+    except ValueError as error:
+        return ReplayResult(record, None, 0, f'bad FEN: {error}')
+    if not game.is_position_valid():
+        return ReplayResult(record, None, 0, 'bad FEN: a position needs one king of each color')
+
+    for ply, move in enumerate(record.moves):
+        if len(move) != 4 or not game.make_move(move[:2], move[2:]):
+            return ReplayResult(record, game, ply, f'illegal move {move!r} at ply {ply + 1}')
+
+    game_state = game.get_game_state()
+    if game_state != 'UNFINISHED' and GAME_STATE_RESULTS[game_state] != record.result:
+        return ReplayResult(record, game, len(record.moves),
+                            f'result {record.result} but the board shows {game_state}')
+    return ReplayResult(record, game, len(record.moves), None)
+
+
+def replay_archive(source, validator='rules'):
+    """
+    Replays every game of an archive, one at a time.
+    :param source: string path of an archive or an iterable of lines, as for read_games
+    :param validator: key of VALIDATORS
+    :return: generator of ReplayResult
+    """
+    for record in read_games(source):
+        yield replay_game(record, validator)
+
+
+def main(argv=None):
+    """
+    Replays an archive from the command line and reports the games that no longer follow the rules.
+    :param argv: list of command line arguments
+    :return: integer exit status, 1 if any game failed
+    """
+    parser = argparse.ArgumentParser(description='Checks every game of an atomic chess archive.')
+    parser.add_argument('archive', help='path of a PGN archive, optionally gzip compressed')
+    parser.add_argument('--validator', choices=sorted(VALIDATORS), default='rules',
+                        help='rules engine to replay the games through')
+    parser.add_argument('--show', type=int, default=20, help='number of failed games to print')
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    games = 0
+    plies = 0
+    failed = 0
+    for games, replay in enumerate(replay_archive(args.archive, args.validator), 1):
+        plies += replay.plies
+        if replay.error:
+            failed += 1
+            if failed <= args.show:
+                headers = replay.record.headers
+                print(f"game {games} ({headers.get('White', '?')} - {headers.get('Black', '?')}): {replay.error}")
+    seconds = time.perf_counter() - start_time
+    print(f'{games} games, {plies} moves, {failed} failed in {seconds:.2f} s '
+          f'({games / seconds if seconds else 0:.0f} games/s)')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,430 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: An asyncio server hosting many atomic chess games over TCP. Clients send one JSON object per
+#              line and receive one JSON object per line back; a connection may play or watch any number of
+#              games at once. Requests:
+#
+#                  {"type": "new"}                                  create a game and play white in it
+#                  {"type": "join", "game_id": 7}                   play black in a game
+#                  {"type": "watch", "game_id": 7}                  receive the moves of a game
+#                  {"type": "move", "game_id": 7, "move": "e2e4"}   play a move in a game
+#                  {"type": "state", "game_id": 7}                  ask for the position of a game
+#                  {"type": "validate", "moves": [[7, "e2", "e4"], [FEN, "g1", "f3"]]}
+#                                                                   check moves of games or positions
+#
+#              Every accepted move is sent to both players and every spectator as
+#                  {"type": "move", "game_id": 7, "move": "e2e4", "ply": 1, "turn": "BLACK",
+#                   "game_state": "UNFINISHED"}
+#              and a request that cannot be carried out is answered with {"type": "error", "reason": ...},
+#              with the request's game_id when it had one. A validate request is answered with
+#              {"type": "validation", "results": ["ACCEPTED", "WRONG_TURN"]}, a result for each move as
+#              MoveValidation.py gives them, and plays none of the moves. Moves are checked with
+#              ChessVar.make_move, which takes microseconds, so they run on the event loop without holding
+#              it up.
+#
+#              Started with a metrics port, the server turns on Instrumentation.py and answers HTTP GET
+#              /metrics on that port in the Prometheus text format, and /metrics.json with a JSON snapshot.
+#              Run as a script to start a server:
+#
+#              python GameServer.py [--host 127.0.0.1] [--port 8765] [--max-games 100000]
+#                                   [--metrics-port 9100]
+
+import argparse
+import asyncio
+import json
+import sys
+
+from ChessVar import ChessVar
+import Instrumentation
+from MoveValidation import MoveValidator
+
+DEFAULT_PORT = 8765
+# Longest request line accepted, in bytes
+MAX_LINE = 4096
+# Connections whose unsent output grows past this many bytes are too slow to keep up and are dropped
+MAX_WRITE_BUFFER = 1 << 20
+
+
+def encode_message(message):
+    """
+    Turns a message into one line of the protocol.
+    :param message: dictionary
+    :return: bytes ending with a newline
+    """
+    return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+
+class GameSession:
+    """
+    A class that represents one game hosted by the server: the game itself, the connection playing each
+    color and the connections watching.
+    """
+    __slots__ = ('_game_id', '_game', '_players', '_spectators', '_plies')
+
+    def __init__(self, game_id):
+        self._game_id = game_id
+        self._game = ChessVar()
+        self._players = {'WHITE': None, 'BLACK': None}
+        self._spectators = set()
+        self._plies = 0
+
+    def get_game_id(self):
+        """Returns the integer id of the game."""
+        return self._game_id
+
+    def get_game(self):
+        """Returns the ChessVar object of the game."""
+        return self._game
+
+    def get_players(self):
+        """Returns the dictionary of the connection playing each color, or None for a free seat."""
+        return self._players
+
+    def get_spectators(self):
+        """Returns the set of connections watching the game."""
+        return self._spectators
+
+    def get_audience(self):
+        """
+        Returns every connection the moves of the game are sent to, each once.
+        :return: set of StreamWriter objects
+        """
+        return {writer for writer in self._players.values() if writer} | self._spectators
+
+    def is_abandoned(self):
+        """Returns True when nobody plays or watches the game any more."""
+        return not self.get_audience()
+
+    def leave(self, writer):
+        """
+        Removes a connection from the game's players and spectators.
+        :param writer: StreamWriter of the connection
+        :return: Nothing
+        """
+        for color, player in self._players.items():
+            if player is writer:
+                self._players[color] = None
+        self._spectators.discard(writer)
+
+    def play(self, writer, move):
+        """
+        Plays a move sent by a connection.
+        :param writer: StreamWriter of the connection
+        :param move: string move such as 'e2e4'
+        :return: the message to send to the audience, or the string reason the move was refused
+        """
+        game = self._game
+        if game.get_game_state() != 'UNFINISHED':
+            return 'game is over'
+        if self._players[game.get_player_turn()] is not writer:
+            return 'not your turn'
+        if not isinstance(move, str) or len(move) != 4 or not game.make_move(move[:2], move[2:]):
+            return 'illegal move'
+        self._plies += 1
+        return {'type': 'move', 'game_id': self._game_id, 'move': move, 'ply': self._plies,
+                'turn': game.get_player_turn(), 'game_state': game.get_game_state()}
+
+    def get_state(self):
+        """
+        Describes the current position.
+        :return: dictionary message
+        """
+        return {'type': 'state', 'game_id': self._game_id, 'fen': self._game.to_fen(), 'ply': self._plies,
+                'turn': self._game.get_player_turn(), 'game_state': self._game.get_game_state(),
+                'players': {color: writer is not None for color, writer in self._players.items()}}
+
+
+class GameServer:
+    """
+    A class that represents the server: the games it hosts and the connections to them. Each connection
+    is served by one task reading its requests in order. Replies and moves are queued per connection and
+    written without waiting, and a connection that stops reading is dropped rather than allowed to hold
+    up the others.
+    """
+    def __init__(self, max_games=100000, metrics=None):
+        self._max_games = max_games
+        self._sessions = {}
+        self._next_game_id = 1
+        self._server = None
+        # Instrumentation.Metrics object served over HTTP, and the server answering its requests
+        self._metrics = metrics
+        self._metrics_server = None
+        self._validator = MoveValidator(self.find_game)
+        # Lines waiting to be written, by connection, sent together once the requests at hand are handled
+        self._outboxes = {}
+        # The task serving each open connection, by connection
+        self._connections = {}
+
+    def get_sessions(self):
+        """Returns the dictionary of hosted GameSession objects by game id."""
+        return self._sessions
+
+    def find_game(self, game_id):
+        """
+        Finds a hosted game.
+        :param game_id: game id sent by a client
+        :return: ChessVar object, or None if no game has the id
+        """
+        session = self._sessions.get(game_id) if isinstance(game_id, int) else None
+        return session.get_game() if session else None
+
+    def get_port(self):
+        """Returns the integer port the server listens on, useful after starting on port 0."""
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """
+        Starts listening for connections.
+        :param host: string address to listen on
+        :param port: integer port, or 0 for any free port
+        :return: Nothing
+        """
+        self._server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_LINE)
+
+    async def start_metrics(self, host='127.0.0.1', port=0):
+        """
+        Starts answering HTTP requests for the metrics.
+        :param host: string address to listen on
+        :param port: integer port, or 0 for any free port
+        :return: integer port listened on
+        """
+        self._metrics_server = await asyncio.start_server(self.handle_metrics_request, host, port, limit=MAX_LINE)
+        return self._metrics_server.sockets[0].getsockname()[1]
+
+    async def handle_metrics_request(self, reader, writer):
+        """
+        Answers one HTTP request for the metrics and closes the connection.
+        :param reader: StreamReader of the connection
+        :param writer: StreamWriter of the connection
+        :return: Nothing
+        """
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            parts = request_line.split()
+            path = parts[1].decode('ascii', 'replace') if len(parts) > 1 and parts[0] == b'GET' else None
+            if path == '/metrics' and self._metrics:
+                status, content_type, body = '200 OK', 'text/plain; version=0.0.4', self._metrics.to_prometheus()
+            elif path == '/metrics.json' and self._metrics:
+                status, content_type, body = '200 OK', 'application/json', self._metrics.to_json()
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', 'not found\n'
+            body = body.encode()
+            writer.write(f'HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\n'
+                         f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+            await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self):
+        """
+        Serves connections until cancelled.
+        :return: Nothing
+        """
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """
+        Stops listening for connections and closes the open ones.
+        :return: Nothing
+        """
+        self._server.close()
+        if self._metrics_server:
+            self._metrics_server.close()
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*self._connections.values(), return_exceptions=True)
+        await self._server.wait_closed()
+        if self._metrics_server:
+            await self._metrics_server.wait_closed()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves one connection until it closes.
+        :param reader: StreamReader of the connection
+        :param writer: StreamWriter of the connection
+        :return: Nothing
+        """
+        game_ids = set()
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    self.send(writer, {'type': 'error', 'reason': 'request too long'})
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                if not isinstance(request, dict):
+                    self.send(writer, {'type': 'error', 'reason': 'bad request'})
+                    continue
+                self.handle_request(writer, request, game_ids)
+        except ConnectionError:
+            pass
+        finally:
+            del self._connections[writer]
+            for game_id in game_ids:
+                session = self._sessions.get(game_id)
+                if session:
+                    session.leave(writer)
+                    if session.is_abandoned():
+                        del self._sessions[game_id]
+            lines = self._outboxes.pop(writer, None)
+            if lines and not writer.is_closing():
+                writer.write(b''.join(lines))
+            writer.close()
+
+    def handle_request(self, writer, request, game_ids):
+        """
+        Carries out one request.
+        :param writer: StreamWriter of the connection the request came from
+        :param request: dictionary decoded from the request line
+        :param game_ids: set of the ids of the games the connection plays or watches
+        :return: Nothing
+        """
+        request_type = request.get('type')
+        if request_type == 'new':
+            if len(self._sessions) >= self._max_games:
+                self.send(writer, {'type': 'error', 'reason': 'server full'})
+                return
+            session = GameSession(self._next_game_id)
+            self._next_game_id += 1
+            self._sessions[session.get_game_id()] = session
+            session.get_players()['WHITE'] = writer
+            game_ids.add(session.get_game_id())
+            self.send(writer, {'type': 'created', 'game_id': session.get_game_id(), 'color': 'WHITE'})
+            return
+
+        if request_type == 'validate':
+            moves = request.get('moves')
+            if not isinstance(moves, list) or not all(isinstance(move, list) and len(move) == 3 for move in moves):
+                self.send(writer, {'type': 'error', 'reason': 'bad request'})
+                return
+            self.send(writer, {'type': 'validation', 'results': self._validator.validate_batch(moves)})
+            return
+
+        game_id = request.get('game_id')
+        session = self._sessions.get(game_id) if isinstance(game_id, int) else None
+        if request_type not in ('join', 'watch', 'move', 'state'):
+            self.send(writer, {'type': 'error', 'reason': 'unknown request type', 'game_id': game_id})
+        elif session is None:
+            self.send(writer, {'type': 'error', 'reason': 'unknown game', 'game_id': game_id})
+        elif request_type == 'join':
+            if session.get_players()['BLACK'] is not None:
+                self.send(writer, {'type': 'error', 'reason': 'game is full', 'game_id': game_id})
+                return
+            session.get_players()['BLACK'] = writer
+            game_ids.add(game_id)
+            self.send(writer, {'type': 'joined', 'game_id': game_id, 'color': 'BLACK'})
+            self.broadcast(session, session.get_state())
+        elif request_type == 'watch':
+            session.get_spectators().add(writer)
+            game_ids.add(game_id)
+            self.send(writer, session.get_state())
+        elif request_type == 'state':
+            self.send(writer, session.get_state())
+        else:
+            result = session.play(writer, request.get('move'))
+            if isinstance(result, str):
+                self.send(writer, {'type': 'error', 'reason': result, 'game_id': game_id})
+            else:
+                self.broadcast(session, result)
+
+    def send(self, writer, message):
+        """
+        Sends a message to one connection.
+        :param writer: StreamWriter of the connection
+        :param message: dictionary
+        :return: Nothing
+        """
+        self.queue_line(writer, encode_message(message))
+
+    def broadcast(self, session, message):
+        """
+        Sends a message to both players and every spectator of a game.
+        :param session: GameSession
+        :param message: dictionary
+        :return: Nothing
+        """
+        line = encode_message(message)
+        for writer in session.get_audience():
+            self.queue_line(writer, line)
+
+    def queue_line(self, writer, line):
+        """
+        Adds a line to a connection's outbox. The outboxes are written out after the event loop has
+        handled every request that has already arrived, so a burst of messages to one connection costs
+        one write to its socket rather than one each.
+        :param writer: StreamWriter of the connection
+        :param line: bytes of one encoded message
+        :return: Nothing
+        """
+        if not self._outboxes:
+            asyncio.get_running_loop().call_soon(self.flush_outboxes)
+        self._outboxes.setdefault(writer, []).append(line)
+
+    def flush_outboxes(self):
+        """
+        Writes every outbox to its connection. A connection whose unsent output has grown past
+        MAX_WRITE_BUFFER is not reading and is closed instead.
+        :return: Nothing
+        """
+        outboxes, self._outboxes = self._outboxes, {}
+        for writer, lines in outboxes.items():
+            if writer.is_closing():
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                writer.close()
+            else:
+                writer.write(b''.join(lines))
+
+
+async def serve(host, port, max_games, metrics_port=None):
+    """
+    Runs a server until cancelled.
+    :param host: string address to listen on
+    :param port: integer port
+    :param max_games: integer number of games the server hosts at most
+    :param metrics_port: integer port to serve metrics on, or None to leave instrumentation off
+    :return: Nothing
+    """
+    metrics = Instrumentation.enable() if metrics_port is not None else None
+    server = GameServer(max_games, metrics)
+    await server.start(host, port)
+    print(f'listening on {host}:{server.get_port()}', flush=True)
+    if metrics is not None:
+        print(f'metrics on http://{host}:{await server.start_metrics(host, metrics_port)}/metrics', flush=True)
+    await server.serve_forever()
+
+
+def main(argv=None):
+    """
+    Starts a server from the command line.
+    :param argv: list of command line arguments
+    :return: integer exit status
+    """
+    parser = argparse.ArgumentParser(description='Hosts atomic chess games over TCP, one JSON message per line.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on, 0 for any free port')
+    parser.add_argument('--max-games', type=int, default=100000, help='number of games hosted at most')
+    parser.add_argument('--metrics-port', type=int, help='port to serve instrumentation metrics on over HTTP')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_games, args.metrics_port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
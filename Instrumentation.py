@@ -0,0 +1,503 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Opt-in instrumentation of the rules engine's hot paths. While enabled, calls are counted and
+#              timed into histograms for:
+#
+#                  move generation    get_valid_moves by piece type, with the number of moves generated
+#                  translate_square   turning algebraic squares into board positions
+#                  explosions         ChessVar.explosion, with the number of pieces each blast destroys
+#                  make_move          ChessVar.make_move, counted by result: ACCEPTED or the reason the
+#                                     move was refused (see ChessVar.MOVE_RESULTS)
+#
+#              Enabling swaps timing wrappers in for those methods of the ChessVar classes and disabling puts
+#              the originals back, so instrumentation that is off costs nothing at all. It covers every
+#              ChessVar of the process, so a game server enables it once at start up. Snapshots export as
+#              JSON or in the Prometheus text format. Run as a script to play random games instrumented and
+#              report the counters and the overhead:
+#
+#              python Instrumentation.py [--games 50] [--seed 0] [--format json|prometheus]
+#                                        [--output instrumentation_results.json]
+
+import argparse
+import bisect
+import functools
+import json
+import random
+import sys
+import time
+
+from AttackTables import SQUARE_NAMES
+from ChessVar import ChessVar, King, Knight, MOVE_RESULTS, Pawn, PIECE_CLASSES, SlidingPiece
+
+# Upper bounds in seconds of the buckets of the timing histograms, from 1 us to 10 ms
+TIME_BUCKETS = (1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2)
+# Upper bounds of the buckets of the histogram of pieces destroyed per blast. A blast destroys at most the
+# capturing piece and the eight pieces around it
+BLAST_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 9)
+# Prefix of every exported metric name
+METRIC_PREFIX = 'atomic_'
+
+# The Metrics object collecting while instrumentation is enabled, and the methods the wrappers replaced,
+# by (class, method name)
+_metrics = None
+_originals = {}
+# The result of the last validate_move call, which the make_move wrapper counts a refused move under
+_last_move_result = None
+
+
+class Histogram:
+    """
+    A class that represents a histogram of observed values: how many fell at or below each bucket's upper
+    bound, plus their total count and sum, as Prometheus histograms are.
+    """
+    __slots__ = ('_bounds', '_counts', '_count', '_sum')
+
+    def __init__(self, bounds):
+        self._bounds = tuple(bounds)
+        # Observations by bucket, not cumulative, the last for values above every bound
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._count = 0
+        self._sum = 0
+
+    def observe(self, value):
+        """
+        Adds an observation to the histogram.
+        :param value: number observed
+        :return: Nothing
+        """
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self._count += 1
+        self._sum += value
+
+    def reset(self):
+        """
+        Forgets every observation.
+        :return: Nothing
+        """
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._count = 0
+        self._sum = 0
+
+    def get_bounds(self):
+        """Returns the tuple of the buckets' upper bounds."""
+        return self._bounds
+
+    def get_count(self):
+        """Returns the integer number of observations."""
+        return self._count
+
+    def get_sum(self):
+        """Returns the sum of the observations."""
+        return self._sum
+
+    def get_cumulative_counts(self):
+        """
+        Returns the number of observations at or below each bound, as Prometheus buckets count them.
+        :return: list of integers, one per bound followed by the total count
+        """
+        counts = []
+        total = 0
+        for count in self._counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def to_dict(self):
+        """
+        Describes the histogram for a JSON snapshot.
+        :return: dictionary with the count, sum and cumulative count of each bucket by upper bound
+        """
+        bounds = [str(bound) for bound in self._bounds] + ['+Inf']
+        return {'count': self._count, 'sum': self._sum,
+                'buckets': dict(zip(bounds, self.get_cumulative_counts()))}
+
+
+class Metrics:
+    """
+    A class that represents the counters and histograms filled in by the instrumentation wrappers. It can
+    be reset or exported at any time, including while it is collecting.
+    """
+    def __init__(self):
+        self._move_generation = {}
+        self._moves_generated = {}
+        self._translate_square = Histogram(TIME_BUCKETS)
+        self._explosion = Histogram(TIME_BUCKETS)
+        self._blast_pieces = Histogram(BLAST_BUCKETS)
+        self._make_move = Histogram(TIME_BUCKETS)
+        self._move_results = {}
+        self._started = time.time()
+        self.reset()
+
+    def reset(self):
+        """
+        Sets every counter and histogram back to zero.
+        :return: Nothing
+        """
+        self._move_generation = {piece_type: Histogram(TIME_BUCKETS) for piece_type in PIECE_CLASSES}
+        self._moves_generated = dict.fromkeys(PIECE_CLASSES, 0)
+        for histogram in (self._translate_square, self._explosion, self._blast_pieces, self._make_move):
+            histogram.reset()
+        self._move_results = dict.fromkeys(MOVE_RESULTS, 0)
+        self._started = time.time()
+
+    def get_move_generation(self):
+        """Returns the dictionary of get_valid_moves timing Histogram objects by piece type."""
+        return self._move_generation
+
+    def get_moves_generated(self):
+        """Returns the dictionary of the integer number of moves generated by piece type."""
+        return self._moves_generated
+
+    def get_translate_square(self):
+        """Returns the translate_square timing Histogram."""
+        return self._translate_square
+
+    def get_explosion(self):
+        """Returns the explosion timing Histogram."""
+        return self._explosion
+
+    def get_blast_pieces(self):
+        """Returns the Histogram of the number of pieces destroyed per blast."""
+        return self._blast_pieces
+
+    def get_make_move(self):
+        """Returns the make_move timing Histogram."""
+        return self._make_move
+
+    def get_move_results(self):
+        """Returns the dictionary of the integer number of make_move calls by result."""
+        return self._move_results
+
+    def observe_move_generation(self, piece_type, seconds, moves):
+        """
+        Records one call of a piece's get_valid_moves.
+        :param piece_type: string piece type, such as 'QUEEN'
+        :param seconds: float duration of the call
+        :param moves: integer number of moves generated
+        :return: Nothing
+        """
+        self._move_generation[piece_type].observe(seconds)
+        self._moves_generated[piece_type] += moves
+
+    def observe_translate_square(self, seconds):
+        """
+        Records one call of translate_square.
+        :param seconds: float duration of the call
+        :return: Nothing
+        """
+        self._translate_square.observe(seconds)
+
+    def observe_explosion(self, seconds, destroyed):
+        """
+        Records one explosion.
+        :param seconds: float duration of the explosion
+        :param destroyed: integer number of pieces the blast destroyed, the capturing piece included and the
+                          captured piece, already taken off the board, not
+        :return: Nothing
+        """
+        self._explosion.observe(seconds)
+        self._blast_pieces.observe(destroyed)
+
+    def observe_make_move(self, seconds, result):
+        """
+        Records one call of make_move.
+        :param seconds: float duration of the call
+        :param result: string result, one of ChessVar.MOVE_RESULTS
+        :return: Nothing
+        """
+        self._make_move.observe(seconds)
+        self._move_results[result] += 1
+
+    def snapshot(self):
+        """
+        Copies out every counter and histogram.
+        :return: dictionary ready for JSON
+        """
+        return {
+            'started': self._started,
+            'seconds': round(time.time() - self._started, 3),
+            'move_generation': {piece_type: dict(histogram.to_dict(), moves=self._moves_generated[piece_type])
+                                for piece_type, histogram in self._move_generation.items()},
+            'translate_square': self._translate_square.to_dict(),
+            'explosion': dict(self._explosion.to_dict(), pieces_destroyed=self._blast_pieces.to_dict()),
+            'make_move': dict(self._make_move.to_dict(), results=dict(self._move_results)),
+        }
+
+    def to_json(self):
+        """
+        Exports a snapshot as JSON.
+        :return: string JSON document
+        """
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """
+        Exports a snapshot in the Prometheus text exposition format.
+        :return: string ending with a newline
+        """
+        lines = []
+        add_histogram_family(lines, 'move_generation_seconds', 'Time spent generating a piece\'s valid moves.',
+                             [({'piece': piece_type}, histogram)
+                              for piece_type, histogram in self._move_generation.items()])
+        add_counter_family(lines, 'moves_generated_total', 'Moves generated, by piece type.',
+                           [({'piece': piece_type}, moves) for piece_type, moves in self._moves_generated.items()])
+        add_histogram_family(lines, 'translate_square_seconds', 'Time spent translating algebraic squares.',
+                             [({}, self._translate_square)])
+        add_histogram_family(lines, 'explosion_seconds', 'Time spent resolving explosions.',
+                             [({}, self._explosion)])
+        add_histogram_family(lines, 'explosion_pieces_destroyed', 'Pieces destroyed per explosion.',
+                             [({}, self._blast_pieces)])
+        add_histogram_family(lines, 'make_move_seconds', 'Time spent in make_move.', [({}, self._make_move)])
+        add_counter_family(lines, 'make_move_total', 'Calls of make_move, by result.',
+                           [({'result': result}, count) for result, count in self._move_results.items()])
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    """
+    Formats labels for a Prometheus sample.
+    :param labels: dictionary of string label values by name
+    :return: string such as '{piece="QUEEN"}', empty if there are no labels
+    """
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+
+def add_counter_family(lines, name, description, samples):
+    """
+    Adds a counter and its samples to a Prometheus export.
+    :param lines: list of strings the lines are added to
+    :param name: string name of the counter without METRIC_PREFIX
+    :param description: string help text
+    :param samples: list of tuples (dictionary of labels, integer value)
+    :return: Nothing
+    """
+    name = METRIC_PREFIX + name
+    lines.append(f'# HELP {name} {description}')
+    lines.append(f'# TYPE {name} counter')
+    for labels, value in samples:
+        lines.append(f'{name}{format_labels(labels)} {value}')
+
+
+def add_histogram_family(lines, name, description, samples):
+    """
+    Adds a histogram and its samples to a Prometheus export.
+    :param lines: list of strings the lines are added to
+    :param name: string name of the histogram without METRIC_PREFIX
+    :param description: string help text
+    :param samples: list of tuples (dictionary of labels, Histogram)
+    :return: Nothing
+    """
+    name = METRIC_PREFIX + name
+    lines.append(f'# HELP {name} {description}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, histogram in samples:
+        bounds = [repr(float(bound)) for bound in histogram.get_bounds()] + ['+Inf']
+        for bound, count in zip(bounds, histogram.get_cumulative_counts()):
+            lines.append(f'{name}_bucket{format_labels(dict(labels, le=bound))} {count}')
+        lines.append(f'{name}_sum{format_labels(labels)} {histogram.get_sum()!r}')
+        lines.append(f'{name}_count{format_labels(labels)} {histogram.get_count()}')
+
+
+def wrap_get_valid_moves(original, metrics):
+    """
+    Times a piece class's get_valid_moves.
+    :param original: function replaced
+    :param metrics: Metrics object recording the calls
+    :return: function
+    """
+    @functools.wraps(original)
+    def get_valid_moves(piece, board):
+        start = time.perf_counter()
+        moves = original(piece, board)
+        metrics.observe_move_generation(piece.get_piece_type(), time.perf_counter() - start, len(moves))
+        return moves
+    return get_valid_moves
+
+
+def wrap_translate_square(original, metrics):
+    """
+    Times ChessVar.translate_square.
+    :param original: function replaced
+    :param metrics: Metrics object recording the calls
+    :return: function
+    """
+    @functools.wraps(original)
+    def translate_square(game, square):
+        start = time.perf_counter()
+        position = original(game, square)
+        metrics.observe_translate_square(time.perf_counter() - start)
+        return position
+    return translate_square
+
+
+def wrap_explosion(original, metrics):
+    """
+    Times ChessVar.explosion and counts the pieces each blast destroys.
+    :param original: function replaced
+    :param metrics: Metrics object recording the calls
+    :return: function
+    """
+    @functools.wraps(original)
+    def explosion(game, board, square):
+        start = time.perf_counter()
+        destroyed = original(game, board, square)
+        metrics.observe_explosion(time.perf_counter() - start, len(destroyed))
+        return destroyed
+    return explosion
+
+
+def wrap_validate_move(original, metrics):
+    """
+    Keeps the result of ChessVar.validate_move, so that the make_move wrapper knows why make_move refused
+    a move without checking it twice.
+    :param original: function replaced
+    :param metrics: Metrics object recording the calls
+    :return: function
+    """
+    @functools.wraps(original)
+    def validate_move(game, move_from, move_to):
+        global _last_move_result
+        result, move = original(game, move_from, move_to)
+        _last_move_result = result
+        return result, move
+    return validate_move
+
+
+def wrap_make_move(original, metrics):
+    """
+    Times ChessVar.make_move and counts its results, a refused move under the result of the validate_move
+    call made for it.
+    :param original: function replaced
+    :param metrics: Metrics object recording the calls
+    :return: function
+    """
+    @functools.wraps(original)
+    def make_move(game, move_from, move_to):
+        global _last_move_result
+        _last_move_result = None
+        start = time.perf_counter()
+        moved = original(game, move_from, move_to)
+        seconds = time.perf_counter() - start
+        metrics.observe_make_move(seconds, 'ACCEPTED' if moved else _last_move_result or 'INVALID_MOVE')
+        return moved
+    return make_move
+
+
+# Methods instrumented, by class, with the function building each one's wrapper
+INSTRUMENTED = (
+    (King, 'get_valid_moves', wrap_get_valid_moves),
+    (SlidingPiece, 'get_valid_moves', wrap_get_valid_moves),
+    (Knight, 'get_valid_moves', wrap_get_valid_moves),
+    (Pawn, 'get_valid_moves', wrap_get_valid_moves),
+    (ChessVar, 'translate_square', wrap_translate_square),
+    (ChessVar, 'explosion', wrap_explosion),
+    (ChessVar, 'validate_move', wrap_validate_move),
+    (ChessVar, 'make_move', wrap_make_move),
+)
+
+
+def enable(metrics=None):
+    """
+    Turns instrumentation on for every ChessVar of the process. Enabling it again starts collecting into
+    the given Metrics object instead.
+    :param metrics: Metrics object to collect into, a new one by default
+    :return: the Metrics object collecting
+    """
+    global _metrics
+    disable()
+    _metrics = metrics if metrics is not None else Metrics()
+    for cls, name, wrap in INSTRUMENTED:
+        original = cls.__dict__[name]
+        _originals[(cls, name)] = original
+        setattr(cls, name, wrap(original, _metrics))
+    return _metrics
+
+
+def disable():
+    """
+    Turns instrumentation off, putting back the original methods.
+    :return: the Metrics object that was collecting, or None if instrumentation was off
+    """
+    global _metrics
+    metrics = _metrics
+    for (cls, name), original in _originals.items():
+        setattr(cls, name, original)
+    _originals.clear()
+    _metrics = None
+    return metrics
+
+
+def is_enabled():
+    """Returns True while instrumentation is on."""
+    return _metrics is not None
+
+
+def get_metrics():
+    """Returns the Metrics object collecting, or None if instrumentation is off."""
+    return _metrics
+
+
+def play_random_games(games, seed=0, max_plies=200):
+    """
+    Plays random games through make_move. Before each move a random pair of squares is tried too, as a
+    client sending bad moves would, so that refused moves are part of the load.
+    :param games: integer number of games
+    :param seed: integer seed of the moves chosen
+    :param max_plies: integer number of moves after which a game is stopped
+    :return: integer number of make_move calls
+    """
+    rng = random.Random(seed)
+    calls = 0
+    for _ in range(games):
+        game = ChessVar()
+        for _ in range(max_plies):
+            moves = game.legal_moves()
+            if not moves:
+                break
+            game.make_move(rng.choice(SQUARE_NAMES), rng.choice(SQUARE_NAMES))
+            start, end = rng.choice(moves)
+            game.make_move(game.translate_position(start), game.translate_position(end))
+            calls += 2
+    return calls
+
+
+def main(argv=None):
+    """
+    Plays random games with instrumentation off and then on from the command line, prints the overhead and
+    the counters and writes the snapshot.
+    :param argv: list of command line arguments
+    :return: integer exit status
+    """
+    parser = argparse.ArgumentParser(description='Instruments the atomic chess rules engine over random games.')
+    parser.add_argument('--games', type=int, default=50, help='number of random games played')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random moves')
+    parser.add_argument('--format', choices=('json', 'prometheus'), default='json', help='format printed')
+    parser.add_argument('--output', default='instrumentation_results.json', help='path of the JSON snapshot')
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    calls = play_random_games(args.games, args.seed)
+    plain_seconds = time.perf_counter() - start_time
+    metrics = enable()
+    try:
+        start_time = time.perf_counter()
+        play_random_games(args.games, args.seed)
+        instrumented_seconds = time.perf_counter() - start_time
+    finally:
+        disable()
+
+    print(metrics.to_json() if args.format == 'json' else metrics.to_prometheus(), end='')
+    print(f'{calls} make_move calls: {plain_seconds:.2f} s plain, {instrumented_seconds:.2f} s instrumented '
+          f'({instrumented_seconds / plain_seconds - 1:+.0%})')
+    report = dict(metrics.snapshot(), plain_seconds=round(plain_seconds, 3),
+                  instrumented_seconds=round(instrumented_seconds, 3))
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
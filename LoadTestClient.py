@@ -0,0 +1,280 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: A load test for GameServer. Plays many games at once over a small number of connections, each
+#              connection playing both colors of its games with random legal moves, and reports the time
+#              from sending a move to receiving it back from the server. Starts its own server in a separate
+#              process unless given the port of a running one:
+#
+#              python LoadTestClient.py [--games 1000,10000] [--connections 50] [--moves 20] [--think 1.0]
+#                                       [--port 8765] [--output load_results.json]
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import deque
+
+from BitboardChessVar import SQUARE_NAMES, BitboardChessVar
+from GameServer import MAX_LINE, encode_message
+
+
+def percentile(values, fraction):
+    """
+    Returns the value below which a fraction of the values fall, by the nearest rank.
+    :param values: sorted list of numbers
+    :param fraction: float between 0 and 1
+    :return: number, or None for no values
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class LoadTestConnection:
+    """
+    A class that represents one connection to the server, shared by many games. A reader task hands each
+    message to the game waiting for it.
+    """
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._created = deque()
+        self._waiting = {}
+        self._outbox = []
+        self._reader_task = asyncio.get_running_loop().create_task(self.read_messages())
+
+    @classmethod
+    async def connect(cls, host, port):
+        """
+        Opens a connection to the server.
+        :param host: string address of the server
+        :param port: integer port of the server
+        :return: LoadTestConnection object
+        """
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE * 16)
+        return cls(reader, writer)
+
+    async def close(self):
+        """
+        Closes the connection.
+        :return: Nothing
+        """
+        self._reader_task.cancel()
+        self._writer.close()
+
+    async def read_messages(self):
+        """
+        Reads messages until the connection closes, completing the request each one answers.
+        :return: Nothing
+        """
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            message_type = message['type']
+            if message_type == 'created':
+                self._created.popleft().set_result(message['game_id'])
+                continue
+            waiting = self._waiting.get(message.get('game_id'))
+            if waiting is None:
+                continue
+            expected, future = waiting
+            if message_type == 'error':
+                del self._waiting[message['game_id']]
+                future.set_exception(RuntimeError(message['reason']))
+            elif message_type == expected[0] and message.get('ply', 0) >= expected[1]:
+                del self._waiting[message['game_id']]
+                future.set_result(message)
+        error = ConnectionError('connection closed by the server')
+        for future in self._created:
+            future.set_exception(error)
+        for _, future in self._waiting.values():
+            future.set_exception(error)
+
+    def send(self, message):
+        """
+        Queues a request, to be written together with the other requests games make in the same pass of
+        the event loop.
+        :param message: dictionary
+        :return: Nothing
+        """
+        if not self._outbox:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self._outbox.append(encode_message(message))
+
+    def flush(self):
+        """
+        Writes the queued requests.
+        :return: Nothing
+        """
+        if not self._writer.is_closing():
+            self._writer.write(b''.join(self._outbox))
+        self._outbox = []
+
+    def wait_for(self, game_id, message_type, ply=0):
+        """
+        Returns a future for the next message of a type about a game.
+        :param game_id: integer game id
+        :param message_type: string type of the message
+        :param ply: integer lowest ply of the message
+        :return: asyncio.Future of the message dictionary
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[game_id] = ((message_type, ply), future)
+        return future
+
+    async def new_game(self):
+        """
+        Creates a game on the server and joins it as black too.
+        :return: integer game id
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._created.append(future)
+        self.send({'type': 'new'})
+        game_id = await future
+        joined = self.wait_for(game_id, 'state')
+        self.send({'type': 'join', 'game_id': game_id})
+        await joined
+        return game_id
+
+    async def play(self, game_id, move, ply):
+        """
+        Sends a move and waits for the server to send it back.
+        :param game_id: integer game id
+        :param move: string move such as 'e2e4'
+        :param ply: integer number of moves played in the game after this one
+        :return: message dictionary of the move
+        """
+        played = self.wait_for(game_id, 'move', ply)
+        self.send({'type': 'move', 'game_id': game_id, 'move': move})
+        return await played
+
+
+async def play_game(connection, moves, think_time, rng, latencies):
+    """
+    Plays one game of random legal moves through the server.
+    :param connection: LoadTestConnection
+    :param moves: integer number of moves to play at most
+    :param think_time: float mean seconds to wait before each move
+    :param rng: random.Random object choosing the moves
+    :param latencies: list the seconds each move took are added to
+    :return: Nothing
+    """
+    game_id = await connection.new_game()
+    position = BitboardChessVar()
+    for ply in range(1, moves + 1):
+        if position.get_game_state() != 'UNFINISHED':
+            break
+        legal_moves = position.generate_moves()
+        if not legal_moves:
+            break
+        start, end = rng.choice(legal_moves)
+        if think_time:
+            await asyncio.sleep(rng.uniform(0, 2 * think_time))
+        sent = time.perf_counter()
+        await connection.play(game_id, SQUARE_NAMES[start] + SQUARE_NAMES[end], ply)
+        latencies.append(time.perf_counter() - sent)
+        position.apply_move(start, end)
+
+
+async def run_load_test(host, port, games, connections=50, moves=20, think_time=1.0, seed=0):
+    """
+    Plays many games at once through a server and measures the move latency.
+    :param host: string address of the server
+    :param port: integer port of the server
+    :param games: integer number of games played at the same time
+    :param connections: integer number of connections the games are shared out over
+    :param moves: integer number of moves each game plays at most
+    :param think_time: float mean seconds each game waits before a move
+    :param seed: integer seed of the move choices
+    :return: dictionary of the results
+    """
+    rng = random.Random(seed)
+    clients = [await LoadTestConnection.connect(host, port) for _ in range(min(connections, games))]
+    latencies = []
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*(play_game(clients[index % len(clients)], moves, think_time,
+                                               random.Random(rng.random()), latencies)
+                                     for index in range(games)), return_exceptions=True)
+    seconds = time.perf_counter() - start_time
+    for client in clients:
+        await client.close()
+
+    latencies.sort()
+    errors = [result for result in results if isinstance(result, BaseException)]
+    return {
+        'games': games,
+        'connections': len(clients),
+        'moves': len(latencies),
+        'errors': len(errors),
+        'seconds': round(seconds, 3),
+        'moves_per_second': round(len(latencies) / seconds),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else None,
+    }
+
+
+def start_server():
+    """
+    Starts a GameServer in a new process on a free port and waits until it accepts connections.
+    :return: tuple (subprocess.Popen, integer port)
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen([sys.executable, os.path.join(directory, 'GameServer.py'), '--port', '0'],
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('listening on'):
+        process.kill()
+        raise RuntimeError('the server did not start')
+    return process, int(line.rsplit(':', 1)[1])
+
+
+def main(argv=None):
+    """
+    Runs the load test from the command line, prints a table and writes the JSON report.
+    :param argv: list of command line arguments
+    :return: integer exit status, 1 if any game failed
+    """
+    parser = argparse.ArgumentParser(description='Load test for the atomic chess game server.')
+    parser.add_argument('--games', default='1000,10000', help='comma separated numbers of concurrent games')
+    parser.add_argument('--connections', type=int, default=50, help='connections the games are shared over')
+    parser.add_argument('--moves', type=int, default=20, help='moves each game plays at most')
+    parser.add_argument('--think', type=float, default=1.0, help='mean seconds each game waits before a move')
+    parser.add_argument('--host', default='127.0.0.1', help='address of the server')
+    parser.add_argument('--port', type=int, help='port of a running server; one is started if not given')
+    parser.add_argument('--output', default='load_results.json', help='path of the JSON report')
+    args = parser.parse_args(argv)
+
+    process = None
+    port = args.port
+    if port is None:
+        process, port = start_server()
+    try:
+        results = []
+        for games in [int(games) for games in args.games.split(',')]:
+            result = asyncio.run(run_load_test(args.host, port, games, args.connections, args.moves, args.think))
+            results.append(result)
+            print(f"{result['games']:>6} games {result['moves']:>7} moves {result['moves_per_second']:>6} moves/s "
+                  f"p50 {result['p50_ms']:>8.2f} ms p99 {result['p99_ms']:>8.2f} ms errors {result['errors']}")
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    with open(args.output, 'w') as output:
+        json.dump({'cpu_count': os.cpu_count(), 'python': platform.python_version(), 'moves': args.moves,
+                   'think_seconds': args.think, 'connections': args.connections, 'results': results}, output,
+                  indent=2)
+    return 1 if any(result['errors'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
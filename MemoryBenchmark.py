@@ -0,0 +1,88 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Memory benchmark for idle games. Creates many games in the starting position, the state a
+#              server holds for sessions waiting on their players, and reports the memory each one takes as
+#              counted by tracemalloc, along with the bitboard backend and a packed position for comparison.
+#
+#              python MemoryBenchmark.py [--games 100000] [--output memory_results.json]
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import tracemalloc
+
+from BitboardChessVar import BitboardChessVar
+from ChessVar import ChessVar
+
+# Ways of holding an idle game, by name, each a function creating one
+FORMS = {
+    'ChessVar': ChessVar,
+    'BitboardChessVar': BitboardChessVar,
+    'packed': lambda: ChessVar().to_packed(),
+}
+
+
+def measure_memory(create, games):
+    """
+    Creates games and measures the memory they hold once created.
+    :param create: function returning one game
+    :param games: integer number of games to create
+    :return: integer bytes per game
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        held = [create() for _ in range(games)]
+        total = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del held
+    return round(total / games)
+
+
+def run_benchmark(games=100000, forms=None):
+    """
+    Measures the memory of idle games in each form.
+    :param games: integer number of games of each form
+    :param forms: list of keys of FORMS, all of them by default
+    :return: dictionary report
+    """
+    results = []
+    for name in forms or FORMS:
+        bytes_per_game = measure_memory(FORMS[name], games)
+        results.append({
+            'form': name,
+            'games': games,
+            'bytes_per_game': bytes_per_game,
+            'total_mb': round(bytes_per_game * games / (1 << 20), 1),
+        })
+    return {'python': platform.python_version(), 'memory': results}
+
+
+def main(argv=None):
+    """
+    Runs the benchmark from the command line, prints a table and writes the JSON report.
+    :param argv: list of command line arguments
+    :return: integer exit status
+    """
+    parser = argparse.ArgumentParser(description='Memory benchmark for idle atomic chess games.')
+    parser.add_argument('--games', type=int, default=100000, help='number of games of each form')
+    parser.add_argument('--form', action='append', choices=sorted(FORMS), help='form to measure')
+    parser.add_argument('--output', default='memory_results.json', help='path of the JSON report')
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.games, args.form)
+    for result in report['memory']:
+        print(f"{result['form']:<17} {result['games']:>7} games {result['bytes_per_game']:>6} bytes/game "
+              f"{result['total_mb']:>8.1f} MB")
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
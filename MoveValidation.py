@@ -0,0 +1,258 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Bulk move validation for servers checking many moves from many games at once. A batch is a
+#              list of requests (game id or position, move_from, move_to), where a position is a FEN string,
+#              and every request is answered with ACCEPTED or the reason the move is refused: one of
+#              ChessVar.MOVE_RESULTS, UNKNOWN_GAME for a game id that is not found or BAD_POSITION for a
+#              FEN that cannot be read or played from.
+#
+#              Positions given as FEN are read once and kept, most recently used first, so positions many
+#              clients ask about are not read again. A position with many requests in a batch has its legal
+#              moves generated once, which ChessVar keeps until the position changes, and its requests are
+#              answered from them instead of generating the moving piece's moves for each. Run as a script
+#              to time batches of random requests:
+#
+#              python MoveValidation.py [--games 1000] [--requests 20000] [--positions 20] [--seed 0]
+#                                       [--output validation_results.json]
+
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter, OrderedDict
+
+from AttackTables import SQUARE_NAMES
+from ChessVar import ChessVar, MOVE_RESULTS
+
+# Results beyond ChessVar.MOVE_RESULTS, for requests naming no game or position that can be found
+UNKNOWN_GAME = 'UNKNOWN_GAME'
+BAD_POSITION = 'BAD_POSITION'
+# The result ChessVar.validate_move gives for a square it cannot read, also given to squares that are not
+# strings at all
+BAD_SQUARE = MOVE_RESULTS[2]
+# Requests for one position in a batch from which generating all its legal moves is cheaper than
+# generating the moving piece's moves once per request: a legal move list costs about as much as 16
+# single piece checks
+LEGAL_MOVES_THRESHOLD = 16
+
+
+class MoveValidator:
+    """
+    A class that represents a validator answering batches of move requests for a server's games and for
+    positions given as FEN. Moves are only checked, unless a batch is told to play the accepted moves of
+    games.
+    """
+    def __init__(self, find_game=None, cache_size=1024):
+        """
+        :param find_game: function taking a game id and returning its ChessVar object, or None if there is
+                          no such game. Without it, every request must give a position
+        :param cache_size: integer number of positions given as FEN kept
+        """
+        self._find_game = find_game if find_game is not None else lambda game_id: None
+        self._cache_size = cache_size
+        # ChessVar objects of positions given as FEN, by FEN, least recently used first
+        self._positions = OrderedDict()
+
+    def get_cache_size(self):
+        """Returns the integer number of positions given as FEN kept."""
+        return self._cache_size
+
+    def get_cached_positions(self):
+        """Returns the integer number of positions given as FEN currently kept."""
+        return len(self._positions)
+
+    def get_position(self, fen):
+        """
+        Finds the game of a position given as FEN, reading it unless it is kept already.
+        :param fen: string FEN of the position
+        :return: ChessVar object, or None if the FEN cannot be read or cannot be played from
+        """
+        game = self._positions.get(fen)
+        if game is not None:
+            self._positions.move_to_end(fen)
+            return game
+        try:
+            game = ChessVar.from_fen(fen)
+        except ValueError:
+            return None
+        if not game.is_position_valid():
+            return None
+        self._positions[fen] = game
+        if len(self._positions) > self._cache_size:
+            self._positions.popitem(last=False)
+        return game
+
+    def find(self, key):
+        """
+        Finds the game a request is about.
+        :param key: game id, or string FEN of a position
+        :return: tuple (ChessVar object or None, string result explaining why it was not found, and True
+                 if the key is a game id)
+        """
+        game = self._find_game(key)
+        if game is not None:
+            return game, None, True
+        if isinstance(key, str):
+            game = self.get_position(key)
+            return game, None if game is not None else BAD_POSITION, False
+        return None, UNKNOWN_GAME, True
+
+    def validate(self, key, move_from, move_to, play=False):
+        """
+        Checks one move.
+        :param key: game id, or string FEN of a position
+        :param move_from: string that represents where the piece to move is in algebraic notation
+        :param move_to: string that represents where the piece is to be moved in algebraic notation
+        :param play: if True, an accepted move of a game is made
+        :return: string result, ACCEPTED or the reason the move is refused
+        """
+        return self.validate_batch([(key, move_from, move_to)], play)[0]
+
+    def validate_batch(self, requests, play=False):
+        """
+        Checks a batch of moves, in order.
+        :param requests: list of tuples (game id or string FEN, string move_from, string move_to)
+        :param play: if True, the accepted moves of games are made as they are checked, so a later request
+                     for the same game is checked against the position after them. Positions given as FEN
+                     are never changed
+        :return: list of string results, ACCEPTED or the reason each move is refused
+        """
+        found = []
+        requests_per_game = Counter()
+        for key, _, _ in requests:
+            game, result, is_game = self.find(key)
+            found.append((game, result, is_game))
+            if game is not None:
+                requests_per_game[id(game)] += 1
+
+        results = []
+        for (_, move_from, move_to), (game, result, is_game) in zip(requests, found):
+            if game is None:
+                results.append(result)
+                continue
+            if not isinstance(move_from, str) or not isinstance(move_to, str):
+                results.append(BAD_SQUARE)
+                continue
+            if requests_per_game[id(game)] >= LEGAL_MOVES_THRESHOLD:
+                game.legal_moves()
+            result, move = game.validate_move(move_from, move_to)
+            if play and move is not None and is_game:
+                game.push(move)
+            results.append(result)
+        return results
+
+
+def make_requests(games, requests, positions=20, seed=0):
+    """
+    Builds a batch of random requests like a busy server's: most for games in play, a part for a few popular
+    positions given as FEN, a legal move in most and a random pair of squares in the rest.
+    :param games: dictionary of ChessVar objects by game id
+    :param requests: integer number of requests
+    :param positions: integer number of distinct positions given as FEN
+    :param seed: integer seed
+    :return: list of tuples (game id or FEN, move_from, move_to)
+    """
+    rng = random.Random(seed)
+    game_ids = list(games)
+    fens = [games[rng.choice(game_ids)].to_fen() for _ in range(positions)]
+    # Copies of the games requested, so that the games themselves keep no legal moves
+    copies = {}
+    batch = []
+    for _ in range(requests):
+        key = rng.choice(fens) if rng.random() < 0.2 else rng.choice(game_ids)
+        if key not in copies:
+            copies[key] = games[key].copy() if key in games else ChessVar.from_fen(key)
+        game = copies[key]
+        moves = game.legal_moves()
+        if moves and rng.random() < 0.8:
+            start, end = rng.choice(moves)
+            batch.append((key, game.translate_position(start), game.translate_position(end)))
+        else:
+            batch.append((key, rng.choice(SQUARE_NAMES), rng.choice(SQUARE_NAMES)))
+    return batch
+
+
+def play_games(count, seed=0, max_plies=40):
+    """
+    Plays games a random number of random moves into their middle game.
+    :param count: integer number of games
+    :param seed: integer seed
+    :param max_plies: integer number of moves played at most in each game
+    :return: dictionary of ChessVar objects by game id
+    """
+    rng = random.Random(seed)
+    games = {}
+    for game_id in range(1, count + 1):
+        game = ChessVar()
+        for _ in range(rng.randrange(max_plies)):
+            moves = game.legal_moves()
+            if not moves:
+                break
+            game.push(rng.choice(moves))
+        games[game_id] = game
+    return games
+
+
+def run_benchmark(games=1000, requests=20000, positions=20, seed=0):
+    """
+    Times a batch of random requests through a MoveValidator against checking each move with make_move on
+    a copy of its game, which is how a move was checked without being made before.
+    :param games: integer number of games in play
+    :param requests: integer number of requests in the batch
+    :param positions: integer number of distinct positions given as FEN
+    :param seed: integer seed
+    :return: dictionary report
+    """
+    in_play = play_games(games, seed)
+    batch = make_requests(in_play, requests, positions, seed)
+
+    validator = MoveValidator(in_play.get)
+    start_time = time.perf_counter()
+    results = validator.validate_batch(batch)
+    batch_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for key, move_from, move_to in batch:
+        game = in_play[key].copy() if key in in_play else ChessVar.from_fen(key)
+        game.make_move(move_from, move_to)
+    copy_seconds = time.perf_counter() - start_time
+
+    return {
+        'games': games,
+        'requests': requests,
+        'positions': positions,
+        'results': dict(Counter(results)),
+        'batch_us_per_move': round(batch_seconds / requests * 1e6, 2),
+        'copy_us_per_move': round(copy_seconds / requests * 1e6, 2),
+        'batch_moves_per_second': round(requests / batch_seconds),
+    }
+
+
+def main(argv=None):
+    """
+    Runs the benchmark from the command line, prints the timings and writes the JSON report.
+    :param argv: list of command line arguments
+    :return: integer exit status
+    """
+    parser = argparse.ArgumentParser(description='Times bulk validation of atomic chess moves.')
+    parser.add_argument('--games', type=int, default=1000, help='number of games in play')
+    parser.add_argument('--requests', type=int, default=20000, help='number of requests in the batch')
+    parser.add_argument('--positions', type=int, default=20, help='number of distinct positions given as FEN')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the games and requests')
+    parser.add_argument('--output', default='validation_results.json', help='path of the JSON report')
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.games, args.requests, args.positions, args.seed)
+    print(f"{report['requests']} requests over {report['games']} games and {report['positions']} positions: "
+          f"{report['batch_us_per_move']} us/move in a batch ({report['batch_moves_per_second']} moves/s), "
+          f"{report['copy_us_per_move']} us/move with make_move on a copy")
+    print(', '.join(f'{result} {count}' for result, count in sorted(report['results'].items())))
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,278 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: An opening book for atomic chess built from game archives. The book is one binary file of
+#              fixed-size entries (position hash, move, weight, count) sorted by position hash and move, read
+#              through mmap with a binary search, so a lookup touches a few pages and every process opening
+#              the same book shares one copy of it in the page cache. Books are built by replaying played
+#              games through ChessVar; a move's weight is two points for each game its side won and one for
+#              each draw. Run as a script to build a book or look up a position:
+#
+#              python OpeningBook.py build book.bin games.pgn.gz [tournament.jsonl ...] [--plies 20]
+#                                    [--min-count 2]
+#              python OpeningBook.py lookup book.bin [--fen FEN] [--moves e2e4,e7e5]
+
+import argparse
+import json
+import mmap
+import random
+import struct
+import sys
+import time
+from collections import namedtuple
+
+from ChessVar import ChessVar
+import GameRecord
+from TranspositionTable import decode_move, encode_move
+
+MAGIC = b'ATOMBOOK'
+VERSION = 1
+# Magic, version and number of entries
+HEADER = struct.Struct('<8sII')
+# Position hash, packed move, weight and number of games the move was played in
+ENTRY = struct.Struct('<QHHI')
+HASH = struct.Struct('<Q')
+MAX_WEIGHT = 0xFFFF
+MAX_COUNT = 0xFFFFFFFF
+
+# Points a result gives the side that played a move, by the color of that side
+RESULT_POINTS = {
+    '1-0': {'WHITE': 2, 'BLACK': 0},
+    '0-1': {'WHITE': 0, 'BLACK': 2},
+    '1/2-1/2': {'WHITE': 1, 'BLACK': 1},
+}
+
+# A move of the book for a position: the move as a string such as 'e2e4', its weight and the number of
+# games it was played in
+BookMove = namedtuple('BookMove', ['move', 'weight', 'count'])
+# The outcome of building a book: games read, games stopped early at an illegal move, distinct positions
+# and entries written
+BuildResult = namedtuple('BuildResult', ['games', 'illegal', 'positions', 'entries'])
+
+
+def read_sources(sources):
+    """
+    Reads the games of archives one at a time. Files ending in '.jsonl' are read as the results files of
+    Tournament.py and everything else as PGN archives, plain or gzip compressed.
+    :param sources: iterable of string paths
+    :return: generator of GameRecord
+    """
+    for source in sources:
+        if str(source).endswith('.jsonl'):
+            with open(source) as results:
+                for line in results:
+                    if line.strip():
+                        game = json.loads(line)
+                        yield GameRecord.GameRecord({}, game.get('moves', []), game.get('result', '*'))
+        else:
+            yield from GameRecord.read_games(source)
+
+
+def collect_moves(records, max_plies=20):
+    """
+    Replays games through ChessVar and totals the points and games of each move in each position. A game
+    with an illegal move counts up to that move.
+    :param records: iterable of GameRecord
+    :param max_plies: integer number of moves of each game taken into the book
+    :return: tuple (dictionary of [points, count] by (position hash, packed move), integer games read,
+             integer games with an illegal move)
+    """
+    totals = {}
+    games = 0
+    illegal = 0
+    for record in records:
+        games += 1
+        fen = record.headers.get('FEN')
+        try:
+            game = ChessVar.from_fen(fen) if fen else ChessVar()
+        except ValueError:
+            illegal += 1
+            continue
+        points = RESULT_POINTS.get(record.result, {'WHITE': 0, 'BLACK': 0})
+        for move in record.moves[:max_plies]:
+            position_hash = game.position_hash()
+            color = game.get_player_turn()
+            if len(move) != 4 or not game.make_move(move[:2], move[2:]):
+                illegal += 1
+                break
+            start, end = game.translate_square(move[:2]), game.translate_square(move[2:])
+            total = totals.setdefault((position_hash, encode_move((start, end))), [0, 0])
+            total[0] += points[color]
+            total[1] += 1
+    return totals, games, illegal
+
+
+def write_book(path, totals, min_count=1):
+    """
+    Writes a book file. Weights are scaled down together when the largest would not fit in 16 bits.
+    :param path: string path of the book
+    :param totals: dictionary of [points, count] by (position hash, packed move), as from collect_moves
+    :param min_count: integer number of games a move must have been played in to be kept
+    :return: tuple (integer distinct positions, integer entries written)
+    """
+    kept = sorted((key, total) for key, total in totals.items() if total[1] >= min_count)
+    largest = max((points for _, (points, _) in kept), default=0)
+    scale = MAX_WEIGHT / largest if largest > MAX_WEIGHT else 1
+    with open(path, 'wb') as book:
+        book.write(HEADER.pack(MAGIC, VERSION, len(kept)))
+        for (position_hash, move), (points, count) in kept:
+            weight = int(points * scale)
+            if points and not weight:
+                weight = 1
+            book.write(ENTRY.pack(position_hash, move, weight, min(count, MAX_COUNT)))
+    return len({position_hash for (position_hash, _), _ in kept}), len(kept)
+
+
+def build_book(sources, path, max_plies=20, min_count=1):
+    """
+    Builds a book from game archives.
+    :param sources: iterable of string paths of PGN archives or Tournament.py results files
+    :param path: string path of the book to write
+    :param max_plies: integer number of moves of each game taken into the book
+    :param min_count: integer number of games a move must have been played in to be kept
+    :return: BuildResult
+    """
+    totals, games, illegal = collect_moves(read_sources(sources), max_plies)
+    positions, entries = write_book(path, totals, min_count)
+    return BuildResult(games, illegal, positions, entries)
+
+
+class OpeningBook:
+    """
+    A class that represents a book file opened for lookups. The file is mapped read only and never
+    copied into the process, so opening a large book is immediate and costs no memory of its own.
+    """
+    def __init__(self, path):
+        self._path = path
+        with open(path, 'rb') as book:
+            self._data = mmap.mmap(book.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._data) < HEADER.size:
+            self._data.close()
+            raise ValueError(f'{path} is not an opening book')
+        magic, version, entries = HEADER.unpack_from(self._data)
+        if magic != MAGIC or version != VERSION or len(self._data) != HEADER.size + entries * ENTRY.size:
+            self._data.close()
+            raise ValueError(f'{path} is not an opening book of version {VERSION}')
+        self._entry_count = entries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Unmaps the book file.
+        :return: Nothing
+        """
+        self._data.close()
+
+    def get_path(self):
+        """Returns the string path of the book file."""
+        return self._path
+
+    def get_entry_count(self):
+        """Returns the integer number of entries in the book."""
+        return self._entry_count
+
+    def find_entries(self, position_hash):
+        """
+        Finds the entries of a position by binary search.
+        :param position_hash: integer position hash, as from ChessVar.position_hash
+        :return: list of tuples (packed move, weight, count)
+        """
+        data = self._data
+        low, high = 0, self._entry_count
+        while low < high:
+            middle = (low + high) // 2
+            if HASH.unpack_from(data, HEADER.size + middle * ENTRY.size)[0] < position_hash:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for index in range(low, self._entry_count):
+            entry_hash, move, weight, count = ENTRY.unpack_from(data, HEADER.size + index * ENTRY.size)
+            if entry_hash != position_hash:
+                break
+            entries.append((move, weight, count))
+        return entries
+
+    def get_moves(self, game):
+        """
+        Returns the book moves for the player whose turn it is. Entries that are not legal in the game,
+        left by another position with the same hash, are dropped.
+        :param game: ChessVar object
+        :return: list of BookMove, heaviest first
+        """
+        if game.get_game_state() != 'UNFINISHED':
+            return []
+        legal_moves = set(game.legal_moves())
+        moves = []
+        for code, weight, count in self.find_entries(game.position_hash()):
+            move = decode_move(code)
+            if move in legal_moves:
+                moves.append(BookMove(game.translate_position(move[0]) + game.translate_position(move[1]),
+                                      weight, count))
+        moves.sort(key=lambda book_move: (-book_move.weight, book_move.move))
+        return moves
+
+    def choose_move(self, game, rng=random):
+        """
+        Picks a book move for the player whose turn it is, at random in proportion to the moves' weights.
+        Moves of weight 0, which never scored, are not played.
+        :param game: ChessVar object
+        :param rng: random.Random object, or the random module
+        :return: string move such as 'e2e4', or None if the book has no move for the position
+        """
+        moves = [book_move for book_move in self.get_moves(game) if book_move.weight]
+        if not moves:
+            return None
+        return rng.choices([book_move.move for book_move in moves],
+                           weights=[book_move.weight for book_move in moves])[0]
+
+
+def main(argv=None):
+    """
+    Builds a book or looks up a position from the command line.
+    :param argv: list of command line arguments
+    :return: integer exit status
+    """
+    parser = argparse.ArgumentParser(description='Builds and reads atomic chess opening books.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book from game archives')
+    build.add_argument('book', help='path of the book to write')
+    build.add_argument('archives', nargs='+', help='PGN archives or Tournament.py results files')
+    build.add_argument('--plies', type=int, default=20, help='moves of each game taken into the book')
+    build.add_argument('--min-count', type=int, default=1, help='games a move must be played in to be kept')
+    lookup = commands.add_parser('lookup', help='show the book moves of a position')
+    lookup.add_argument('book', help='path of the book')
+    lookup.add_argument('--fen', help='position to look up, the starting position by default')
+    lookup.add_argument('--moves', default='', help='comma separated moves played from the position')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        start_time = time.perf_counter()
+        result = build_book(args.archives, args.book, args.plies, args.min_count)
+        print(f'{result.games} games ({result.illegal} with an illegal move), {result.positions} positions, '
+              f'{result.entries} entries in {time.perf_counter() - start_time:.2f} s')
+        return 0
+
+    game = ChessVar.from_fen(args.fen) if args.fen else ChessVar()
+    for move in filter(None, args.moves.split(',')):
+        if not game.make_move(move[:2], move[2:]):
+            print(f'illegal move {move}')
+            return 1
+    with OpeningBook(args.book) as book:
+        moves = book.get_moves(game)
+        total = sum(book_move.weight for book_move in moves)
+        for book_move in moves:
+            share = book_move.weight / total if total else 0
+            print(f'{book_move.move} weight {book_move.weight:>5} ({share:6.1%}) games {book_move.count}')
+    if not moves:
+        print('no book moves')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
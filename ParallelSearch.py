@@ -0,0 +1,228 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Multi-core search for atomic chess. The root moves of a position are shared out to a pool of
+#              worker processes, each with its own ChessEngine, and their scores are combined at the root.
+#              Positions go to the workers packed into a few bytes rather than as pickled piece objects. Run as
+#              a script to measure how the search scales with the number of workers:
+#
+#              python ParallelSearch.py [--workers 1,2,4,8] [--depth 4] [--output scaling.json]
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from ChessEngine import INFINITY, WIN_THRESHOLD, ChessEngine, SearchResult, SearchTimeout, move_to_string
+from ChessVar import ChessVar
+from TranspositionTable import decode_move, encode_move
+
+# The engine of a worker process, created once by init_worker and kept between tasks
+_engine = None
+# The last position a worker decoded, as (packed position, ChessVar object)
+_position = None
+
+
+def init_worker(tt_size_mb):
+    """
+    Creates the engine of a worker process.
+    :param tt_size_mb: integer transposition table size of the worker's engine
+    :return: Nothing
+    """
+    global _engine
+    _engine = ChessEngine(tt_size_mb)
+
+
+def search_root_move(position, move_code, depth, alpha, deadline, max_nodes):
+    """
+    Searches one root move in a worker process.
+    :param position: bytes of the position packed by ChessVar.to_packed
+    :param move_code: integer move packed by encode_move
+    :param depth: integer depth counting the move itself
+    :param alpha: integer score the move has to beat
+    :param deadline: float time.time() to stop at, or None for no time limit
+    :param max_nodes: integer number of positions to visit, or None for no limit
+    :return: tuple (score or None if the budget ran out, integer nodes, list of move strings after the move)
+    """
+    global _position
+    if _position is None or _position[0] != position:
+        _position = (position, ChessVar.from_packed(position))
+    game = _position[1]
+    move = decode_move(move_code)
+
+    max_time = None
+    if deadline is not None:
+        max_time = deadline - time.time()
+        if max_time <= 0:
+            return None, 0, []
+    _engine.start_search(max_time, max_nodes)
+    try:
+        score = _engine.search_move(game, move, depth, alpha)
+    except SearchTimeout:
+        return None, _engine.get_nodes(), []
+
+    game.push(move)
+    pv = _engine.principal_variation(game, depth - 1)
+    game.pop()
+    return score, _engine.get_nodes(), pv
+
+
+class ParallelSearch:
+    """
+    A class that represents a search shared out to a pool of worker processes. Each depth of iterative
+    deepening searches the best move of the previous depth first, then the other root moves at once
+    against its score, so a worker can stop early on a move that cannot be better. Each worker keeps its
+    own transposition table between tasks.
+    """
+    def __init__(self, workers=None, tt_size_mb=16):
+        self._workers = workers or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(max_workers=self._workers, initializer=init_worker,
+                                         initargs=(tt_size_mb,))
+        self._orderer = ChessEngine(tt_size_mb=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_workers(self):
+        """Returns the number of worker processes."""
+        return self._workers
+
+    def close(self):
+        """
+        Shuts down the worker processes.
+        :return: Nothing
+        """
+        self._pool.shutdown()
+
+    def search(self, game, max_time=0.1, max_depth=64, max_nodes=None):
+        """
+        Finds the best move for the player whose turn it is, like ChessEngine.search.
+        :param game: ChessVar object
+        :param max_time: float seconds to search for, or None for no time limit
+        :param max_depth: integer deepest search to start
+        :param max_nodes: integer number of positions each root move may visit, or None for no limit
+        :return: SearchResult
+        """
+        start_time = time.perf_counter()
+        deadline = time.time() + max_time if max_time is not None else None
+        legal_moves = game.legal_moves()
+        if not legal_moves:
+            return SearchResult(None, 0, 0, 0, 0.0, [])
+
+        position = game.to_packed()
+        moves = self._orderer.order_moves(game, legal_moves, None)
+        best = SearchResult(move_to_string(game, moves[0]), 0, 0, 0, 0.0, [move_to_string(game, moves[0])])
+        nodes = 0
+
+        for depth in range(1, max_depth + 1):
+            # The first move sets the score the others have to beat
+            score, task_nodes, pv = self._pool.submit(search_root_move, position, encode_move(moves[0]), depth,
+                                                      -INFINITY, deadline, max_nodes).result()
+            nodes += task_nodes
+            if score is None:
+                break
+            scores = {moves[0]: score}
+            best_move, best_score, best_pv = moves[0], score, pv
+
+            pending = {self._pool.submit(search_root_move, position, encode_move(move), depth, best_score,
+                                         deadline, max_nodes): move for move in moves[1:]}
+            complete = True
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    move = pending.pop(future)
+                    score, task_nodes, pv = future.result()
+                    nodes += task_nodes
+                    if score is None:
+                        complete = False
+                        continue
+                    scores[move] = score
+                    if score > best_score:
+                        best_move, best_score, best_pv = move, score, pv
+
+            # A depth cut short still improves on the last one if a move beat the first move's score
+            if complete or best_move != moves[0]:
+                best = SearchResult(move_to_string(game, best_move), best_score, depth, nodes,
+                                    time.perf_counter() - start_time, [move_to_string(game, best_move)] + best_pv)
+            if not complete or abs(best_score) >= WIN_THRESHOLD:
+                break
+            if max_time is not None and (time.perf_counter() - start_time) * 2 > max_time:
+                break
+            moves.sort(key=lambda root_move: scores.get(root_move, -INFINITY), reverse=True)
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+
+        return best._replace(nodes=nodes, seconds=time.perf_counter() - start_time)
+
+
+def measure_scaling(worker_counts, depth, positions=None, tt_size_mb=16):
+    """
+    Searches each test position to a fixed depth with each number of workers and compares the times
+    with those of the first number of workers, normally 1.
+    :param worker_counts: list of integer numbers of workers
+    :param depth: integer search depth
+    :param positions: list of test positions like PerftBenchmark.POSITIONS, all of them by default
+    :param tt_size_mb: integer transposition table size of each worker's engine
+    :return: list of dictionaries, one per number of workers
+    """
+    from PerftBenchmark import POSITIONS, setup_position
+
+    results = []
+    baseline = None
+    baseline_workers = None
+    for workers in worker_counts:
+        seconds = 0.0
+        nodes = 0
+        with ParallelSearch(workers, tt_size_mb) as search:
+            # Starts the worker processes so that start-up is not timed
+            search.search(ChessVar(), max_time=None, max_depth=1)
+            for position in positions or POSITIONS:
+                result = search.search(setup_position(ChessVar, position['moves']), max_time=None,
+                                       max_depth=depth)
+                seconds += result.seconds
+                nodes += result.nodes
+        if baseline is None:
+            baseline, baseline_workers = seconds, workers
+        speedup = baseline / seconds
+        results.append({
+            'workers': workers,
+            'seconds': round(seconds, 6),
+            'nodes': nodes,
+            'nodes_per_second': round(nodes / seconds),
+            'speedup': round(speedup, 3),
+            'efficiency': round(speedup * baseline_workers / workers, 3),
+        })
+    return results
+
+
+def main(argv=None):
+    """
+    Measures scaling from the command line, prints a table and writes the JSON report.
+    :param argv: list of command line arguments
+    :return: integer exit status
+    """
+    parser = argparse.ArgumentParser(description='Scaling benchmark for the parallel atomic chess search.')
+    parser.add_argument('--workers', default='1,2,4,8', help='comma separated numbers of workers')
+    parser.add_argument('--depth', type=int, default=4, help='search depth')
+    parser.add_argument('--output', default='scaling_results.json', help='path of the JSON report')
+    args = parser.parse_args(argv)
+
+    worker_counts = [int(workers) for workers in args.workers.split(',')]
+    results = measure_scaling(worker_counts, args.depth)
+    for result in results:
+        print(f"{result['workers']:>3} workers {result['seconds']:>9.3f} s {result['nodes_per_second']:>9} nodes/s "
+              f"speedup {result['speedup']:>6.2f} efficiency {result['efficiency']:>5.2f}")
+    with open(args.output, 'w') as output:
+        json.dump({'cpu_count': os.cpu_count(), 'python': platform.python_version(), 'depth': args.depth,
+                   'scaling': results}, output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Perft benchmark for the atomic chess move generators. Counts the positions reached from a
+#              fixed set of test positions, checks the counts against known values and reports
+#              nodes per second as JSON so throughput can be tracked from commit to commit.
+#
+#              python PerftBenchmark.py [--output results.json] [--quick]
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from BitboardChessVar import BitboardChessVar
+from ChessVar import ChessVar
+
+# Each position is reached from the starting position by its moves, given as start and end squares.
+# 'nodes' is the known perft count at 'depth'.
+POSITIONS = [
+    {
+        'name': 'start',
+        'moves': [],
+        'depth': 4,
+        'nodes': 197779,
+    },
+    {
+        'name': 'italian-tension',
+        'moves': ['e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1c4', 'g8f6', 'd2d4', 'd7d5', 'b1c3', 'f8b4', 'd1e2', 'c8g4'],
+        'depth': 3,
+        'nodes': 67655,
+    },
+    {
+        'name': 'queens-out',
+        'moves': ['e2e3', 'e7e6', 'd1h5', 'd8h4', 'f1c4', 'f8c5', 'g1f3', 'g8f6'],
+        'depth': 3,
+        'nodes': 67450,
+    },
+    {
+        'name': 'blast-chain',
+        'moves': ['d2d4', 'd7d5', 'c1f4', 'c8f5', 'b1c3', 'b8c6', 'e2e3', 'e7e6', 'g1f3', 'g8f6', 'f1b5', 'f8b4',
+                  'd1d2', 'd8d7'],
+        'depth': 3,
+        'nodes': 76906,
+    },
+    {
+        'name': 'sparse-endgame',
+        'moves': ['e2e4', 'g8f6', 'd2d4', 'h7h5', 'd1h5', 'e7e5', 'd4e5', 'h8h2', 'f1a6', 'g7g6', 'a6b7', 'f7f5',
+                  'c2c3', 'f5e4', 'f2f4', 'g6g5', 'f4g5'],
+        'depth': 4,
+        'nodes': 195917,
+    },
+]
+
+BACKENDS = {
+    'ChessVar': ChessVar,
+    'BitboardChessVar': BitboardChessVar,
+}
+
+
+def setup_position(backend, moves):
+    """
+    Creates a game of the given backend and plays the moves that reach a test position.
+    :param backend: ChessVar or BitboardChessVar class
+    :param moves: list of move strings such as 'e2e4'
+    :return: game object
+    """
+    game = backend()
+    for move in moves:
+        if not game.make_move(move[:2], move[2:]):
+            raise ValueError(f'Illegal move {move} while setting up a benchmark position')
+    return game
+
+
+def time_perft(game, depth):
+    """
+    Runs perft on a game and times it.
+    :param game: ChessVar or BitboardChessVar object
+    :param depth: integer perft depth
+    :return: tuple (integer node count, float seconds)
+    """
+    start = time.perf_counter()
+    nodes = game.perft(depth)
+    return nodes, time.perf_counter() - start
+
+
+def time_piece_move_generation(repeat=2000):
+    """
+    Times get_valid_moves for every piece class over the test positions.
+    :param repeat: integer number of times each piece's moves are generated
+    :return: dictionary of piece type to calls per second
+    """
+    calls = {}
+    seconds = {}
+    for position in POSITIONS:
+        game = setup_position(ChessVar, position['moves'])
+        board = game.get_board()
+        for row in board:
+            for piece in row:
+                if not piece:
+                    continue
+                piece_type = piece.get_piece_type()
+                get_valid_moves = piece.get_valid_moves
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    get_valid_moves(board)
+                seconds[piece_type] = seconds.get(piece_type, 0.0) + time.perf_counter() - start
+                calls[piece_type] = calls.get(piece_type, 0) + repeat
+    return {piece_type: round(calls[piece_type] / seconds[piece_type]) for piece_type in sorted(calls)}
+
+
+def get_commit():
+    """
+    Returns the git commit the benchmark runs on, if it is run from a git checkout.
+    :return: string commit hash or None
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(depth_offset=0, backends=None):
+    """
+    Runs perft on every test position with every backend and checks the node counts.
+    :param depth_offset: integer added to every position's depth; a negative value gives a quick run
+    :param backends: list of backend names, all of BACKENDS by default
+    :return: dictionary of results ready to be written as JSON
+    """
+    results = []
+    mismatches = 0
+    for position in POSITIONS:
+        depth = position['depth'] + depth_offset
+        for name in backends or BACKENDS:
+            game = setup_position(BACKENDS[name], position['moves'])
+            nodes, seconds = time_perft(game, depth)
+            expected = position['nodes'] if depth_offset == 0 else None
+            if expected is not None and nodes != expected:
+                mismatches += 1
+            results.append({
+                'position': position['name'],
+                'backend': name,
+                'depth': depth,
+                'nodes': nodes,
+                'expected_nodes': expected,
+                'seconds': round(seconds, 6),
+                'nodes_per_second': round(nodes / seconds) if seconds else None,
+            })
+
+    return {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'mismatches': mismatches,
+        'perft': results,
+        'piece_move_generation_per_second': time_piece_move_generation(),
+    }
+
+
+def main(argv=None):
+    """
+    Runs the benchmark from the command line, prints a table and writes the JSON report.
+    :param argv: list of command line arguments
+    :return: integer exit status, 1 if any node count was wrong
+    """
+    parser = argparse.ArgumentParser(description='Perft benchmark for the atomic chess move generators.')
+    parser.add_argument('--output', default='perft_results.json', help='path of the JSON report')
+    parser.add_argument('--quick', action='store_true', help='search one move less deep (no count checks)')
+    parser.add_argument('--backend', action='append', choices=sorted(BACKENDS), help='backend to run')
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(depth_offset=-1 if args.quick else 0, backends=args.backend)
+    for result in report['perft']:
+        status = '' if result['expected_nodes'] in (None, result['nodes']) else '  MISMATCH'
+        print(f"{result['position']:<16} {result['backend']:<17} depth {result['depth']} "
+              f"{result['nodes']:>9} nodes {result['nodes_per_second']:>9} nodes/s{status}")
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    return 1 if report['mismatches'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Text and binary forms of an atomic chess position, shared by ChessVar and BitboardChessVar. Both
+#              work on a position given as a list of (square index, piece code) pairs, the player to move and
+#              the game state, so neither needs the other's piece representation.
+#
+#              FEN dialect: '<placement> <w|b> <pawns> <state>', for example the starting position
+#                  rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - *
+#              The placement and side to move are standard FEN. <pawns> lists, as squares such as 'e2d7',
+#              the pawns whose first-move status differs from their rank: a pawn counts as not yet moved
+#              exactly when it stands on its starting rank unless it is listed, so the field is '-' in any
+#              game played from the starting position. <state> is '*' while the game is unfinished, '1-0'
+#              when white has won and '0-1' when black has won. Standard six-field FEN is accepted too.
+#
+#              Packed form, PACKED_SIZE bytes:
+#                  bytes 0-7    occupied squares, a little-endian bitboard with bit row * 8 + col
+#                  bytes 8-23   one 4-bit piece code per occupied square in square order, low nibble first
+#                  byte 24      bit 0 set when black is to move, bits 1-2 the game state
+
+from AttackTables import SQUARE_NAMES
+
+PACKED_SIZE = 25
+MAX_PIECES = 32
+
+COLORS = ('WHITE', 'BLACK')
+PIECE_TYPES = ('KING', 'QUEEN', 'ROOK', 'BISHOP', 'KNIGHT', 'PAWN')
+GAME_STATES = ('UNFINISHED', 'WHITE_WON', 'BLACK_WON')
+FEN_RESULTS = ('*', '1-0', '0-1')
+PIECE_LETTERS = 'KQRBNP'
+
+# Piece code 1 + type + 6 * color, with two more codes for pawns that have not made their first move
+UNMOVED_PAWN_CODES = (13, 14)
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - *'
+
+
+def piece_code(color, piece_type, unmoved=False):
+    """
+    Returns the code of a piece.
+    :param color: integer color, 0 for white and 1 for black
+    :param piece_type: integer index into PIECE_TYPES
+    :param unmoved: True for a pawn that has not made its first move
+    :return: integer code from 1 to 14
+    """
+    if unmoved:
+        return UNMOVED_PAWN_CODES[color]
+    return 1 + piece_type + 6 * color
+
+
+# (color, piece type, unmoved) of every piece code, and the code of every (color name, piece type name)
+CODE_PIECES = [None] + [(color, piece_type, False) for color in (0, 1) for piece_type in range(6)] + \
+              [(0, 5, True), (1, 5, True)]
+PIECE_CODES = {(COLORS[color], PIECE_TYPES[piece_type]): piece_code(color, piece_type)
+               for color in (0, 1) for piece_type in range(6)}
+
+
+def decode_piece_code(code):
+    """
+    Splits a piece code.
+    :param code: integer code from 1 to 14
+    :return: tuple (integer color, integer piece type, boolean unmoved)
+    """
+    return CODE_PIECES[code]
+
+
+def on_starting_rank(square, color):
+    """
+    Tells if a pawn of a color stands on the rank its pawns start on.
+    :param square: integer square index
+    :param color: integer color, 0 for white and 1 for black
+    :return: boolean
+    """
+    return square // 8 == (6 if color == 0 else 1)
+
+
+def pack(pieces, player_turn, game_state):
+    """
+    Converts a position into its packed form.
+    :param pieces: list of (integer square index, integer piece code) pairs
+    :param player_turn: integer color to move, 0 for white and 1 for black
+    :param game_state: integer index into GAME_STATES
+    :return: bytes of length PACKED_SIZE
+    """
+    if len(pieces) > MAX_PIECES:
+        raise ValueError(f'A packed position holds at most {MAX_PIECES} pieces')
+    occupied = 0
+    codes = 0
+    for index, (square, code) in enumerate(sorted(pieces)):
+        occupied |= 1 << square
+        codes |= code << (4 * index)
+    return (occupied.to_bytes(8, 'little') + codes.to_bytes(16, 'little') +
+            bytes((player_turn | game_state << 1,)))
+
+
+def unpack(data):
+    """
+    Reads a position from its packed form.
+    :param data: bytes of length PACKED_SIZE
+    :return: tuple (list of (integer square index, integer piece code) pairs, integer color to move,
+             integer index into GAME_STATES)
+    """
+    if len(data) != PACKED_SIZE:
+        raise ValueError(f'A packed position is {PACKED_SIZE} bytes long, not {len(data)}')
+    if data[24] >> 1 >= len(GAME_STATES):
+        raise ValueError(f'A packed position has no game state {data[24] >> 1}')
+    occupied = int.from_bytes(data[:8], 'little')
+    codes = int.from_bytes(data[8:24], 'little')
+    pieces = []
+    while occupied:
+        lowest = occupied & -occupied
+        if not 1 <= codes & 15 < len(CODE_PIECES):
+            raise ValueError(f'A packed position has no piece code {codes & 15}')
+        pieces.append((lowest.bit_length() - 1, codes & 15))
+        codes >>= 4
+        occupied ^= lowest
+    return pieces, data[24] & 1, data[24] >> 1
+
+
+def to_fen(pieces, player_turn, game_state):
+    """
+    Writes a position in the FEN dialect described at the top of this module.
+    :param pieces: list of (integer square index, integer piece code) pairs
+    :param player_turn: integer color to move, 0 for white and 1 for black
+    :param game_state: integer index into GAME_STATES
+    :return: string FEN
+    """
+    board = [''] * 64
+    exceptions = []
+    for square, code in sorted(pieces):
+        color, piece_type, unmoved = decode_piece_code(code)
+        letter = PIECE_LETTERS[piece_type]
+        board[square] = letter if color == 0 else letter.lower()
+        if letter == 'P' and unmoved != on_starting_rank(square, color):
+            exceptions.append(SQUARE_NAMES[square])
+
+    ranks = []
+    for row in range(8):
+        rank = ''
+        empty = 0
+        for letter in board[row * 8:row * 8 + 8]:
+            if not letter:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += letter
+        ranks.append(rank + (str(empty) if empty else ''))
+    return f"{'/'.join(ranks)} {'wb'[player_turn]} {''.join(exceptions) or '-'} {FEN_RESULTS[game_state]}"
+
+
+def from_fen(fen):
+    """
+    Reads a position written in the FEN dialect described at the top of this module, or in standard FEN.
+    :param fen: string FEN
+    :return: tuple (list of (integer square index, integer piece code) pairs, integer color to move,
+             integer index into GAME_STATES)
+    """
+    fields = fen.split()
+    if len(fields) == 6:
+        fields = fields[:2]
+    if not 1 <= len(fields) <= 4:
+        raise ValueError(f'Not a FEN position: {fen!r}')
+    placement, side, exceptions, result = fields + ['w', '-', '*'][len(fields) - 1:]
+    if side not in ('w', 'b') or result not in FEN_RESULTS:
+        raise ValueError(f'Not a FEN position: {fen!r}')
+
+    ranks = placement.split('/')
+    if len(ranks) != 8:
+        raise ValueError(f'A FEN placement has 8 ranks: {fen!r}')
+    exception_squares = {exceptions[index:index + 2] for index in range(0, len(exceptions), 2)} - {'-'}
+    pieces = []
+    for row, rank in enumerate(ranks):
+        col = 0
+        for letter in rank:
+            if letter.isdigit():
+                col += int(letter)
+                continue
+            if letter.upper() not in PIECE_LETTERS or col > 7:
+                raise ValueError(f'Bad FEN rank {rank!r}')
+            square = row * 8 + col
+            color = 0 if letter.isupper() else 1
+            piece_type = PIECE_LETTERS.index(letter.upper())
+            unmoved = False
+            if letter.upper() == 'P':
+                unmoved = on_starting_rank(square, color) != (SQUARE_NAMES[square] in exception_squares)
+            pieces.append((square, piece_code(color, piece_type, unmoved)))
+            col += 1
+        if col != 8:
+            raise ValueError(f'Bad FEN rank {rank!r}')
+    return pieces, 'wb'.index(side), FEN_RESULTS.index(result)
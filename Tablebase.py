@@ -0,0 +1,768 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Endgame tablebases for atomic chess. For a set of pieces without pawns, such as KRvKN, every
+#              position is solved by retrograde analysis: positions where a capture wins at once, or where
+#              every move loses, are found first, and results then spread backwards one move at a time
+#              through the moves that lead to them, giving each position its result with the distance to the
+#              end of the game in plies. Moves follow the ChessVar rules: kings never capture, a capture may
+#              not blow up both kings, and there is no check. A capture always takes the table to a smaller
+#              set of pieces, whose table is generated first and looked up.
+#
+#              Positions are numbered by the side to move and the square of each piece, with the board
+#              mirrored so the white king stands on a1-d4, and the results are written one byte each in
+#              zlib compressed blocks. Tables are read through mmap one block at a time, and the blocks in use
+#              are kept decompressed, so a probe takes microseconds. Generation is shared out to a pool of
+#              worker processes. Run as a script to generate tables or probe a position:
+#
+#              python Tablebase.py generate --pieces 3 [--directory tablebases] [--workers 4]
+#                                  [--output tablebase_results.json]
+#              python Tablebase.py probe --fen '8/8/8/8/8/2k5/8/KQ6 w - *' [--directory tablebases]
+
+import argparse
+import itertools
+import json
+import mmap
+import os
+import platform
+import random
+import struct
+import sys
+import time
+import zlib
+from array import array
+from collections import OrderedDict, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from AttackTables import BLAST_MASKS, BISHOP_DIRECTIONS, KING_SQUARES, KNIGHT_SQUARES, RAY_SQUARES, \
+    ROOK_DIRECTIONS
+
+MAGIC = b'ATOMICTB'
+VERSION = 1
+# Magic, version, number of positions, positions per block, number of blocks and material key
+HEADER = struct.Struct('<8sIIII16s')
+BLOCK_SIZE = 8192
+# Decompressed blocks kept per table
+CACHE_BLOCKS = 64
+EXTENSION = '.atb'
+
+# Result codes, one byte per position: 0 is a draw, 1 to 127 a win in that many plies for the side to
+# move, and LOSS + n a loss in n plies
+DRAW = 0
+LOSS = 128
+MAX_DISTANCE = 127
+
+WHITE = 0
+BLACK = 1
+COLORS = ('WHITE', 'BLACK')
+# Piece letters in the order they are written in a material key
+PIECE_ORDER = 'KQRBN'
+PIECE_LETTERS = {'KING': 'K', 'QUEEN': 'Q', 'ROOK': 'R', 'BISHOP': 'B', 'KNIGHT': 'N'}
+
+# The squares of the quadrant the white king is mirrored into, a1-d4, by square index row * 8 + col
+QUADRANT = [square for square in range(64) if square >= 32 and square % 8 < 4]
+QUADRANT_INDEX = {square: index for index, square in enumerate(QUADRANT)}
+
+# Square index targets of each piece letter: a tuple of rays per square, each ray nearest first. Kings and
+# knights have one ray per target, so the first occupied square ends it at once
+KING_RAYS = [tuple((row * 8 + col,) for row, col in targets) for targets in KING_SQUARES]
+KNIGHT_RAYS = [tuple((row * 8 + col,) for row, col in targets) for targets in KNIGHT_SQUARES]
+
+
+def build_slider_rays(directions):
+    """
+    Creates the rays of a slider from every square as tuples of square indexes.
+    :param directions: tuple of ray directions, such as ROOK_DIRECTIONS
+    :return: list of 64 tuples of rays
+    """
+    return [tuple(tuple(row * 8 + col for row, col in RAY_SQUARES[direction][square])
+                  for direction in directions if RAY_SQUARES[direction][square]) for square in range(64)]
+
+
+PIECE_RAYS = {
+    'K': KING_RAYS,
+    'Q': build_slider_rays(ROOK_DIRECTIONS + BISHOP_DIRECTIONS),
+    'R': build_slider_rays(ROOK_DIRECTIONS),
+    'B': build_slider_rays(BISHOP_DIRECTIONS),
+    'N': KNIGHT_RAYS,
+}
+
+# A probe result: 'WIN', 'LOSS' or 'DRAW' for the side to move and the plies until the game ends, 0 for
+# a draw
+TablebaseResult = namedtuple('TablebaseResult', ['result', 'plies'])
+# What generating a table took: material key, positions, wins, losses and draws for the side to move,
+# the longest win in plies, seconds, bytes of the file and microseconds per probe with the block to
+# decompress and with it already decompressed
+TableReport = namedtuple('TableReport', ['material', 'positions', 'wins', 'losses', 'draws', 'longest',
+                                         'seconds', 'file_bytes', 'cold_probe_us', 'warm_probe_us'])
+
+
+def decode_value(code):
+    """
+    Turns a result code into a result and distance.
+    :param code: integer result code
+    :return: TablebaseResult
+    """
+    if code == DRAW:
+        return TablebaseResult('DRAW', 0)
+    if code < LOSS:
+        return TablebaseResult('WIN', code)
+    return TablebaseResult('LOSS', code - LOSS)
+
+
+def material_sides(key):
+    """
+    Splits a material key such as 'KRvKN' into the pieces of each side.
+    :param key: string material key
+    :return: tuple (string of white piece letters, string of black piece letters)
+    """
+    white, separator, black = key.partition('v')
+    if not separator or white[:1] != 'K' or black[:1] != 'K' or 'K' in white[1:] + black[1:] or \
+            any(letter not in PIECE_ORDER for letter in white + black):
+        raise ValueError(f'{key!r} is not a material key of pieces without pawns, such as KRvKN')
+    return white, black
+
+
+def side_strength(letters):
+    """
+    Returns a sort key that puts the side with more, then stronger, pieces first.
+    :param letters: string of piece letters of one side
+    :return: tuple
+    """
+    return len(letters), [-PIECE_ORDER.index(letter) for letter in letters]
+
+
+def material_key(white, black):
+    """
+    Creates the material key of two sides' pieces, with each side's pieces in the usual order.
+    :param white: iterable of white piece letters
+    :param black: iterable of black piece letters
+    :return: string material key
+    """
+    return ''.join(sorted(white, key=PIECE_ORDER.index)) + 'v' + ''.join(sorted(black, key=PIECE_ORDER.index))
+
+
+def canonical_material(key):
+    """
+    Returns the key of the table that holds a set of pieces: the stronger side plays white, and a set
+    whose colors are swapped is looked up in the other table with the colors swapped back.
+    :param key: string material key
+    :return: tuple (string material key of the table, True if the colors are swapped)
+    """
+    white, black = material_sides(key)
+    if side_strength(white) >= side_strength(black):
+        return key, False
+    return material_key(black, white), True
+
+
+def material_slots(key):
+    """
+    Lists the pieces of a table in the order their squares are numbered: white king, black king, then
+    the other white pieces and the other black pieces.
+    :param key: string material key
+    :return: tuple of tuples (color, piece letter)
+    """
+    white, black = material_sides(key)
+    return ((WHITE, 'K'), (BLACK, 'K')) + tuple((WHITE, letter) for letter in white[1:]) + \
+        tuple((BLACK, letter) for letter in black[1:])
+
+
+def material_dependencies(key):
+    """
+    Lists the tables a table's captures can lead to, smallest first, including the table itself last.
+    :param key: string material key
+    :return: list of string material keys
+    """
+    white, black = material_sides(key)
+    found = set()
+    for white_count in range(len(white)):
+        for black_count in range(len(black)):
+            for white_rest in itertools.combinations(white[1:], white_count):
+                for black_rest in itertools.combinations(black[1:], black_count):
+                    found.add(canonical_material(material_key('K' + ''.join(white_rest),
+                                                              'K' + ''.join(black_rest)))[0])
+    return sorted(found, key=lambda name: (len(name), name))
+
+
+def materials_with(pieces):
+    """
+    Lists every table of a number of pieces, kings included.
+    :param pieces: integer number of pieces, at least 2
+    :return: list of string material keys
+    """
+    keys = set()
+    for white_count in range(pieces - 1):
+        for white in itertools.combinations_with_replacement(PIECE_ORDER[1:], white_count):
+            for black in itertools.combinations_with_replacement(PIECE_ORDER[1:], pieces - 2 - white_count):
+                keys.add(canonical_material(material_key('K' + ''.join(white), 'K' + ''.join(black)))[0])
+    return sorted(keys)
+
+
+def position_count(key):
+    """
+    Returns the number of positions of a table, counting impossible ones with two pieces on a square.
+    :param key: string material key
+    :return: integer
+    """
+    return 2 * len(QUADRANT) * 64 ** (len(material_slots(key)) - 1)
+
+
+def position_index(side, squares):
+    """
+    Numbers a position, mirroring the board so the white king stands on a1-d4. Mirroring files, ranks or
+    both leaves the atomic rules unchanged, and no position is its own mirror image, so every position
+    has exactly one number.
+    :param side: integer side to move, WHITE or BLACK
+    :param squares: list of square indexes of the pieces, in the order of material_slots
+    :return: integer index
+    """
+    king = squares[0]
+    mirror = (7 if king & 7 >= 4 else 0) | (56 if king < 32 else 0)
+    index = side * 16 + QUADRANT_INDEX[king ^ mirror]
+    for square in squares[1:]:
+        index = index * 64 + (square ^ mirror)
+    return index
+
+
+def position_squares(index, pieces):
+    """
+    Undoes position_index for a position with the white king on a1-d4.
+    :param index: integer index
+    :param pieces: integer number of pieces
+    :return: tuple (integer side to move, list of square indexes)
+    """
+    squares = []
+    for _ in range(pieces - 1):
+        index, square = divmod(index, 64)
+        squares.append(square)
+    side, king = divmod(index, 16)
+    squares.append(QUADRANT[king])
+    squares.reverse()
+    return side, squares
+
+
+class Tablebase:
+    """
+    A class that represents one generated table, read through mmap. Blocks are decompressed when first
+    probed and the most recently used ones are kept.
+    """
+    def __init__(self, path):
+        self._path = path
+        with open(path, 'rb') as table:
+            self._data = mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, positions, block_size, blocks, material = HEADER.unpack_from(self._data)
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC or version != VERSION:
+            self._data.close()
+            raise ValueError(f'{path} is not a tablebase of version {VERSION}')
+        self._material = material.rstrip(b'\0').decode()
+        self._slots = material_slots(self._material)
+        self._positions = positions
+        self._block_size = block_size
+        self._offsets = array('Q')
+        self._offsets.frombytes(self._data[HEADER.size:HEADER.size + 8 * (blocks + 1)])
+        self._blocks = OrderedDict()
+
+    def close(self):
+        """
+        Unmaps the table file.
+        :return: Nothing
+        """
+        self._blocks.clear()
+        self._data.close()
+
+    def get_material(self):
+        """Returns the string material key of the table, such as 'KRvKN'."""
+        return self._material
+
+    def get_slots(self):
+        """Returns the pieces of the table in the order of their squares, as from material_slots."""
+        return self._slots
+
+    def get_position_count(self):
+        """Returns the integer number of positions in the table."""
+        return self._positions
+
+    def clear_cache(self):
+        """
+        Drops the decompressed blocks.
+        :return: Nothing
+        """
+        self._blocks.clear()
+
+    def probe_index(self, index):
+        """
+        Returns the result code of a numbered position.
+        :param index: integer index, as from position_index
+        :return: integer result code
+        """
+        block_number, offset = divmod(index, self._block_size)
+        block = self._blocks.get(block_number)
+        if block is None:
+            start = self._offsets[block_number]
+            block = zlib.decompress(self._data[start:self._offsets[block_number + 1]])
+            if len(self._blocks) >= CACHE_BLOCKS:
+                self._blocks.popitem(last=False)
+            self._blocks[block_number] = block
+        else:
+            self._blocks.move_to_end(block_number)
+        return block[offset]
+
+
+class Tablebases:
+    """
+    A class that represents the tables of a directory, opened when first needed. Positions are looked up
+    by their pieces, whatever the order and colors they come in.
+    """
+    def __init__(self, directory):
+        self._directory = directory
+        self._tables = {}
+        self._max_pieces = 0
+        self.refresh()
+
+    def refresh(self):
+        """
+        Finds the tables in the directory, including ones written since it was opened.
+        :return: Nothing
+        """
+        self._available = set()
+        if os.path.isdir(self._directory):
+            for name in os.listdir(self._directory):
+                if name.endswith(EXTENSION):
+                    self._available.add(name[:-len(EXTENSION)])
+        self._max_pieces = max((len(key) - 1 for key in self._available), default=0)
+
+    def close(self):
+        """
+        Closes every open table.
+        :return: Nothing
+        """
+        for table in self._tables.values():
+            table.close()
+        self._tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_materials(self):
+        """Returns the sorted list of the material keys of the tables in the directory."""
+        return sorted(self._available)
+
+    def get_max_pieces(self):
+        """Returns the integer number of pieces of the largest table, 0 for none."""
+        return self._max_pieces
+
+    def get_table(self, key):
+        """
+        Returns the table of a material key, opening it if needed.
+        :param key: string material key of a table, as from canonical_material
+        :return: Tablebase, or None if the directory does not have it
+        """
+        table = self._tables.get(key)
+        if table is None and key in self._available:
+            table = self._tables[key] = Tablebase(os.path.join(self._directory, key + EXTENSION))
+        return table
+
+    def probe_pieces(self, pieces, side):
+        """
+        Looks up a position by its pieces.
+        :param pieces: iterable of tuples (integer color, piece letter, square index), both kings included
+        :param side: integer side to move, WHITE or BLACK
+        :return: integer result code for the side to move, or None if no table holds the position
+        """
+        white = [letter for color, letter, _ in pieces if color == WHITE]
+        black = [letter for color, letter, _ in pieces if color == BLACK]
+        key, swapped = canonical_material(material_key(white, black))
+        table = self.get_table(key)
+        if table is None:
+            return None
+        if swapped:
+            pieces = [(color ^ 1, letter, square) for color, letter, square in pieces]
+            side ^= 1
+        # Each piece takes the first free slot of its color and letter
+        squares = [None] * len(table.get_slots())
+        for color, letter, square in pieces:
+            for slot, piece in enumerate(table.get_slots()):
+                if piece == (color, letter) and squares[slot] is None:
+                    squares[slot] = square
+                    break
+        return table.probe_index(position_index(side, squares))
+
+    def probe_value(self, game):
+        """
+        Looks up the position of a game when a table holds it.
+        :param game: ChessVar object of an unfinished game
+        :return: integer result code for the player whose turn it is, or None
+        """
+        limit = self._max_pieces
+        pieces = []
+        for row in game.get_board():
+            for piece in row:
+                if piece:
+                    letter = PIECE_LETTERS.get(piece.get_piece_type())
+                    if letter is None or len(pieces) == limit:
+                        return None
+                    row_number, col = piece.get_position()
+                    pieces.append((COLORS.index(piece.get_color()), letter, row_number * 8 + col))
+        if len(pieces) < 2 or game.get_game_state() != 'UNFINISHED':
+            return None
+        return self.probe_pieces(pieces, COLORS.index(game.get_player_turn()))
+
+    def probe(self, game):
+        """
+        Looks up the result of a game's position.
+        :param game: ChessVar object
+        :return: TablebaseResult for the player whose turn it is, or None if no table holds the position
+        """
+        code = self.probe_value(game)
+        return None if code is None else decode_value(code)
+
+
+# The tables and material of a worker process, set by init_worker
+_tablebases = None
+_material = None
+
+
+def init_worker(directory, key):
+    """
+    Opens the tables a worker process looks captures up in.
+    :param directory: string directory of the smaller tables
+    :param key: string material key of the table being generated
+    :return: Nothing
+    """
+    global _tablebases, _material
+    _tablebases = Tablebases(directory)
+    _material = key
+
+
+def scan_positions(start, stop):
+    """
+    Plays every move of a range of positions. Captures are resolved at once, through the explosion and
+    the smaller table the survivors belong to; quiet moves are counted, to be resolved by retrograde
+    analysis.
+    :param start: integer first index
+    :param stop: integer index after the last
+    :return: tuple (integer start, bytes of moves not yet known to lose, bytes of the longest loss among
+             the captures, array of (index, plies) of wins by capture, array of (index, plies) of losses)
+    """
+    slots = material_slots(_material)
+    pieces = len(slots)
+    colors = [color for color, _ in slots]
+    rays = [PIECE_RAYS[letter] for _, letter in slots]
+    letters = [letter for _, letter in slots]
+    open_moves = bytearray(stop - start)
+    longest_loss = bytearray(stop - start)
+    wins = array('I')
+    losses = array('I')
+
+    for index in range(start, stop):
+        side, squares = position_squares(index, pieces)
+        occupied = {square: slot for slot, square in enumerate(squares)}
+        if len(occupied) < pieces:
+            continue
+        own_king, enemy_king = (squares[0], squares[1]) if side == WHITE else (squares[1], squares[0])
+        counted = 0
+        losing = 0
+        loss = 0
+        win = MAX_DISTANCE + 1
+        for slot in range(pieces):
+            if colors[slot] != side:
+                continue
+            for ray in rays[slot][squares[slot]]:
+                for target in ray:
+                    victim = occupied.get(target)
+                    if victim is None:
+                        counted += 1
+                        continue
+                    if colors[victim] != side and slot > 1:
+                        blast = BLAST_MASKS[target]
+                        own_hit = blast >> own_king & 1
+                        enemy_hit = blast >> enemy_king & 1
+                        if own_hit and enemy_hit:
+                            break
+                        if enemy_hit:
+                            counted += 1
+                            win = 1
+                        elif own_hit:
+                            losing += 1
+                            loss = max(loss, 1)
+                        else:
+                            # The capturing piece ends on the blast's center, with the piece it took
+                            survivors = [(colors[other], letters[other], square)
+                                         for other, square in enumerate(squares)
+                                         if other != slot and not blast >> square & 1]
+                            code = _tablebases.probe_pieces(survivors, side ^ 1)
+                            if code is None:
+                                raise RuntimeError(f'no table for the pieces left by a capture in {_material}')
+                            if code == DRAW:
+                                counted += 1
+                            elif code < LOSS:
+                                losing += 1
+                                loss = max(loss, code + 1)
+                            else:
+                                counted += 1
+                                win = min(win, code - LOSS + 1)
+                    break
+        if win <= MAX_DISTANCE:
+            wins.extend((index, win))
+        if counted:
+            open_moves[index - start] = counted
+            longest_loss[index - start] = loss
+        elif losing:
+            losses.extend((index, loss))
+    return start, bytes(open_moves), bytes(longest_loss), wins, losses
+
+
+def find_predecessors(indexes):
+    """
+    Finds the positions with a quiet move into each of some positions: the player who just moved takes
+    a piece back along any line it could have come from.
+    :param indexes: array of integer indexes
+    :return: array of integer indexes of the earlier positions, once per move
+    """
+    slots = material_slots(_material)
+    pieces = len(slots)
+    colors = [color for color, _ in slots]
+    rays = [PIECE_RAYS[letter] for _, letter in slots]
+    found = array('I')
+    for index in indexes:
+        side, squares = position_squares(index, pieces)
+        mover = side ^ 1
+        occupied = set(squares)
+        for slot in range(pieces):
+            if colors[slot] != mover:
+                continue
+            square = squares[slot]
+            for ray in rays[slot][square]:
+                for origin in ray:
+                    if origin in occupied:
+                        break
+                    squares[slot] = origin
+                    found.append(position_index(mover, squares))
+            squares[slot] = square
+    return found
+
+
+def write_table(path, key, values, block_size=BLOCK_SIZE):
+    """
+    Writes a table file: a header, the offsets of the compressed blocks and the blocks.
+    :param path: string path of the file
+    :param key: string material key
+    :param values: bytearray of result codes, one per position
+    :param block_size: integer positions per block
+    :return: integer bytes written
+    """
+    blocks = [zlib.compress(bytes(values[start:start + block_size]), 9)
+              for start in range(0, len(values), block_size)]
+    offsets = array('Q', [HEADER.size + 8 * (len(blocks) + 1)])
+    for block in blocks:
+        offsets.append(offsets[-1] + len(block))
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as table:
+        table.write(HEADER.pack(MAGIC, VERSION, len(values), block_size, len(blocks), key.encode()))
+        table.write(offsets.tobytes())
+        for block in blocks:
+            table.write(block)
+    os.replace(temporary, path)
+    return offsets[-1]
+
+
+def chunks(start, stop, count):
+    """
+    Splits a range into about count pieces.
+    :param start: integer start of the range
+    :param stop: integer end of the range
+    :param count: integer number of pieces
+    :return: list of tuples (start, stop)
+    """
+    step = max(1, -(-(stop - start) // count))
+    return [(low, min(low + step, stop)) for low in range(start, stop, step)]
+
+
+def generate_table(key, directory, workers=None):
+    """
+    Generates one table by retrograde analysis. The tables its captures lead to must be in the directory
+    already. Every position is scanned once in parallel; results then spread backwards a ply at a time,
+    each ply's predecessors also found in parallel.
+    :param key: string material key, as from canonical_material
+    :param directory: string directory to write the table to
+    :param workers: integer number of worker processes, by default one per core; 1 works in this process
+    :return: tuple (bytearray of result codes, float seconds)
+    """
+    start_time = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    positions = position_count(key)
+    values = bytearray(positions)
+    open_moves = bytearray(positions)
+    longest_loss = bytearray(positions)
+    wins = defaultdict(list)
+    losses = defaultdict(list)
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(directory, key))
+        run = pool.map
+    else:
+        init_worker(directory, key)
+        run = map
+    try:
+        ranges = chunks(0, positions, workers * 8)
+        for low, moves, longest, found_wins, found_losses in run(scan_positions, *zip(*ranges)):
+            open_moves[low:low + len(moves)] = moves
+            longest_loss[low:low + len(longest)] = longest
+            for number in range(0, len(found_wins), 2):
+                wins[found_wins[number + 1]].append(found_wins[number])
+            for number in range(0, len(found_losses), 2):
+                losses[found_losses[number + 1]].append(found_losses[number])
+
+        plies = 1
+        while any(level >= plies for level in itertools.chain(wins, losses)):
+            if plies > MAX_DISTANCE:
+                raise ValueError(f'{key} has results longer than {MAX_DISTANCE} plies')
+            lost = array('I')
+            for index in losses.pop(plies, ()):
+                if not values[index]:
+                    values[index] = LOSS + plies
+                    lost.append(index)
+            won = array('I')
+            for index in wins.pop(plies, ()):
+                if not values[index]:
+                    values[index] = plies
+                    won.append(index)
+
+            for found in run(find_predecessors, [lost[low:high] for low, high in chunks(0, len(lost), workers)]):
+                for index in found:
+                    if not values[index]:
+                        wins[plies + 1].append(index)
+            for found in run(find_predecessors, [won[low:high] for low, high in chunks(0, len(won), workers)]):
+                for index in found:
+                    if not values[index]:
+                        open_moves[index] -= 1
+                        if longest_loss[index] < plies + 1:
+                            longest_loss[index] = plies + 1
+                        if not open_moves[index]:
+                            losses[longest_loss[index]].append(index)
+            plies += 1
+    finally:
+        if pool:
+            pool.shutdown()
+    return values, time.perf_counter() - start_time
+
+
+def measure_probes(table, samples=2000, seed=0):
+    """
+    Times probes of random positions of a table, once with each position's block still compressed and
+    once with the blocks in use already decompressed.
+    :param table: Tablebase
+    :param samples: integer number of positions
+    :param seed: integer seed of the positions
+    :return: tuple (float cold microseconds per probe, float warm microseconds per probe)
+    """
+    rng = random.Random(seed)
+    indexes = [rng.randrange(table.get_position_count()) for _ in range(samples)]
+    cold = 0.0
+    for index in indexes:
+        table.clear_cache()
+        start_time = time.perf_counter()
+        table.probe_index(index)
+        cold += time.perf_counter() - start_time
+    warm_indexes = indexes[:CACHE_BLOCKS] * (samples // CACHE_BLOCKS)
+    table.clear_cache()
+    for index in warm_indexes[:CACHE_BLOCKS]:
+        table.probe_index(index)
+    start_time = time.perf_counter()
+    for index in warm_indexes:
+        table.probe_index(index)
+    warm = time.perf_counter() - start_time
+    table.clear_cache()
+    return round(cold / samples * 1e6, 2), round(warm / len(warm_indexes) * 1e6, 2)
+
+
+def generate_tables(keys, directory, workers=None, log=None):
+    """
+    Generates tables and every smaller table their captures lead to, skipping tables already in the
+    directory.
+    :param keys: iterable of string material keys
+    :param directory: string directory of the tables
+    :param workers: integer number of worker processes, by default one per core
+    :param log: function called with a line of progress, or None
+    :return: list of TableReport, one per table generated
+    """
+    os.makedirs(directory, exist_ok=True)
+    needed = []
+    for key in keys:
+        for dependency in material_dependencies(canonical_material(key)[0]):
+            if dependency not in needed:
+                needed.append(dependency)
+    needed.sort(key=lambda name: (len(name), name))
+
+    reports = []
+    for key in needed:
+        path = os.path.join(directory, key + EXTENSION)
+        if os.path.exists(path):
+            continue
+        values, seconds = generate_table(key, directory, workers)
+        file_bytes = write_table(path, key, values)
+        wins = sum(1 for code in values if 0 < code < LOSS)
+        losses = sum(1 for code in values if code > LOSS)
+        table = Tablebase(path)
+        try:
+            cold, warm = measure_probes(table)
+        finally:
+            table.close()
+        report = TableReport(key, len(values), wins, losses, len(values) - wins - losses,
+                             max((code for code in values if code < LOSS), default=0), round(seconds, 3),
+                             file_bytes, cold, warm)
+        reports.append(report)
+        if log:
+            log(f'{key:<8} {report.positions:>10} positions {report.seconds:>9.2f} s {file_bytes:>10} bytes '
+                f'probe {cold:>6.2f} us cold {warm:>5.2f} us warm')
+    return reports
+
+
+def main(argv=None):
+    """
+    Generates tables or probes a position from the command line.
+    :param argv: list of command line arguments
+    :return: integer exit status
+    """
+    parser = argparse.ArgumentParser(description='Generates and probes atomic chess endgame tablebases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate = commands.add_parser('generate', help='generate tables')
+    generate.add_argument('--pieces', type=int, default=3, help='generate every table of this many pieces')
+    generate.add_argument('--material', action='append', help='generate this table, such as KRvKN')
+    generate.add_argument('--directory', default='tablebases', help='directory of the tables')
+    generate.add_argument('--workers', type=int, help='worker processes, one per core by default')
+    generate.add_argument('--output', default='tablebase_results.json', help='path of the JSON report')
+    probe = commands.add_parser('probe', help='look up a position')
+    probe.add_argument('--fen', required=True, help='position to look up')
+    probe.add_argument('--directory', default='tablebases', help='directory of the tables')
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        keys = args.material or materials_with(args.pieces)
+        reports = generate_tables(keys, args.directory, args.workers, log=print)
+        with open(args.output, 'w') as output:
+            json.dump({'cpu_count': os.cpu_count(), 'python': platform.python_version(),
+                       'workers': args.workers or os.cpu_count(),
+                       'tables': [report._asdict() for report in reports]}, output, indent=2)
+        return 0
+
+    from ChessVar import ChessVar
+    game = ChessVar.from_fen(args.fen)
+    with Tablebases(args.directory) as tablebases:
+        result = tablebases.probe(game)
+    if result is None:
+        print('no table holds the position')
+        return 1
+    print(f'{result.result} in {result.plies} plies' if result.plies else 'DRAW')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,392 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Plays matches between two engines. Games are shared out to a pool of worker processes in pairs
+#              that play the same random opening with colors swapped, each player moves under a chess clock,
+#              and every result is appended to a JSON lines file as soon as its game finishes. A run that is
+#              stopped, or whose worker process dies, picks up from the games already in the file.
+#
+#              python Tournament.py --player new --player old:engine=OldEngine.ChessEngine --games 200
+#                                   [--workers 4] [--time-control 10+0.1] [--output tournament.jsonl]
+
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from ChessVar import ChessVar
+from OpeningBook import OpeningBook
+from Tablebase import Tablebases
+
+Player = namedtuple('Player',
+                    ['name', 'engine', 'tt_size_mb', 'max_depth', 'max_nodes', 'book', 'tablebases'],
+                    defaults=['ChessEngine.ChessEngine', 16, 64, None, None, None])
+Player.__doc__ = """
+A player of a tournament: a name, the dotted import path of its engine class, the engine's transposition
+table size, the depth and node limits of its searches, the path of the opening book it plays from and the
+directory of the endgame tablebases it probes, each None for none.
+"""
+
+TimeControl = namedtuple('TimeControl', ['base', 'increment', 'moves_to_go'], defaults=[0.0, 30])
+TimeControl.__doc__ = """
+A chess clock: base seconds per player, seconds added after every move, and the number of moves the
+remaining time is shared over when a move's search time is set.
+"""
+
+# Attempts at a game before it is given up on, for games whose worker keeps dying
+MAX_ATTEMPTS = 3
+
+# The engines of a worker process, created on first use and kept between games
+_engines = {}
+
+
+def parse_player(text):
+    """
+    Reads a player from the command line form NAME[:key=value,...], such as
+    'old:engine=OldEngine.ChessEngine,max_depth=4' or 'booked:book=book.bin,tablebases=tablebases'.
+    :param text: string player description
+    :return: Player
+    """
+    name, _, options = text.partition(':')
+    fields = {}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        if key not in Player._fields or key == 'name':
+            raise ValueError(f'Unknown player option {key}')
+        fields[key] = value if key in ('engine', 'book', 'tablebases') else int(value)
+    return Player(name, **fields)
+
+
+def parse_time_control(text):
+    """
+    Reads a time control from the form BASE+INCREMENT in seconds, such as '10+0.1'.
+    :param text: string time control
+    :return: TimeControl
+    """
+    base, _, increment = text.partition('+')
+    return TimeControl(float(base), float(increment or 0))
+
+
+def random_openings(count, plies, seed):
+    """
+    Creates openings of random legal moves that do not end the game.
+    :param count: integer number of openings
+    :param plies: integer number of moves in each opening
+    :param seed: integer seed, so that a tournament always plays the same openings
+    :return: list of lists of move strings such as 'e2e4'
+    """
+    rng = random.Random(seed)
+    openings = []
+    while len(openings) < count:
+        game = ChessVar()
+        moves = []
+        for _ in range(plies):
+            safe = [move for move in game.legal_moves() if not game.get_board()[move[1][0]][move[1][1]]]
+            if not safe:
+                break
+            start, end = rng.choice(safe)
+            moves.append(game.translate_position(start) + game.translate_position(end))
+            game.push((start, end))
+        openings.append(moves)
+    return openings
+
+
+def get_engine(player):
+    """
+    Returns the worker process's engine for a player, creating it on first use. A player's opening book
+    and tablebases are mapped into the worker, so all the workers share one copy of them.
+    :param player: Player
+    :return: engine object with the ChessEngine search method
+    """
+    if player not in _engines:
+        module_name, _, class_name = player.engine.rpartition('.')
+        engine_class = getattr(importlib.import_module(module_name), class_name)
+        options = {}
+        if player.book:
+            options['book'] = OpeningBook(player.book)
+        if player.tablebases:
+            options['tablebases'] = Tablebases(player.tablebases)
+        _engines[player] = engine_class(tt_size_mb=player.tt_size_mb, **options)
+    return _engines[player]
+
+
+def play_game(game_id, white, black, opening, time_control, max_plies):
+    """
+    Plays one game between two players in a worker process.
+    :param game_id: integer game number
+    :param white: Player who moves first
+    :param black: Player who moves second
+    :param opening: list of move strings played before the engines take over
+    :param time_control: TimeControl of both players
+    :param max_plies: integer number of moves after which the game is drawn
+    :return: dictionary of the game's result, ready to be written as JSON
+    """
+    game = ChessVar()
+    moves = list(opening)
+    for move in opening:
+        game.make_move(move[:2], move[2:])
+    players = {'WHITE': white, 'BLACK': black}
+    clocks = {'WHITE': time_control.base, 'BLACK': time_control.base}
+    for player in players.values():
+        get_engine(player).get_transposition_table().clear()
+
+    started = time.time()
+    result, reason = '1/2-1/2', 'ply limit'
+    while len(moves) < max_plies:
+        if game.get_game_state() != 'UNFINISHED':
+            result = '1-0' if game.get_game_state() == 'WHITE_WON' else '0-1'
+            reason = 'king destroyed'
+            break
+        if not game.legal_moves():
+            reason = 'no legal moves'
+            break
+
+        color = game.get_player_turn()
+        player = players[color]
+        budget = clocks[color] / time_control.moves_to_go + time_control.increment
+        move_start = time.perf_counter()
+        search = get_engine(player).search(game, max_time=min(budget, clocks[color]), max_depth=player.max_depth,
+                                           max_nodes=player.max_nodes)
+        clocks[color] -= time.perf_counter() - move_start
+        if clocks[color] < 0:
+            result, reason = ('0-1', 'time forfeit') if color == 'WHITE' else ('1-0', 'time forfeit')
+            break
+        clocks[color] += time_control.increment
+        game.make_move(search.move[:2], search.move[2:])
+        moves.append(search.move)
+
+    return {
+        'game_id': game_id,
+        'white': white.name,
+        'black': black.name,
+        'opening': opening,
+        'result': result,
+        'reason': reason,
+        'plies': len(moves),
+        'moves': moves,
+        'seconds': round(time.time() - started, 3),
+    }
+
+
+def elo_difference(wins, draws, losses):
+    """
+    Estimates the Elo difference between two players from a match, with the half width of its 95%
+    confidence interval.
+    :param wins: integer games won by the first player
+    :param draws: integer games drawn
+    :param losses: integer games lost by the first player
+    :return: tuple (float Elo difference or None, float error or None); None where the score is 0% or 100%
+    """
+    games = wins + draws + losses
+    if not games:
+        return None, None
+    score = (wins + draws / 2) / games
+    if score <= 0 or score >= 1:
+        return None, None
+
+    def elo(points):
+        return -400 * math.log10(1 / points - 1)
+
+    deviation = math.sqrt((wins + draws / 4) / games - score ** 2) / math.sqrt(games)
+    low = max(score - 1.96 * deviation, 1e-9)
+    high = min(score + 1.96 * deviation, 1 - 1e-9)
+    return elo(score), (elo(high) - elo(low)) / 2
+
+
+def summarize_results(results, player, seconds=None):
+    """
+    Totals the games of a match from one player's side.
+    :param results: list of game result dictionaries made by play_game
+    :param player: string name of the player whose wins are counted
+    :param seconds: float seconds the games took to play, or None
+    :return: dictionary of the totals
+    """
+    wins = draws = losses = 0
+    for record in results:
+        if record.get('result') is None:
+            continue
+        if record['result'] == '1/2-1/2':
+            draws += 1
+        elif (record['result'] == '1-0') == (record['white'] == player):
+            wins += 1
+        else:
+            losses += 1
+    elo, error = elo_difference(wins, draws, losses)
+    games = wins + draws + losses
+    return {
+        'player': player,
+        'games': games,
+        'wins': wins,
+        'draws': draws,
+        'losses': losses,
+        'elo': None if elo is None else round(elo, 1),
+        'elo_error': None if error is None else round(error, 1),
+        'games_per_hour': round(games * 3600 / seconds, 1) if seconds else None,
+        'failed_games': sum(1 for record in results if record.get('result') is None),
+    }
+
+
+class Tournament:
+    """
+    A class that represents a match between two players. Each opening is played twice, once with each
+    player moving first. Results are appended to the output file as games finish; games already in the
+    file are not played again.
+    """
+    def __init__(self, first, second, games, output_path, workers=None, time_control=TimeControl(10.0, 0.1),
+                 opening_plies=4, max_plies=200, seed=0):
+        self._players = (first, second)
+        self._games = games
+        self._output_path = output_path
+        self._workers = workers or os.cpu_count() or 1
+        self._time_control = time_control
+        self._opening_plies = opening_plies
+        self._max_plies = max_plies
+        self._seed = seed
+
+    def make_schedule(self):
+        """
+        Creates the games of the match.
+        :return: list of tuples (game_id, white, black, opening), the arguments of play_game
+        """
+        first, second = self._players
+        openings = random_openings((self._games + 1) // 2, self._opening_plies, self._seed)
+        schedule = []
+        for game_id in range(self._games):
+            white, black = (first, second) if game_id % 2 == 0 else (second, first)
+            schedule.append((game_id, white, black, openings[game_id // 2]))
+        return schedule
+
+    def load_results(self):
+        """
+        Reads the games already written to the output file, ignoring a line cut short by a crash.
+        :return: list of game result dictionaries
+        """
+        results = []
+        if not os.path.exists(self._output_path):
+            return results
+        with open(self._output_path) as output:
+            for line in output:
+                try:
+                    results.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return results
+
+    def run(self, progress=None):
+        """
+        Plays every game of the match not yet in the output file. Only as many games as there are workers
+        are handed to the pool at once, so a worker that dies costs at most those games an attempt; the
+        pool is then restarted and they are played again.
+        :param progress: function called with each game result as it is written, or None
+        :return: dictionary of the match totals made by summarize_results
+        """
+        results = self.load_results()
+        done = {record['game_id'] for record in results}
+        waiting = [task for task in self.make_schedule() if task[0] not in done]
+        attempts = {}
+        started = time.time()
+        played = 0
+
+        with open(self._output_path, 'a') as output:
+            def write(record):
+                output.write(json.dumps(record) + '\n')
+                output.flush()
+                results.append(record)
+                if progress:
+                    progress(record)
+
+            while waiting:
+                pool = ProcessPoolExecutor(max_workers=self._workers)
+                running = {}
+                try:
+                    while waiting or running:
+                        while waiting and len(running) < self._workers:
+                            task = waiting.pop(0)
+                            running[pool.submit(play_game, *task, self._time_control, self._max_plies)] = task
+                        finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            try:
+                                record = future.result()
+                            except BrokenProcessPool:
+                                raise
+                            except Exception as error:
+                                record = self.retry(running[future], attempts, waiting, repr(error))
+                            del running[future]
+                            if record:
+                                write(record)
+                                played += record.get('result') is not None
+                except BrokenProcessPool:
+                    # Games that finished before the worker died are kept; the others are played again
+                    for future, task in running.items():
+                        if future.done() and not future.cancelled() and future.exception() is None:
+                            record = future.result()
+                            played += 1
+                        else:
+                            record = self.retry(task, attempts, waiting, 'worker process died')
+                        if record:
+                            write(record)
+                finally:
+                    pool.shutdown(cancel_futures=True)
+
+        summary = summarize_results(results, self._players[0].name)
+        elapsed = time.time() - started
+        summary['games_per_hour'] = round(played * 3600 / elapsed, 1) if played else None
+        return summary
+
+    def retry(self, task, attempts, waiting, error):
+        """
+        Puts a game that failed back in line, or gives up on it after MAX_ATTEMPTS.
+        :param task: tuple of play_game arguments of the game
+        :param attempts: dictionary of game_id to failed attempts so far
+        :param waiting: list of games still to be played
+        :param error: string description of the failure
+        :return: dictionary to record for a game given up on, or None if it is played again
+        """
+        game_id = task[0]
+        attempts[game_id] = attempts.get(game_id, 0) + 1
+        if attempts[game_id] < MAX_ATTEMPTS:
+            waiting.append(task)
+            return None
+        return {'game_id': game_id, 'white': task[1].name, 'black': task[2].name, 'opening': task[3],
+                'result': None, 'error': error}
+
+
+def main(argv=None):
+    """
+    Runs a match from the command line and prints the totals.
+    :param argv: list of command line arguments
+    :return: integer exit status
+    """
+    parser = argparse.ArgumentParser(description='Plays a match between two atomic chess engines.')
+    parser.add_argument('--player', action='append', type=parse_player, required=True,
+                        help='NAME[:key=value,...] with keys engine, tt_size_mb, max_depth, max_nodes; given twice')
+    parser.add_argument('--games', type=int, default=100, help='number of games')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--time-control', type=parse_time_control, default=TimeControl(10.0, 0.1),
+                        help='BASE+INCREMENT seconds per player')
+    parser.add_argument('--opening-plies', type=int, default=4, help='random moves before the engines play')
+    parser.add_argument('--max-plies', type=int, default=200, help='moves after which a game is drawn')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random openings')
+    parser.add_argument('--output', default='tournament.jsonl', help='JSON lines file of game results')
+    args = parser.parse_args(argv)
+    if len(args.player) != 2:
+        parser.error('--player must be given exactly twice')
+
+    tournament = Tournament(args.player[0], args.player[1], args.games, args.output, args.workers,
+                            args.time_control, args.opening_plies, args.max_plies, args.seed)
+    summary = tournament.run(progress=lambda record: print(
+        f"game {record['game_id']:>4} {record['white']} - {record['black']} "
+        f"{record.get('result') or 'failed'} ({record.get('reason') or record.get('error')})"))
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: A fixed-size transposition table for atomic chess search, keyed by ChessVar.position_hash.
+
+from array import array
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+NO_MOVE = 0xFFFF
+BUCKET_SIZE = 2
+# keys (8) + scores (4) + moves (2) + depths (1) + bounds (1) + ages (1)
+ENTRY_BYTES = 17
+
+
+def encode_move(move):
+    """
+    Packs a move into a 12-bit integer.
+    :param move: tuple (start, end) of (row, col) board positions, or None
+    :return: integer from_square * 64 + to_square, or NO_MOVE
+    """
+    if move is None:
+        return NO_MOVE
+    (start_row, start_col), (end_row, end_col) = move
+    return (start_row * 8 + start_col) << 6 | (end_row * 8 + end_col)
+
+
+def decode_move(code):
+    """
+    Unpacks a move packed by encode_move.
+    :param code: integer packed move
+    :return: tuple (start, end) of (row, col) board positions, or None for NO_MOVE
+    """
+    if code == NO_MOVE:
+        return None
+    start, end = code >> 6, code & 63
+    return (start >> 3, start & 7), (end >> 3, end & 7)
+
+
+class TranspositionTable:
+    """
+    A class that represents a transposition table. Entries live in preallocated parallel arrays, so
+    the table never grows past the memory budget it was created with. Each position hash maps to a
+    bucket of two entries; a new result replaces, in order of preference, the entry for the same
+    position, an entry left over from an earlier search, or the entry searched to the lower depth.
+    """
+    def __init__(self, size_mb=16):
+        buckets = 1
+        while (buckets * 2) * BUCKET_SIZE * ENTRY_BYTES <= size_mb * 1024 * 1024:
+            buckets *= 2
+        entries = buckets * BUCKET_SIZE
+
+        self._bucket_mask = buckets - 1
+        self._keys = array('Q', bytes(8 * entries))
+        self._scores = array('i', bytes(4 * entries))
+        self._moves = array('H', bytes(2 * entries))
+        # Depth + 1 is stored so that 0 marks an empty entry
+        self._depths = array('B', bytes(entries))
+        self._bounds = array('B', bytes(entries))
+        self._ages = array('B', bytes(entries))
+        self._age = 0
+
+    def get_entry_count(self):
+        """Returns the number of entries the table holds."""
+        return len(self._keys)
+
+    def get_memory_usage(self):
+        """Returns the number of bytes the table's arrays take up."""
+        return self.get_entry_count() * ENTRY_BYTES
+
+    def new_search(self):
+        """
+        Marks the start of a new search so entries from earlier searches are replaced first.
+        :return: Nothing
+        """
+        self._age = (self._age + 1) & 0xFF
+
+    def clear(self):
+        """
+        Empties the table without reallocating it.
+        :return: Nothing
+        """
+        entries = self.get_entry_count()
+        self._depths = array('B', bytes(entries))
+        self._age = 0
+
+    def probe(self, key):
+        """
+        Looks up a position.
+        :param key: integer position hash
+        :return: tuple (depth, bound, score, move) or None if the position is not stored
+        """
+        index = (key & self._bucket_mask) * BUCKET_SIZE
+        for slot in range(index, index + BUCKET_SIZE):
+            if self._keys[slot] == key and self._depths[slot]:
+                return self._depths[slot] - 1, self._bounds[slot], self._scores[slot], decode_move(self._moves[slot])
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        """
+        Saves a search result, replacing an entry of the position's bucket if the bucket is full.
+        :param key: integer position hash
+        :param depth: integer remaining search depth the result was found with
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND
+        :param score: integer score
+        :param move: best move found as a tuple (start, end), or None
+        :return: Nothing
+        """
+        index = (key & self._bucket_mask) * BUCKET_SIZE
+        depths = self._depths
+        ages = self._ages
+        replace = None
+        replace_rank = None
+        for slot in range(index, index + BUCKET_SIZE):
+            if self._keys[slot] == key and depths[slot]:
+                # Keep a deeper result for the same position from the current search
+                if depth + 1 < depths[slot] and ages[slot] == self._age and bound != EXACT:
+                    return
+                replace = slot
+                break
+            # Empty entries go first, then entries from earlier searches, then the shallowest
+            if not depths[slot]:
+                rank = -1
+            elif ages[slot] != self._age:
+                rank = depths[slot]
+            else:
+                rank = 256 + depths[slot]
+            if replace_rank is None or rank < replace_rank:
+                replace, replace_rank = slot, rank
+
+        if move is None and self._keys[replace] == key and depths[replace]:
+            code = self._moves[replace]
+        else:
+            code = encode_move(move)
+        self._keys[replace] = key
+        depths[replace] = min(depth, 254) + 1
+        self._bounds[replace] = bound
+        self._scores[replace] = score
+        self._moves[replace] = code
+        ages[replace] = self._age
+
+    def hashfull(self):
+        """
+        Returns how full the table is, sampled from its first thousand entries.
+        :return: integer entries in use per thousand
+        """
+        sample = min(1000, self.get_entry_count())
+        used = sum(1 for slot in range(sample) if self._depths[slot] and self._ages[slot] == self._age)
+        return used * 1000 // sample
@@ -0,0 +1,20 @@
+# Author: Reid Singleton
+# GitHub username: reidwarner
+# Date: 5/27/2024
+# Description: Random 64-bit keys for Zobrist hashing of atomic chess positions. The keys come from a
+#              fixed seed so every process computes the same hash for the same position.
+
+import random
+
+ZOBRIST_SEED = 0x41544F4D4943
+
+_random = random.Random(ZOBRIST_SEED)
+
+# Indexed by (color, piece type) and then by square index row * 8 + col
+PIECE_KEYS = {(color, piece_type): [_random.getrandbits(64) for _ in range(64)]
+              for color in ('WHITE', 'BLACK')
+              for piece_type in ('KING', 'QUEEN', 'ROOK', 'BISHOP', 'KNIGHT', 'PAWN')}
+# XORed in for a pawn on a square that has not made its first move yet
+UNMOVED_PAWN_KEYS = [_random.getrandbits(64) for _ in range(64)]
+# XORed in when black is to move
+SIDE_KEY = _random.getrandbits(64)